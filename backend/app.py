@@ -2,20 +2,46 @@
 """
 MindSlot Backend API
 """
-from flask import Flask, jsonify
+import os
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from config import Config
 from models import db
 from models.card import Card
 from models.interaction import Interaction
 from models.user import User
+from models.user_profile import UserProfile
+from models.user_stats import UserStats
+from models.interaction_rollup import InteractionRollup
+from models.seen_card import SeenCard
 from routes.feed import feed_bp
 from routes.interaction import interaction_bp
+from routes.cards import cards_bp
+from services.compression import compress_response
+from services.queue_service import queue_service
+from services.replenish_worker import replenish_worker
+from services.interaction_buffer import interaction_buffer
+from services.event_log import event_log
+from services.event_consumers import event_follower
+from services.compaction_service import compaction_service
+from services.trending_service import trending_service
 
 # 创建 Flask 应用
 app = Flask(__name__)
 app.config.from_object(Config)
 
+def resolve_instance_paths():
+    """
+    本地文件（事件日志、溢出 / 死信文件、归档段）：相对路径按实例目录解析（与 SQLite 数据库一致），
+    不依赖进程的工作目录，服务进程和 scripts/ 下的脚本使用同一位置
+    """
+    event_log.directory = os.path.join(app.instance_path, Config.EVENT_LOG_DIR)
+    interaction_buffer.spill_path = os.path.join(app.instance_path, Config.INTERACTION_SPILL_FILE)
+    interaction_buffer.dead_letter_path = os.path.join(app.instance_path, Config.INTERACTION_DEAD_LETTER_FILE)
+    compaction_service.archive_dir = os.path.join(app.instance_path, Config.INTERACTION_ARCHIVE_DIR)
+
+resolve_instance_paths()
+
 # 启用 CORS
 CORS(app)
 
@@ -25,6 +51,23 @@ db.init_app(app)
 # 注册路由
 app.register_blueprint(feed_bp, url_prefix='/api/feed')
 app.register_blueprint(interaction_bp, url_prefix='/api/interaction')
+app.register_blueprint(cards_bp, url_prefix='/api/cards')
+
+# 响应压缩（超过阈值的 JSON 响应按 Accept-Encoding 压缩）
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding', ''))
+
+def start_background_workers():
+    """
+    启动服务进程的后台线程（只在服务入口调用，scripts/ 下的脚本导入 app 时不启动）：
+    - 交互写后缓冲（INTERACTION_WRITE_BEHIND=true 时启动组提交线程，并重放溢出文件）
+    - 事件日志跟随（EVENT_LOG_FOLLOW=true 时启动，预热并持续更新已看集合 / 热度）
+    
+    用 gunicorn 等 WSGI 服务器部署时在每个 worker 启动后调用（如 post_worker_init 钩子）。
+    """
+    interaction_buffer.start(app)
+    event_follower.start(app)
 
 # 健康检查
 @app.route('/health')
@@ -32,7 +75,13 @@ def health():
     return jsonify({
         "status": "ok",
         "service": "MindSlot Backend",
-        "version": "0.1.0"
+        "version": "0.1.0",
+        "queue": queue_service.stats(),
+        "replenish": replenish_worker.stats(),
+        "interaction_buffer": interaction_buffer.stats(),
+        "event_log": event_log.stats(),
+        "event_follower": event_follower.stats(),
+        "trending": trending_service.stats()
     })
 
 @app.route('/')
@@ -42,6 +91,7 @@ def index():
         "endpoints": {
             "feed": "/api/feed/next",
             "interaction": "/api/interaction/record",
+            "card": "/api/cards/<id>",
             "health": "/health"
         }
     })
@@ -62,6 +112,10 @@ if __name__ == '__main__':
         db.create_all()
         print("[OK] Database tables created")
     
+    # debug 模式下 reloader 的监控进程不处理请求，后台线程只在实际服务的子进程中启动
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
+    
     print("[START] MindSlot Backend starting...")
     print("[API] Available at: http://localhost:5000")
     print("[HEALTH] Check: http://localhost:5000/health")
@@ -21,7 +21,50 @@ class Config:
     # 后台工厂配置
     FACTORY_INTERVAL = int(os.getenv('FACTORY_INTERVAL', 3600))  # 每小时
     BATCH_SIZE = int(os.getenv('BATCH_SIZE', 20))
+    FACTORY_MAX_INFLIGHT = int(os.getenv('FACTORY_MAX_INFLIGHT', 4))  # 同时进行的 LLM 生成调用上限
     
     # 队列配置
     QUEUE_MIN_LENGTH = 5  # 触发补货的阈值
     QUEUE_REPLENISH_SIZE = 10  # 每次补货数量
+    REPLENISH_ASYNC = os.getenv('REPLENISH_ASYNC', 'true').lower() == 'true'  # 低于阈值时后台补货
+    REPLENISH_WORKERS = int(os.getenv('REPLENISH_WORKERS', 4))  # 后台补货线程数
+    
+    # 交互写后缓冲（/record 立即返回，后台组提交）
+    INTERACTION_WRITE_BEHIND = os.getenv('INTERACTION_WRITE_BEHIND', 'false').lower() == 'true'
+    INTERACTION_FLUSH_INTERVAL_MS = int(os.getenv('INTERACTION_FLUSH_INTERVAL_MS', 200))  # 组提交间隔
+    INTERACTION_FLUSH_BATCH = int(os.getenv('INTERACTION_FLUSH_BATCH', 500))  # 攒够多少条立即提交
+    INTERACTION_BUFFER_MAX = int(os.getenv('INTERACTION_BUFFER_MAX', 10000))  # 缓冲区上限（背压）
+    INTERACTION_SUBMIT_TIMEOUT = float(os.getenv('INTERACTION_SUBMIT_TIMEOUT', 0.5))  # 缓冲区满时最多等待秒数
+    INTERACTION_SPILL_FILE = os.getenv('INTERACTION_SPILL_FILE', 'interaction_spill.ndjson')  # 相对路径按实例目录解析
+    INTERACTION_DEAD_LETTER_FILE = os.getenv('INTERACTION_DEAD_LETTER_FILE', 'interaction_dead_letter.ndjson')  # 无法写入的交互
+    INTERACTION_SPILL_FSYNC = os.getenv('INTERACTION_SPILL_FSYNC', 'false').lower() == 'true'  # 每条 fsync
+    
+    # 交互归档（scripts/compact_interactions.py；zstd 需要额外安装 zstandard 包，未安装时用 gzip）
+    INTERACTION_ARCHIVE_DAYS = int(os.getenv('INTERACTION_ARCHIVE_DAYS', 90))  # 热表保留天数
+    INTERACTION_ARCHIVE_DIR = os.getenv('INTERACTION_ARCHIVE_DIR', 'archive')  # 相对路径按实例目录解析
+    INTERACTION_ARCHIVE_BATCH = int(os.getenv('INTERACTION_ARCHIVE_BATCH', 5000))  # 每个归档段的交互数
+    INTERACTION_ARCHIVE_CODEC = os.getenv('INTERACTION_ARCHIVE_CODEC', 'zstd')  # zstd / gzip
+    
+    # 交互事件日志（每 worker 本地段文件 + 可选 Redis Stream，派生状态可重放）
+    EVENT_LOG_ENABLED = os.getenv('EVENT_LOG_ENABLED', 'true').lower() == 'true'
+    EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', 'events')  # 相对路径按实例目录解析
+    EVENT_LOG_WORKER_ID = os.getenv('EVENT_LOG_WORKER_ID', '')  # 为空时用 主机名-进程号
+    EVENT_LOG_SEGMENT_BYTES = int(os.getenv('EVENT_LOG_SEGMENT_BYTES', 64 * 1024 * 1024))  # 64MB 换新段
+    EVENT_LOG_REDIS = os.getenv('EVENT_LOG_REDIS', 'false').lower() == 'true'  # 同时写入 Redis Stream
+    EVENT_LOG_STREAM_MAXLEN = int(os.getenv('EVENT_LOG_STREAM_MAXLEN', 1000000))  # Stream 近似长度上限
+    EVENT_LOG_RETENTION_HOURS = int(os.getenv('EVENT_LOG_RETENTION_HOURS', 72))  # 段文件保留时长，0 表示永久保留
+    EVENT_LOG_FOLLOW = os.getenv('EVENT_LOG_FOLLOW', 'true').lower() == 'true'  # 后台跟随日志更新已看集合 / 热度
+    EVENT_LOG_POLL_MS = int(os.getenv('EVENT_LOG_POLL_MS', 1000))
+    TRENDING_WINDOW_HOURS = int(os.getenv('TRENDING_WINDOW_HOURS', 24))  # 热度统计窗口
+    
+    # 卡片缓存配置（预编码 JSON）
+    CARD_CACHE_MAX_BYTES = int(os.getenv('CARD_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # 64MB
+    CARD_CACHE_TTL = int(os.getenv('CARD_CACHE_TTL', 0))  # 秒，0 表示不过期
+    CARD_CACHE_REDIS = os.getenv('CARD_CACHE_REDIS', 'false').lower() == 'true'  # 多 worker 共享
+    CARD_HTTP_MAX_AGE = int(os.getenv('CARD_HTTP_MAX_AGE', 365 * 24 * 3600))  # /api/cards/<id> 的 Cache-Control
+
+    # 响应压缩配置（brotli 需要额外安装 Brotli 包，未安装时只用 gzip）
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # 小于该字节数不压缩
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
@@ -1,3 +1,35 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 
 db = SQLAlchemy()
+
+
+def insert_if_absent(model, **values) -> bool:
+    """
+    INSERT ... ON CONFLICT DO NOTHING：主键已存在时什么也不做（不提交事务）
+
+    用于并发的首次写入（画像 / 统计汇总行）：两个事务同时插入同一主键时，
+    后到的一方等待先到的一方提交后直接跳过，而不是抛出 IntegrityError。
+
+    Returns:
+        是否由本事务插入了新行
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(model).values(**values).on_conflict_do_nothing(
+            index_elements=[column.name for column in model.__table__.primary_key.columns]
+        )
+        return db.session.execute(statement).rowcount == 1
+
+    # 其他数据库：保存点内插入，主键冲突时只回滚保存点
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**values))
+        return True
+    except IntegrityError:
+        return False
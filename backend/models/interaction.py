@@ -5,9 +5,15 @@ from datetime import datetime
 
 class Interaction(db.Model):
     __tablename__ = 'interactions'
+    __table_args__ = (
+        # 历史分页 / 会话窗口：WHERE user_id = ? ORDER BY created_at（同时覆盖只按 user_id 的查询）
+        db.Index('ix_interactions_user_created', 'user_id', 'created_at'),
+        # 已看集合：SELECT DISTINCT card_id WHERE user_id = ?（只读索引即可完成）
+        db.Index('ix_interactions_user_card', 'user_id', 'card_id'),
+    )
     
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = db.Column(UUID(as_uuid=True), nullable=False, index=True)
+    user_id = db.Column(UUID(as_uuid=True), nullable=False)
     card_id = db.Column(UUID(as_uuid=True), db.ForeignKey('cards.id'), nullable=False)
     action = db.Column(db.Enum('LIKE', 'SKIP', 'FINISH_READ', 'EXPAND', name='interaction_action'))
     duration = db.Column(db.Integer)  # 停留毫秒数
@@ -0,0 +1,25 @@
+from models import db
+from sqlalchemy.dialects.postgresql import UUID
+
+class InteractionRollup(db.Model):
+    """
+    已归档交互的按用户、按标签、按天聚合（compaction 生成，原始行移入归档文件）
+
+    tag = ALL_TAGS 的行是该用户当天全部交互的汇总（不按标签拆分，用于统计）；
+    其余每行是带该标签的卡片上的交互，weight 为这些交互的兴趣权重变化之和（用于重建画像）。
+    """
+    __tablename__ = 'interaction_rollups'
+
+    ALL_TAGS = '*'
+
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    tag = db.Column(db.String(100), primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    like_count = db.Column(db.Integer, nullable=False, default=0)
+    skip_count = db.Column(db.Integer, nullable=False, default=0)
+    finish_count = db.Column(db.Integer, nullable=False, default=0)
+    expand_count = db.Column(db.Integer, nullable=False, default=0)
+    duration_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    duration_count = db.Column(db.Integer, nullable=False, default=0)
+    weight = db.Column(db.Float)  # 为空表示没有交互影响过该标签的权重（与 0 区分，重建画像时跳过）
@@ -0,0 +1,9 @@
+from models import db
+from sqlalchemy.dialects.postgresql import UUID
+
+class SeenCard(db.Model):
+    """已归档交互涉及的 (用户, 卡片)，原始行移入归档文件后已看集合仍从这里加载"""
+    __tablename__ = 'seen_cards'
+
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    card_id = db.Column(UUID(as_uuid=True), primary_key=True)
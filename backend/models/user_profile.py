@@ -0,0 +1,77 @@
+from models import db
+from sqlalchemy.dialects.postgresql import UUID, JSON
+from datetime import datetime
+from typing import Dict, Iterable
+
+class UserProfile(db.Model):
+    """用户兴趣画像 - 按交互增量维护的标签权重（未归一化）"""
+    __tablename__ = 'user_profiles'
+
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    tag_weights = db.Column(JSON, nullable=False, default=dict)  # {"Java": 4.0, "Memes": -1.0}
+    min_weight = db.Column(db.Float)  # 当前最小权重（运行值，用于归一化）
+    max_weight = db.Column(db.Float)  # 当前最大权重
+    interaction_count = db.Column(db.Integer, nullable=False, default=0)
+    last_interaction_id = db.Column(UUID(as_uuid=True))  # 最后一次计入画像的交互
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def apply(self, tags: Iterable[str], delta: float):
+        """
+        将一次交互的权重变化累加到画像，O(标签数)
+
+        只有当极值标签向内收缩时才需要重新扫描全部标签求 min/max。
+        """
+        if not delta:
+            return
+
+        # JSON 列不追踪原地修改，必须赋值新字典
+        weights = dict(self.tag_weights or {})
+        stale = False
+
+        for tag in tags:
+            old = weights.get(tag)
+            new = (old or 0.0) + delta
+            weights[tag] = new
+
+            if old is not None and (
+                (old == self.max_weight and new < old) or
+                (old == self.min_weight and new > old)
+            ):
+                stale = True
+            else:
+                self.max_weight = new if self.max_weight is None else max(self.max_weight, new)
+                self.min_weight = new if self.min_weight is None else min(self.min_weight, new)
+
+        self.tag_weights = weights
+        if stale:
+            self.min_weight = min(weights.values())
+            self.max_weight = max(weights.values())
+
+    def set_weights(self, weights: Dict[str, float]):
+        """整体替换标签权重（重建画像时使用）"""
+        self.tag_weights = dict(weights)
+        self.min_weight = min(weights.values()) if weights else None
+        self.max_weight = max(weights.values()) if weights else None
+
+    def normalized(self) -> Dict[str, float]:
+        """返回归一化到 [0, 1] 的标签权重"""
+        weights = self.tag_weights or {}
+        if not weights:
+            return {}
+
+        weight_range = (self.max_weight or 0.0) - (self.min_weight or 0.0)
+        if weight_range > 0:
+            return {
+                tag: (weight - self.min_weight) / weight_range
+                for tag, weight in weights.items()
+            }
+        # 所有权重相同
+        return {tag: 0.5 for tag in weights.keys()}
+
+    def to_dict(self):
+        return {
+            'user_id': str(self.user_id),
+            'tag_weights': self.tag_weights,
+            'interaction_count': self.interaction_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,38 @@
+from models import db
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+class UserStats(db.Model):
+    """用户交互统计汇总 - 随交互写入增量维护，/api/interaction/stats 直接读取"""
+    __tablename__ = 'user_stats'
+
+    # action -> 计数列
+    ACTION_COLUMNS = {
+        'LIKE': 'like_count',
+        'SKIP': 'skip_count',
+        'FINISH_READ': 'finish_count',
+        'EXPAND': 'expand_count'
+    }
+
+    user_id = db.Column(UUID(as_uuid=True), primary_key=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    like_count = db.Column(db.Integer, nullable=False, default=0)
+    skip_count = db.Column(db.Integer, nullable=False, default=0)
+    finish_count = db.Column(db.Integer, nullable=False, default=0)
+    expand_count = db.Column(db.Integer, nullable=False, default=0)
+    duration_sum = db.Column(db.BigInteger, nullable=False, default=0)  # 有停留时间的交互的毫秒数之和
+    duration_count = db.Column(db.Integer, nullable=False, default=0)  # 有停留时间的交互数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        total = self.total_count or 0
+        likes = self.like_count or 0
+        avg_duration = self.duration_sum / self.duration_count if self.duration_count else 0
+        return {
+            "total_interactions": total,
+            "total_likes": likes,
+            "total_skips": self.skip_count or 0,
+            "total_finished": self.finish_count or 0,
+            "avg_duration_ms": int(avg_duration),
+            "engagement_rate": round(likes / total * 100, 2) if total > 0 else 0
+        }
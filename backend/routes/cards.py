@@ -0,0 +1,60 @@
+"""
+Cards 路由 - 单卡片资源
+
+卡片创建后不再修改，/api/cards/<id> 返回带强 ETag 和长期 Cache-Control 的卡片 JSON，
+前端和 CDN 可以直接缓存；压缩体由 CardCache 缓存，每种编码只压缩一次。
+"""
+
+from flask import Blueprint, Response, jsonify, request
+from config import Config
+from services.card_cache import card_cache
+from services.compression import negotiate_encoding
+import hashlib
+import uuid
+
+cards_bp = Blueprint('cards', __name__)
+
+
+@cards_bp.route('/<card_id>', methods=['GET'])
+def get_card(card_id: str):
+    """获取单张卡片（可缓存）"""
+    try:
+        card_id = str(uuid.UUID(card_id))
+    except ValueError:
+        return jsonify({"error": "Invalid card_id format"}), 400
+    
+    try:
+        encoded = card_cache.get_or_load(card_id)
+    except Exception as e:
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    
+    if encoded is None:
+        return jsonify({"error": "Card not found"}), 404
+    
+    # 强 ETag：内容哈希；不同的 Content-Encoding 是不同的表示，ETag 加编码后缀区分
+    digest = hashlib.sha1(encoded).hexdigest()
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', '')) \
+        if Config.COMPRESSION_ENABLED and len(encoded) >= Config.COMPRESSION_MIN_SIZE else None
+    etag = f"{digest}-{encoding}" if encoding else digest
+    
+    headers = {
+        'Cache-Control': f"public, max-age={Config.CARD_HTTP_MAX_AGE}, immutable",
+        'Vary': 'Accept-Encoding'
+    }
+    
+    # 条件请求：任一表示的 ETag 命中即返回 304（内容相同）
+    if_none_match = request.if_none_match
+    if if_none_match.contains(etag) or if_none_match.contains(digest):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+    
+    if encoding:
+        body = card_cache.get_compressed(card_id, encoding, encoded)
+        headers['Content-Encoding'] = encoding
+    else:
+        body = encoded
+    
+    response = Response(body, mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
@@ -4,23 +4,34 @@ Feed 路由 - 卡片流服务
 提供卡片获取、队列管理等 API
 """
 
-from flask import Blueprint, jsonify, request, current_app
-from models import db
-from models.card import Card
-from models.interaction import Interaction
-from services.queue_service import QueueService
+from flask import Blueprint, Response, jsonify, request, current_app
+from services.queue_service import queue_service
 from services.card_service import CardService
+from services.card_index import card_index
+from services.card_cache import card_cache, merge_json
+from services.seen_service import seen_set_service
+from services.replenish_worker import replenish_worker
 from services.recommendation_service import recommendation_service
 from services.content_factory import content_factory
+from services.trending_service import trending_service
 import uuid
 
 feed_bp = Blueprint('feed', __name__)
-queue_service = QueueService()
 
 # 配置
 MIN_CARD_STOCK = 10  # 最低卡片库存
 MIN_QUEUE_LENGTH = 5  # 触发补货的队列长度阈值
 PREEMPTIVE_GENERATE_THRESHOLD = 3  # 提前触发生成的阈值（未看过的卡片数）
+MAX_BATCH_SIZE = 20  # /batch 单次最多返回的卡片数
+
+# 注册蓝图的应用对象：后台补货任务在其应用上下文中运行
+_app = None
+
+
+@feed_bp.record_once
+def _bind_app(state):
+    global _app
+    _app = state.app
 
 
 @feed_bp.route('/next', methods=['GET'])
@@ -30,85 +41,203 @@ def get_next_card():
     
     工作流程:
     1. 从用户队列获取卡片ID
-    2. 如果队列为空，触发智能补货
-    3. 如果卡片库存不足，触发异步生成
+    2. 如果队列为空，等待后台补货或同步补货
+    3. 队列低于阈值时提交后台补货；卡片库存不足时触发异步生成
     4. 返回卡片内容
     """
-    user_id = request.args.get('user_id')
-    
-    if not user_id:
-        user_id = str(uuid.uuid4())
-    
-    # 验证 UUID 格式
-    try:
-        uuid.UUID(user_id)
-    except ValueError:
-        user_id = str(uuid.uuid4())
+    user_id = _resolve_user_id()
     
-    # 1. 从队列获取卡片ID
+    # 1. 从队列获取卡片ID（快照模式下连同卡片内容一起返回），同时拿到剩余长度，一次往返
     try:
-        card_id = queue_service.pop_card(user_id)
+        popped = queue_service.pop_and_inspect(user_id, 1, MIN_QUEUE_LENGTH)
     except Exception as e:
         return jsonify({"error": f"Queue error: {str(e)}"}), 500
     
-    # 2. 如果队列为空，触发补货
-    if not card_id:
-        replenish_count = replenish_queue(user_id)
-        
-        if replenish_count == 0:
-            # 数据库也没有可用卡片
-            if content_factory.is_llm_available():
-                # LLM 可用，触发生成
-                trigger_card_generation(user_id)
-                return jsonify({
-                    "error": "No cards available, generating new content...",
-                    "generating": True
-                }), 202  # 202 Accepted 表示请求已接受，正在处理
-            else:
-                # LLM 不可用，返回错误
-                return jsonify({
-                    "error": "No cards available. LLM not configured - please set OPENAI_API_KEY or DEEPSEEK_API_KEY.",
-                    "generating": False,
-                    "llm_available": False
-                }), 503  # 503 Service Unavailable
+    # 2. 如果队列为空，先等后台补货，等不到再同步补货
+    if not popped.items:
+        if replenish_worker.wait(user_id):
+            popped = queue_service.pop_and_inspect(user_id, 1, MIN_QUEUE_LENGTH)
         
-        card_id = queue_service.pop_card(user_id)
+        if not popped.items:
+            replenish_count = replenish_queue(user_id)
+            
+            if replenish_count == 0:
+                # 数据库也没有可用卡片
+                return _no_cards_response(user_id)
+            
+            popped = queue_service.pop_and_inspect(user_id, 1, MIN_QUEUE_LENGTH)
+    
+    card_id, card_json = popped.items[0] if popped.items else (None, None)
     
     # 3. 如果还是没有，返回错误
     if not card_id:
         return jsonify({"error": "Card not found"}), 404
     
-    # 4. 从数据库获取卡片内容
+    # 4. 没有快照时获取卡片内容（优先读取预编码缓存，未命中再查数据库）
+    if card_json is None:
+        try:
+            card_json = card_cache.get_or_load(card_id)
+        except Exception as e:
+            return jsonify({"error": f"Database error: {str(e)}"}), 500
+    
+    if card_json is None:
+        return jsonify({"error": "Card not found in database"}), 404
+    
+    # 5. 队列/库存状态，必要时提前触发生成
+    status = _check_stock(user_id, popped.remaining, popped.below_min)
+    
+    # 6. 构建响应：在缓存的卡片 JSON 上拼接用户相关字段，不重新序列化 payload
+    return Response(merge_json(card_json, status), mimetype='application/json')
+
+
+@feed_bp.route('/batch', methods=['GET'])
+def get_next_cards():
+    """
+    批量获取接下来的 n 张卡片（前端预取用）
+    
+    一次从队列弹出 n 个 ID，一次 IN 查询加载卡片，
+    补货和提前生成检查每批只做一次。
+    
+    查询参数:
+        user_id: 用户ID
+        n: 卡片数量（默认 5，最多 MAX_BATCH_SIZE）
+    """
+    user_id = _resolve_user_id()
+    
     try:
-        card = CardService.get_card_by_id(card_id)
+        n = int(request.args.get('n', 5))
+    except ValueError:
+        return jsonify({"error": "n must be an integer"}), 400
+    n = max(1, min(n, MAX_BATCH_SIZE))
+    
+    # 1. 从队列一次取出 n 个卡片ID（连同快照和剩余长度），不够时补货一次再取
+    try:
+        result = queue_service.pop_and_inspect(user_id, n, MIN_QUEUE_LENGTH)
+        popped = result.items
+        if len(popped) < n and replenish_worker.wait(user_id):
+            result = queue_service.pop_and_inspect(user_id, n - len(popped), MIN_QUEUE_LENGTH)
+            popped += result.items
+        if len(popped) < n:
+            if replenish_queue(user_id, count=max(10, n - len(popped))) > 0:
+                result = queue_service.pop_and_inspect(user_id, n - len(popped), MIN_QUEUE_LENGTH)
+                popped += result.items
     except Exception as e:
-        return jsonify({"error": f"Database error: {str(e)}"}), 500
+        return jsonify({"error": f"Queue error: {str(e)}"}), 500
     
-    if not card:
-        return jsonify({"error": "Card not found in database"}), 404
+    if not popped:
+        return _no_cards_response(user_id)
     
-    # 5. 检查队列和库存状态
-    queue_length = queue_service.get_queue_length(user_id)
-    total_cards = Card.query.count()
+    # 2. 没有快照的卡片批量获取（缓存 + 一次 IN 查询）
+    encoded = {card_id: snapshot for card_id, snapshot in popped if snapshot is not None}
+    missing = [card_id for card_id, snapshot in popped if snapshot is None]
+    if missing:
+        try:
+            encoded.update(card_cache.get_many(missing))
+        except Exception as e:
+            return jsonify({"error": f"Database error: {str(e)}"}), 500
     
-    # 6. 计算用户还有多少未看过的卡片
-    unviewed_cards = CardService.get_unviewed_cards(user_id, limit=100)
-    unviewed_count = len(unviewed_cards)
+    cards = [encoded[card_id] for card_id, _ in popped if card_id in encoded]
     
-    # 7. 提前触发生成：如果未看过的卡片少于阈值，提前生成
+    # 3. 队列/库存状态（每批一次）
+    status = _check_stock(user_id, result.remaining, result.below_min)
+    
+    body = merge_json(b'{"cards":[' + b','.join(cards) + b']}', status)
+    return Response(body, mimetype='application/json')
+
+
+@feed_bp.route('/return', methods=['POST'])
+def return_cards():
+    """
+    归还预取后没有展示的卡片（页面关闭时前端用 keepalive 请求上报）
+    
+    请求体: {"user_id": "...", "card_ids": [...]}，放回队首，下次打开时优先展示
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    card_ids = data.get('card_ids')
+    
+    if not user_id or not isinstance(card_ids, list):
+        return jsonify({"error": "user_id and card_ids required"}), 400
+    if len(card_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Too many cards (max {MAX_BATCH_SIZE})"}), 400
+    
+    try:
+        uuid.UUID(str(user_id))
+        card_ids = [str(uuid.UUID(str(card_id))) for card_id in card_ids]
+    except ValueError as e:
+        return jsonify({"error": f"Invalid UUID format: {str(e)}"}), 400
+    
+    queue_service.return_cards(user_id, card_ids)
+    return jsonify({"status": "ok", "returned": len(card_ids)})
+
+
+def _resolve_user_id() -> str:
+    """读取 user_id 参数，缺失或格式错误时生成新的匿名 ID"""
+    user_id = request.args.get('user_id')
+    
+    # 验证 UUID 格式
+    try:
+        uuid.UUID(user_id or '')
+        return user_id
+    except ValueError:
+        pass
+    
+    # 新的匿名 ID 没有任何交互：本次请求内不为它加载已看集合（Redis 键 + 一次数据库查询）
+    user_id = str(uuid.uuid4())
+    seen_set_service.assume_empty(user_id)
+    return user_id
+
+
+def _no_cards_response(user_id: str):
+    """卡片池没有可用卡片时的响应：LLM 可用则触发生成 (202)，否则 503"""
+    if content_factory.is_llm_available():
+        # LLM 可用，触发生成
+        trigger_card_generation(user_id)
+        return jsonify({
+            "error": "No cards available, generating new content...",
+            "generating": True
+        }), 202  # 202 Accepted 表示请求已接受，正在处理
+    
+    # LLM 不可用，返回错误
+    return jsonify({
+        "error": "No cards available. LLM not configured - please set OPENAI_API_KEY or DEEPSEEK_API_KEY.",
+        "generating": False,
+        "llm_available": False
+    }), 503  # 503 Service Unavailable
+
+
+def _check_stock(user_id: str, queue_length: int, needs_replenish: bool) -> dict:
+    """
+    检查库存状态（计数器，O(1)），队列偏低时提交后台补货，未看卡片不足时提前触发生成
+    
+    Args:
+        queue_length: 出队后剩余的队列长度（由 pop_and_inspect 一并返回）
+        needs_replenish: 队列是否低于 MIN_QUEUE_LENGTH
+    
+    Returns:
+        拼接到响应中的状态字段
+    """
+    total_cards = card_index.total_cards()
+    
+    # 队列低于阈值：提交后台补货（每个用户同时最多一个任务）
+    if needs_replenish:
+        replenish_worker.schedule(user_id, replenish_queue, _app)
+    
+    # 用户还有多少未看过的卡片 = 总数 - 已看集合大小
+    unviewed_count = max(0, total_cards - seen_set_service.seen_count(user_id))
+    
+    # 提前触发生成：如果未看过的卡片少于阈值，提前生成
     if unviewed_count <= PREEMPTIVE_GENERATE_THRESHOLD and content_factory.is_llm_available():
         if not content_factory._generating:  # 避免重复触发
             print(f"[Feed] Preemptive generation: only {unviewed_count} unviewed cards left")
             trigger_card_generation(user_id, async_mode=True)
     
-    # 8. 构建响应
-    response_data = card.to_dict()
-    response_data['queue_length'] = queue_length
-    response_data['unviewed_count'] = unviewed_count
-    response_data['needs_replenish'] = queue_length < MIN_QUEUE_LENGTH
-    response_data['total_cards_in_pool'] = total_cards
-    
-    return jsonify(response_data)
+    return {
+        'queue_length': queue_length,
+        'unviewed_count': unviewed_count,
+        'needs_replenish': needs_replenish,
+        'total_cards_in_pool': total_cards
+    }
 
 
 def replenish_queue(user_id: str, count: int = 10) -> int:
@@ -125,21 +254,30 @@ def replenish_queue(user_id: str, count: int = 10) -> int:
     Returns:
         成功推送的卡片数量
     """
-    # 使用推荐服务获取卡片
-    recommended_cards = recommendation_service.get_recommended_cards(user_id, count)
+    # 使用推荐服务获取卡片（排除已在队列里或已出队未交互的卡片）
+    queued_ids = queue_service.get_members(user_id)
+    recommended_cards = recommendation_service.get_recommended_cards(
+        user_id, count, exclude_ids=queued_ids
+    )
     
     if not recommended_cards:
         # 如果推荐服务返回空，尝试获取任意未看过的卡片
-        cards = CardService.get_unviewed_cards(user_id, limit=count)
-        card_ids = [str(card.id) for card in cards]
-    else:
-        card_ids = [str(card.id) for card in recommended_cards]
-    
-    # 推送到队列
-    if card_ids:
-        queue_service.push_cards(user_id, card_ids)
-    
-    return len(card_ids)
+        recommended_cards = [
+            card for card in CardService.get_unviewed_cards(user_id, limit=count)
+            if str(card.id) not in queued_ids
+        ]
+    
+    card_ids = [str(card.id) for card in recommended_cards]
+    
+    # 快照模式下把序列化后的卡片一起入队，出队时无需再查数据库
+    snapshots = None
+    if queue_service.snapshots_enabled:
+        snapshots = {str(card.id): card_cache.put(card) for card in recommended_cards}
+    
+    # 推送到队列（成员集合去重，返回实际入队的数量）
+    if not card_ids:
+        return 0
+    return len(queue_service.push_cards(user_id, card_ids, snapshots=snapshots))
 
 
 def trigger_card_generation(user_id: str, async_mode: bool = True):
@@ -250,6 +388,26 @@ def pool_status():
     return jsonify(status)
 
 
+@feed_bp.route('/trending', methods=['GET'])
+def get_trending():
+    """
+    获取热门卡片（最近 TRENDING_WINDOW_HOURS 小时，由事件日志派生，不查询交互表）
+    
+    参数: limit（默认 20，最多 MAX_BATCH_SIZE）
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_BATCH_SIZE)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    return jsonify({
+        "trending": [
+            {"card_id": card_id, "score": score}
+            for card_id, score in trending_service.top_cards(limit)
+        ]
+    })
+
+
 @feed_bp.route('/recommendations', methods=['GET'])
 def get_recommendations():
     """
@@ -1,10 +1,21 @@
 from flask import Blueprint, jsonify, request
 from models import db
+from models.card import Card
 from models.interaction import Interaction
+from services.interaction_service import InteractionService
+from services.interaction_buffer import interaction_buffer, BufferFullError
+from services.stats_service import stats_service
+from sqlalchemy import or_
+from datetime import datetime, timedelta
+import base64
 import uuid
 
 interaction_bp = Blueprint('interaction', __name__)
 
+VALID_ACTIONS = ['LIKE', 'SKIP', 'FINISH_READ', 'EXPAND']
+MAX_BATCH_EVENTS = 200  # /record/batch 单次最多事件数
+MAX_HISTORY_LIMIT = 100  # /history 单页最多条数
+
 @interaction_bp.route('/record', methods=['POST'])
 def record_interaction():
     """记录用户交互行为"""
@@ -15,28 +26,121 @@ def record_interaction():
         return jsonify({"error": "Missing required fields"}), 400
     
     # 验证 action 枚举值
-    valid_actions = ['LIKE', 'SKIP', 'FINISH_READ', 'EXPAND']
-    if data['action'] not in valid_actions:
-        return jsonify({"error": f"Invalid action. Must be one of: {valid_actions}"}), 400
+    if data['action'] not in VALID_ACTIONS:
+        return jsonify({"error": f"Invalid action. Must be one of: {VALID_ACTIONS}"}), 400
     
     try:
-        interaction = Interaction(
-            user_id=uuid.UUID(data['user_id']),
-            card_id=uuid.UUID(data['card_id']),
-            action=data['action'],
-            duration=data.get('duration')
-        )
-        
-        db.session.add(interaction)
-        db.session.commit()
-        
-        return jsonify({"status": "ok", "id": str(interaction.id)})
+        user_uuid = uuid.UUID(data['user_id'])
+        card_uuid = uuid.UUID(data['card_id'])
     except ValueError as e:
         return jsonify({"error": f"Invalid UUID format: {str(e)}"}), 400
+    
+    duration = data.get('duration')
+    if duration is not None and not isinstance(duration, int):
+        return jsonify({"error": "duration must be an integer"}), 400
+    
+    row = InteractionService.new_row(user_uuid, card_uuid, data['action'], duration)
+    
+    # 写后缓冲：写入溢出文件后立即返回，画像/已看集合随组提交一起更新
+    if interaction_buffer.is_active():
+        try:
+            interaction_buffer.submit(row)
+        except BufferFullError:
+            response = jsonify({"error": "Interaction buffer is full, retry later"})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        return jsonify({"status": "queued", "id": str(row['id'])}), 202
+    
+    try:
+        # 同一事务内增量更新兴趣画像
+        tags = db.session.query(Card.tags).filter(Card.id == card_uuid).scalar()
+        InteractionService.write_batch([row], {card_uuid: tags})
+        
+        return jsonify({"status": "ok", "id": str(row['id'])})
     except Exception as e:
-        db.session.rollback()
         return jsonify({"error": f"Failed to record interaction: {str(e)}"}), 500
 
+@interaction_bp.route('/record/batch', methods=['POST'])
+def record_interactions_batch():
+    """
+    批量记录交互行为（前端按时间间隔或页面隐藏时批量上报）
+    
+    请求体: {"user_id": "...", "events": [{"card_id", "action", "duration", "user_id"?}, ...]}
+    （也接受直接传事件数组，此时每个事件需自带 user_id）
+    
+    逐条校验，合法事件一次批量 INSERT、一次提交；画像按用户各加锁更新一次。
+    
+    Returns:
+        每条事件的处理结果 results[i] = {"status": "ok", "id"} 或 {"status": "error", "error"}
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        default_user_id, events = None, data
+    elif isinstance(data, dict) and isinstance(data.get('events'), list):
+        default_user_id, events = data.get('user_id'), data['events']
+    else:
+        return jsonify({"error": "events array required"}), 400
+    
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({"error": f"Too many events (max {MAX_BATCH_EVENTS})"}), 400
+    
+    # 1. 逐条校验格式
+    results = [None] * len(events)
+    parsed = []  # (index, user_id, card_id, action, duration)
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            results[index] = {"status": "error", "error": "Event must be an object"}
+            continue
+        
+        user_id = event.get('user_id', default_user_id)
+        if not user_id or 'card_id' not in event or 'action' not in event:
+            results[index] = {"status": "error", "error": "Missing required fields"}
+            continue
+        if event['action'] not in VALID_ACTIONS:
+            results[index] = {"status": "error", "error": f"Invalid action. Must be one of: {VALID_ACTIONS}"}
+            continue
+        
+        duration = event.get('duration')
+        if duration is not None and not isinstance(duration, int):
+            results[index] = {"status": "error", "error": "duration must be an integer"}
+            continue
+        
+        try:
+            parsed.append((index, uuid.UUID(str(user_id)), uuid.UUID(str(event['card_id'])),
+                           event['action'], duration))
+        except ValueError as e:
+            results[index] = {"status": "error", "error": f"Invalid UUID format: {str(e)}"}
+    
+    # 2. 一次 IN 查询校验卡片存在并取回标签
+    card_tags = InteractionService.load_card_tags(card_id for _, _, card_id, _, _ in parsed)
+    
+    # 3. 构造批量插入的行（created_at 按事件顺序递增，保证同批事件的先后关系）
+    now = datetime.utcnow()
+    rows = []
+    for offset, (index, user_id, card_id, action, duration) in enumerate(parsed):
+        if card_id not in card_tags:
+            results[index] = {"status": "error", "error": "Card not found"}
+            continue
+        row = InteractionService.new_row(
+            user_id, card_id, action, duration, created_at=now + timedelta(microseconds=offset)
+        )
+        rows.append(row)
+        results[index] = {"status": "ok", "id": str(row['id'])}
+    
+    # 4. 一次 executemany 插入，画像更新，一次提交
+    try:
+        InteractionService.write_batch(rows, card_tags)
+    except Exception as e:
+        return jsonify({"error": f"Failed to record interactions: {str(e)}"}), 500
+    
+    accepted = len(rows)
+    return jsonify({
+        "status": "ok",
+        "accepted": accepted,
+        "rejected": len(events) - accepted,
+        "results": results
+    })
+
 @interaction_bp.route('/stats', methods=['GET'])
 def get_stats():
     """获取用户统计数据"""
@@ -45,59 +149,85 @@ def get_stats():
         return jsonify({"error": "user_id required"}), 400
     
     try:
-        user_uuid = uuid.UUID(user_id)
-        
-        total = Interaction.query.filter_by(user_id=user_uuid).count()
-        likes = Interaction.query.filter_by(user_id=user_uuid, action='LIKE').count()
-        skips = Interaction.query.filter_by(user_id=user_uuid, action='SKIP').count()
-        finished = Interaction.query.filter_by(user_id=user_uuid, action='FINISH_READ').count()
-        
-        # 计算平均停留时间
-        interactions_with_duration = Interaction.query.filter(
-            Interaction.user_id == user_uuid,
-            Interaction.duration.isnot(None)
-        ).all()
-        
-        avg_duration = 0
-        if interactions_with_duration:
-            avg_duration = sum(i.duration for i in interactions_with_duration) / len(interactions_with_duration)
-        
-        return jsonify({
-            "total_interactions": total,
-            "total_likes": likes,
-            "total_skips": skips,
-            "total_finished": finished,
-            "avg_duration_ms": int(avg_duration),
-            "engagement_rate": round(likes / total * 100, 2) if total > 0 else 0
-        })
+        # 直接读取增量维护的汇总行（O(1)）
+        return jsonify(stats_service.get_stats(user_id))
     except ValueError:
         return jsonify({"error": "Invalid user_id format"}), 400
 
+def _encode_cursor(created_at: datetime, interaction_id: uuid.UUID) -> str:
+    """历史分页游标：最后一条的 (created_at, id)，URL 安全的 base64"""
+    raw = f"{created_at.isoformat()}|{interaction_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _decode_cursor(token: str):
+    """解析游标，格式不合法时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        created_at, interaction_id = raw.split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(interaction_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
 @interaction_bp.route('/history', methods=['GET'])
 def get_history():
-    """获取用户历史记录"""
+    """
+    获取用户历史记录（按时间倒序，键集分页）
+    
+    参数: user_id, limit（默认 20，最多 MAX_HISTORY_LIMIT）, after（上一页返回的 next_cursor）
+    
+    按 (created_at, id) 倒序，after 之后的一页直接从 (user_id, created_at) 索引定位，
+    翻到多深都只读一页的行，不用 OFFSET。
+    
+    Returns:
+        {"history": [...], "next_cursor": "..." | null}（没有更多记录时 next_cursor 为 null）
+    """
     user_id = request.args.get('user_id')
-    limit = int(request.args.get('limit', 20))
+    after = request.args.get('after')
     
     if not user_id:
         return jsonify({"error": "user_id required"}), 400
     
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_HISTORY_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
     try:
         user_uuid = uuid.UUID(user_id)
-        
-        interactions = Interaction.query.filter_by(user_id=user_uuid)\
-            .order_by(Interaction.created_at.desc())\
-            .limit(limit)\
-            .all()
-        
-        history = [{
-            "id": str(i.id),
-            "card_id": str(i.card_id),
-            "action": i.action,
-            "duration": i.duration,
-            "created_at": i.created_at.isoformat()
-        } for i in interactions]
-        
-        return jsonify({"history": history})
     except ValueError:
         return jsonify({"error": "Invalid user_id format"}), 400
+    
+    query = Interaction.query.filter(Interaction.user_id == user_uuid)
+    if after:
+        try:
+            cursor_time, cursor_id = _decode_cursor(after)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        # created_at <= ? 是索引上的范围条件；同一时刻的记录再按 id 接着翻
+        query = query.filter(
+            Interaction.created_at <= cursor_time,
+            or_(Interaction.created_at < cursor_time, Interaction.id < cursor_id)
+        )
+    
+    # 多取一条判断是否还有下一页
+    interactions = query.order_by(Interaction.created_at.desc(), Interaction.id.desc())\
+        .limit(limit + 1)\
+        .all()
+    
+    has_more = len(interactions) > limit
+    interactions = interactions[:limit]
+    
+    history = [{
+        "id": str(i.id),
+        "card_id": str(i.card_id),
+        "action": i.action,
+        "duration": i.duration,
+        "created_at": i.created_at.isoformat()
+    } for i in interactions]
+    
+    next_cursor = None
+    if has_more:
+        last = interactions[-1]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+    
+    return jsonify({"history": history, "next_cursor": next_cursor})
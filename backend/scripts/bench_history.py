@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+交互历史查询基准（SQLite）
+
+在独立的 SQLite 文件中生成 N 条交互（默认 1000 万），分别在旧索引
+（user_id / created_at 单列索引）和复合索引（(user_id, created_at) / (user_id, card_id)）下
+打印各查询的 EXPLAIN QUERY PLAN 和延迟：
+- history 第一页 / 深翻页（OFFSET）/ 深翻页（after 游标）
+- get_session_context 的会话窗口
+- 已看集合加载（DISTINCT card_id）
+
+数据只生成一次（--db 已存在时直接复用，--rebuild 重新生成），不会触碰应用数据库。
+"""
+import sys
+import os
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+
+from models import db
+from models.card import Card
+from models.interaction import Interaction
+
+ACTIONS = ['LIKE', 'SKIP', 'FINISH_READ', 'EXPAND']
+CHUNK_SIZE = 100_000
+
+# 旧索引（迁移前）和复合索引（迁移后）
+LEGACY_INDEXES = [
+    'CREATE INDEX ix_interactions_user_id ON interactions (user_id)',
+    'CREATE INDEX ix_interactions_created_at ON interactions (created_at)',
+]
+COMPOSITE_INDEXES = [
+    'CREATE INDEX ix_interactions_user_created ON interactions (user_id, created_at)',
+    'CREATE INDEX ix_interactions_user_card ON interactions (user_id, card_id)',
+    'CREATE INDEX ix_interactions_created_at ON interactions (created_at)',
+]
+
+HISTORY_COLUMNS = 'id, card_id, action, duration, created_at'
+QUERIES = {
+    'history first page': (
+        f'SELECT {HISTORY_COLUMNS} FROM interactions WHERE user_id = :user_id '
+        'ORDER BY created_at DESC, id DESC LIMIT :limit'
+    ),
+    'history deep page (OFFSET)': (
+        f'SELECT {HISTORY_COLUMNS} FROM interactions WHERE user_id = :user_id '
+        'ORDER BY created_at DESC, id DESC LIMIT :limit OFFSET :offset'
+    ),
+    'history deep page (after cursor)': (
+        f'SELECT {HISTORY_COLUMNS} FROM interactions WHERE user_id = :user_id '
+        'AND created_at <= :cursor_time AND (created_at < :cursor_time OR id < :cursor_id) '
+        'ORDER BY created_at DESC, id DESC LIMIT :limit'
+    ),
+    'session context window': (
+        'SELECT interactions.action, interactions.duration, cards.id, cards.tags, cards.complexity '
+        'FROM interactions JOIN cards ON cards.id = interactions.card_id '
+        'WHERE interactions.user_id = :user_id AND interactions.created_at >= :window_start '
+        'ORDER BY interactions.created_at DESC'
+    ),
+    'seen set load': (
+        'SELECT DISTINCT card_id FROM interactions WHERE user_id = :user_id'
+    ),
+}
+
+def format_time(value: datetime) -> str:
+    """SQLAlchemy 在 SQLite 中存储 DateTime 的格式"""
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+def new_id() -> str:
+    """
+    UUID 的 hex 形式（与 SQLAlchemy 在 SQLite 中的存储一致）
+
+    列类型 UUID 在 SQLite 中是 NUMERIC 亲和性，全数字或只含一个 e 的 hex 串会被转成数值
+    （大数溢出成 inf 后主键冲突），千万级数据必然碰到，生成时跳过这类 id。
+    """
+    while True:
+        value = uuid.uuid4().hex
+        if not value.replace('e', '', 1).isdigit():
+            return value
+
+def generate(db_path, rows, users, cards, days):
+    """生成基准数据（按时间递增写入，用户随机交错，与线上写入顺序一致）"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # 表结构直接取自模型，只建表不建索引（索引在各轮测量前创建）
+    engine = create_engine(f'sqlite:///{db_path}')
+    tables = [Card.__table__, Interaction.__table__]
+    saved = {table: set(table.indexes) for table in tables}
+    for table in tables:
+        table.indexes.clear()
+    try:
+        db.metadata.create_all(engine, tables=tables)
+    finally:
+        for table, indexes in saved.items():
+            table.indexes.update(indexes)
+    engine.dispose()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+
+    user_ids = [new_id() for _ in range(users)]
+    card_ids = [new_id() for _ in range(cards)]
+    conn.executemany(
+        'INSERT INTO cards (id, topic, tags, complexity, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        [(card_id, f'topic-{i}', '["bench"]', 3, '{}', format_time(datetime.utcnow()))
+         for i, card_id in enumerate(card_ids)]
+    )
+
+    start = datetime.utcnow() - timedelta(days=days)
+    step = timedelta(days=days) / rows
+    started = time.perf_counter()
+    for offset in range(0, rows, CHUNK_SIZE):
+        chunk = [
+            (
+                new_id(),
+                random.choice(user_ids),
+                random.choice(card_ids),
+                random.choice(ACTIONS),
+                random.randint(200, 60_000),
+                format_time(start + step * i)
+            )
+            for i in range(offset, min(offset + CHUNK_SIZE, rows))
+        ]
+        conn.executemany(
+            'INSERT INTO interactions (id, user_id, card_id, action, duration, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            chunk
+        )
+        conn.commit()
+        done = offset + len(chunk)
+        if done % (CHUNK_SIZE * 10) == 0 or done == rows:
+            print(f"  {done:,}/{rows:,} rows ({time.perf_counter() - started:.0f}s)")
+    conn.close()
+
+def apply_indexes(conn, statements):
+    """删除 interactions 上的全部索引后创建指定索引"""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'interactions' "
+        "AND sql IS NOT NULL"
+    )]
+    for name in names:
+        conn.execute(f'DROP INDEX {name}')
+    started = time.perf_counter()
+    for statement in statements:
+        conn.execute(statement)
+    conn.execute('ANALYZE')
+    conn.commit()
+    print(f"  indexes built in {time.perf_counter() - started:.1f}s")
+
+def sample_params(conn, users, samples, limit, depth, window_minutes):
+    """抽样用户，并用 OFFSET 预先定位深翻页的游标（不计入计时）"""
+    user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM interactions LIMIT ?', (users,))]
+    newest = conn.execute('SELECT MAX(created_at) FROM interactions').fetchone()[0]
+    window_start = format_time(datetime.fromisoformat(newest) - timedelta(minutes=window_minutes))
+
+    params = []
+    for user_id in random.sample(user_ids, min(samples, len(user_ids))):
+        base = {'user_id': user_id, 'limit': limit + 1, 'window_start': window_start,
+                'offset': depth * limit, 'cursor_time': '', 'cursor_id': ''}
+        cursor = conn.execute(
+            'SELECT created_at, id FROM interactions WHERE user_id = :user_id '
+            'ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET :position',
+            {'user_id': user_id, 'position': depth * limit - 1}
+        ).fetchone()
+        if cursor is not None:
+            base['cursor_time'], base['cursor_id'] = cursor
+        params.append(base)
+    return params
+
+def measure(conn, params):
+    """打印每个查询的执行计划和延迟（中位数 / p95 / 平均返回行数）"""
+    for name, sql in QUERIES.items():
+        print(f"\n  [{name}]")
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params[0]):
+            print(f"    plan: {row[-1]}")
+
+        timings = []
+        returned = 0
+        for values in params:
+            started = time.perf_counter()
+            returned += len(conn.execute(sql, values).fetchall())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"    latency: median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms, "
+              f"avg rows {returned / len(params):.0f}")
+
+def run_benchmark(args):
+    if args.rebuild or not os.path.exists(args.db):
+        print(f"Generating {args.rows:,} interactions for {args.users:,} users in {args.db}...")
+        generate(args.db, args.rows, args.users, args.cards, args.days)
+
+    conn = sqlite3.connect(args.db)
+    total = conn.execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+    print(f"\nInteractions: {total:,} (~{total // args.users:,} per user), "
+          f"page size {args.limit}, deep page = page {args.depth}")
+
+    for label, statements in (('legacy single-column indexes', LEGACY_INDEXES),
+                              ('composite indexes', COMPOSITE_INDEXES)):
+        print(f"\n=== {label} ===")
+        apply_indexes(conn, statements)
+        # 两轮使用相同的抽样（固定随机种子）
+        random.seed(args.seed)
+        params = sample_params(conn, args.users, args.samples, args.limit, args.depth, args.window_minutes)
+        measure(conn, params)
+
+    conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark MindSlot interaction history queries on SQLite')
+    parser.add_argument('--db', type=str, default='bench_history.db',
+                      help='SQLite file for the benchmark data (default: bench_history.db)')
+    parser.add_argument('--rows', type=int, default=10_000_000,
+                      help='Number of interactions to generate (default: 10,000,000)')
+    parser.add_argument('--users', type=int, default=2_000,
+                      help='Number of users (default: 2,000)')
+    parser.add_argument('--cards', type=int, default=50_000,
+                      help='Number of cards (default: 50,000)')
+    parser.add_argument('--days', type=int, default=180,
+                      help='Time span of the generated interactions in days (default: 180)')
+    parser.add_argument('--limit', type=int, default=20,
+                      help='History page size (default: 20)')
+    parser.add_argument('--depth', type=int, default=200,
+                      help='Page number used for the deep page queries (default: 200)')
+    parser.add_argument('--window-minutes', type=int, default=24 * 60,
+                      help='Session window for the session context query (default: 1 day, '
+                           'so the window is non-empty on synthetic data)')
+    parser.add_argument('--samples', type=int, default=200,
+                      help='Number of sampled users per query (default: 200)')
+    parser.add_argument('--seed', type=int, default=42,
+                      help='Random seed for sampling (default: 42)')
+    parser.add_argument('--rebuild', action='store_true',
+                      help='Regenerate the data even if --db exists')
+
+    args = parser.parse_args()
+    run_benchmark(args)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+交互压实 / 归档脚本
+
+把早于保留天数的交互汇总进 interaction_rollups，原始行移入压缩归档段（建议每天定时执行一次）
+"""
+import sys
+import os
+import argparse
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from services.compaction_service import compaction_service
+
+def compact_interactions(days=None, batch_size=None, dry_run=False):
+    """归档早于 days 天的交互"""
+    with app.app_context():
+        db.create_all()
+        cutoff = compaction_service.get_cutoff(days)
+
+        if dry_run:
+            count = compaction_service.count_archivable(days)
+            print(f"{count} interaction(s) before {cutoff.isoformat()} would be archived")
+            return count
+
+        print(f"Archiving interactions before {cutoff.isoformat()} "
+              f"({compaction_service.codec}, dir: {compaction_service.archive_dir})...")
+        result = compaction_service.compact(days, batch_size)
+
+        print(f"✓ Archived {result['archived']} interaction(s) into {len(result['segments'])} segment(s)")
+        return result['archived']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compact old MindSlot interactions into rollups and archive files')
+    parser.add_argument('--days', type=int,
+                      help='Keep this many days of raw interactions (default: INTERACTION_ARCHIVE_DAYS)')
+    parser.add_argument('--batch-size', type=int,
+                      help='Interactions per archive segment (default: INTERACTION_ARCHIVE_BATCH)')
+    parser.add_argument('--dry-run', action='store_true',
+                      help='Only count the interactions that would be archived')
+    
+    args = parser.parse_args()
+    compact_interactions(args.days, args.batch_size, args.dry_run)
@@ -197,6 +197,7 @@ def create_demo_cards():
     with app.app_context():
         print("🎨 Creating demo cards...")
         
+        cards = []
         for card_data in demo_cards:
             card = Card(
                 topic=card_data["topic"],
@@ -205,8 +206,11 @@ def create_demo_cards():
                 payload=card_data["payload"]
             )
             db.session.add(card)
+            cards.append(card)
         
         db.session.commit()
+        
+        # 服务进程的卡片索引（及预计算候选池）按 SYNC_INTERVAL_SECONDS 定期增量同步，会自动发现这些卡片
         print(f"✅ Successfully created {len(demo_cards)} demo cards!")
         
         # 列出所有卡片
@@ -10,14 +10,15 @@ import argparse
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app
-from models import db
+from config import Config
 from agents.director import DirectorAgent
 from agents.actor import ActorAgent
 from agents.validator import CardValidator
 from services.card_service import CardService
+from services.generation_engine import generation_engine
 
-def run_factory(batch_size=20, domains="Java, Python, AI, History, Science, Philosophy"):
-    """运行内容生成工厂"""
+def run_factory(batch_size=20, domains="Java, Python, AI, History, Science, Philosophy", concurrency=None):
+    """运行内容生成工厂（concurrency: 同时进行的生成数，默认 FACTORY_MAX_INFLIGHT）"""
     print(f"🏭 Starting factory run: generating {batch_size} cards...")
     print(f"📚 Domains: {domains}\n")
     
@@ -34,54 +35,36 @@ def run_factory(batch_size=20, domains="Java, Python, AI, History, Science, Phil
         print("✗ Failed to generate topics. Check your LLM API configuration.")
         return 0
     
-    # 2. Actor 逐个生成内容
-    print("🎨 Step 2: Actor generating cards...")
-    created_count = 0
-    failed_count = 0
+    # 2. Actor 并行生成内容，每完成一张验证并入库
+    print(f"🎨 Step 2: Actor generating cards ({concurrency or Config.FACTORY_MAX_INFLIGHT} in flight)...")
     
-    for idx, topic_data in enumerate(topics, 1):
-        try:
-            print(f"[{idx}/{len(topics)}] Generating: {topic_data['topic']}")
-            
-            # 生成内容
-            payload = actor.generate_card(topic_data)
-            
-            if not payload:
-                print(f"  ✗ Failed to generate payload")
-                failed_count += 1
-                continue
-            
-            # 验证内容
-            is_valid, errors = validator.validate_card_payload(payload)
-            if not is_valid:
-                print(f"  ✗ Validation failed:")
-                for error in errors:
-                    print(f"    - {error}")
-                failed_count += 1
-                continue
-            
-            # 清理并存入数据库
-            payload = validator.sanitize_payload(payload)
-            card = CardService.create_card(
-                topic=topic_data['topic'],
-                tags=topic_data['tags'],
-                complexity=topic_data['complexity'],
-                payload=payload
-            )
-            
-            created_count += 1
-            print(f"  ✓ Card created: {card.id}")
-            
-        except Exception as e:
-            print(f"  ✗ Error: {str(e)}")
-            failed_count += 1
-            db.session.rollback()
+    def save(topic_data, payload):
+        # 验证内容
+        is_valid, errors = validator.validate_card_payload(payload)
+        if not is_valid:
+            raise ValueError("Validation failed: " + "; ".join(errors))
+        
+        # 清理并存入数据库
+        payload = validator.sanitize_payload(payload)
+        return CardService.create_card(
+            topic=topic_data['topic'],
+            tags=topic_data['tags'],
+            complexity=topic_data['complexity'],
+            payload=payload
+        )
+    
+    stats = generation_engine.run(topics, actor.generate_card, save, max_inflight=concurrency)
+    created_count = stats['created']
     
     print(f"\n{'='*50}")
     print(f"🎉 Factory run completed!")
     print(f"  ✓ Successfully created: {created_count}/{batch_size} cards")
-    if failed_count > 0:
-        print(f"  ✗ Failed: {failed_count} cards")
+    if stats['failed'] > 0:
+        print(f"  ✗ Failed: {stats['failed']} cards")
+        for error in stats['errors']:
+            print(f"    - {error['topic']}: {error['error']}")
+    print(f"  ⏱  {stats['elapsed_seconds']}s total, {stats['cards_per_minute']} cards/min, "
+          f"avg {stats['avg_generate_seconds']}s per LLM call")
     print(f"{'='*50}")
     
     return created_count
@@ -107,6 +90,8 @@ if __name__ == '__main__':
     parser.add_argument('--domains', type=str,
                       default='Java, Python, AI, History, Science, Philosophy',
                       help='Comma-separated list of domains')
+    parser.add_argument('--concurrency', type=int,
+                      help='Max concurrent LLM generation calls (default: FACTORY_MAX_INFLIGHT)')
     parser.add_argument('--list', action='store_true',
                       help='List all cards in database')
     
@@ -116,6 +101,6 @@ if __name__ == '__main__':
         if args.list:
             list_cards()
         elif args.generate:
-            run_factory(batch_size=args.generate, domains=args.domains)
+            run_factory(batch_size=args.generate, domains=args.domains, concurrency=args.concurrency)
         else:
             parser.print_help()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 """
 数据库初始化脚本
+
+create_all 只创建缺失的表，不会给已存在的表补索引，
+因此建表后再执行 migrate_indexes：补齐模型中声明的索引，删除已被复合索引取代的旧索引。
+重复执行是安全的。
 """
 import sys
 import os
@@ -8,16 +12,54 @@ import os
 # 添加父目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from sqlalchemy import inspect, text
+
 from app import app
 from models import db
 
+# 已被复合索引取代的旧索引：表名 -> 索引名
+# interactions.user_id 单列索引是 (user_id, created_at) / (user_id, card_id) 的前缀
+LEGACY_INDEXES = {
+    'interactions': ['ix_interactions_user_id'],
+}
+
+def migrate_indexes():
+    """补齐模型声明的索引并删除旧索引（需要应用上下文）"""
+    inspector = inspect(db.engine)
+    created = []
+    dropped = []
+
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created.append(index.name)
+
+        for name in LEGACY_INDEXES.get(table.name, []):
+            if name in existing:
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'DROP INDEX {name}'))
+                dropped.append(name)
+
+    return created, dropped
+
 def init_database():
     """初始化数据库表结构"""
     with app.app_context():
         print("Creating database tables...")
         db.create_all()
         print("✓ Database tables created successfully!")
-        
+
+        print("Migrating indexes...")
+        created, dropped = migrate_indexes()
+        for name in created:
+            print(f"  + {name}")
+        for name in dropped:
+            print(f"  - {name}")
+        print(f"✓ Indexes up to date ({len(created)} created, {len(dropped)} dropped)")
+
         # 打印表信息
         print("\nCreated tables:")
         for table in db.metadata.sorted_tables:
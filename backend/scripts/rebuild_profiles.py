@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+用户兴趣画像重建脚本
+
+从已归档汇总 + interactions 表重新生成 user_profiles（例如首次上线画像或调整权重规则后）
+"""
+import sys
+import os
+import argparse
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from services.recommendation_service import recommendation_service
+
+def rebuild_profiles(user_id=None):
+    """重建用户画像"""
+    with app.app_context():
+        db.create_all()
+        target = user_id or "all users"
+        print(f"Rebuilding interest profiles for {target}...")
+        
+        count = recommendation_service.rebuild_user_profiles(user_id)
+        db.session.commit()
+        
+        print(f"✓ Rebuilt {count} profile(s)")
+        return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild MindSlot user interest profiles')
+    parser.add_argument('--user-id', type=str,
+                      help='Only rebuild the profile of this user')
+    
+    args = parser.parse_args()
+    rebuild_profiles(args.user_id)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+用户统计汇总重建脚本
+
+从已归档汇总 + interactions 表重新生成 user_stats（例如首次上线汇总表或修复数据后）
+"""
+import sys
+import os
+import argparse
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from services.stats_service import stats_service
+
+def rebuild_stats(user_id=None):
+    """重建用户统计汇总"""
+    with app.app_context():
+        db.create_all()
+        target = user_id or "all users"
+        print(f"Rebuilding interaction stats for {target}...")
+        
+        count = stats_service.rebuild(user_id)
+        db.session.commit()
+        
+        print(f"✓ Rebuilt {count} stats row(s)")
+        return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild MindSlot user interaction stats')
+    parser.add_argument('--user-id', type=str,
+                      help='Only rebuild the stats of this user')
+    
+    args = parser.parse_args()
+    rebuild_stats(args.user_id)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+事件日志重放脚本
+
+从交互事件日志重建派生状态（不查询 interactions 表）：
+- profiles / stats 由写入路径同步维护，只能 --reset 清空后重建：已归档的交互从 interaction_rollups 恢复，
+  其余从日志重放。要求 EVENT_LOG_RETENTION_HOURS=0，且日志最早的事件不晚于第一条未归档的交互
+  （从一开始就启用了 EVENT_LOG_ENABLED），不满足时拒绝清空；重建期间应暂停写入
+- 其余消费者从上次保存的偏移量继续（追赶）；已看集合和热度是各 worker 进程内的状态，
+  由 EventFollower 线程自动追赶，这里用于检查日志内容
+"""
+import sys
+import os
+import argparse
+import time
+
+# 添加父目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from models import db
+from services.event_log import SOURCE_LOCAL, SOURCE_REDIS, event_log
+from services.event_consumers import CONSUMERS, archive_boundary, full_replay_blocker, replay
+from services.trending_service import trending_service
+
+def replay_events(consumer_name, source=SOURCE_LOCAL, reset=False, batch_size=1000):
+    """重放事件日志到指定消费者"""
+    consumer = CONSUMERS[consumer_name]
+    if consumer.inline and not reset:
+        print(f"✗ {consumer_name} is maintained by the write path; use --reset to rebuild it from the log")
+        return 0
+
+    with app.app_context():
+        db.create_all()
+
+        since = None
+        if reset:
+            if consumer.inline:
+                # 清空后只能从日志恢复：日志缺了历史就会永久丢失这部分画像 / 统计
+                blocker = full_replay_blocker(source)
+                if blocker:
+                    print(f"✗ Refusing to reset {consumer_name}: {blocker}")
+                    return 0
+                since = archive_boundary()
+                if since is not None:
+                    print(f"Restoring interactions archived before {since.isoformat()} from the rollups...")
+            print(f"Resetting {consumer_name} and replaying the {source} event log from the start...")
+            consumer.reset()
+            position = event_log.start_position(source)
+        else:
+            position = event_log.load_offset(consumer_name, source)
+            if position is None:
+                position = event_log.start_position(source)
+            print(f"Catching up {consumer_name} from the {source} event log...")
+
+        started = time.perf_counter()
+        count, _ = replay(consumer, source, position, batch_size, since=since)
+        print(f"✓ Applied {count} event(s) in {time.perf_counter() - started:.1f}s")
+
+        if consumer_name == 'trending':
+            for card_id, score in trending_service.top_cards(10):
+                print(f"  {card_id}  {score:g}")
+        return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the MindSlot interaction event log')
+    parser.add_argument('consumer', choices=sorted(CONSUMERS),
+                      help='Derived state to rebuild or catch up')
+    parser.add_argument('--source', choices=[SOURCE_LOCAL, SOURCE_REDIS], default=SOURCE_LOCAL,
+                      help='Read the local segment files or the Redis stream (default: local)')
+    parser.add_argument('--reset', action='store_true',
+                      help='Clear the derived state and replay from the start of the log')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                      help='Events per batch (default: 1000)')
+
+    args = parser.parse_args()
+    replay_events(args.consumer, args.source, args.reset, args.batch_size)
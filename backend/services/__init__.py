@@ -1,13 +1,14 @@
 # Services package
 # Note: content_factory is imported lazily to avoid circular imports with agents
 
-from services.queue_service import QueueService
+from services.queue_service import QueueService, queue_service
 from services.card_service import CardService
 from services.llm_service import LLMService
 from services.recommendation_service import RecommendationService, recommendation_service
 
 __all__ = [
     'QueueService',
+    'queue_service',
     'CardService', 
     'LLMService',
     'RecommendationService',
@@ -0,0 +1,174 @@
+"""
+CardCache - 卡片序列化缓存
+
+卡片创建后不再修改，每个用户拿到的卡片主体 (to_dict) 完全相同，
+因此缓存 card_id -> 预编码的 JSON bytes，跨请求共享：
+1. 进程内 LRU，按总字节数淘汰，可选 TTL
+2. 可选 Redis 二级缓存（CARD_CACHE_REDIS=true 且 QueueService 使用 Redis 时），供多 worker 共享
+
+响应里的用户相关字段（queue_length 等）通过 merge_json 拼接到缓存的 bytes 上，不再重复序列化 payload。
+/api/cards/<id> 使用的压缩体（gzip / br）也放在同一个本地 LRU 里，每张卡片每种编码只压缩一次。
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from config import Config
+from models.card import Card
+from services.card_service import CardService
+from services.compression import compress
+from services.queue_service import queue_service
+
+
+def encode_json(data) -> bytes:
+    """紧凑 UTF-8 JSON 编码"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def merge_json(encoded: bytes, extra: dict) -> bytes:
+    """把 extra 的字段拼接进已编码的 JSON 对象（extra 的键不能与原对象重复）"""
+    if not extra:
+        return encoded
+    return encoded[:-1] + b',' + encode_json(extra)[1:]
+
+
+class CardCache:
+    """卡片 JSON 缓存 - LRU + 字节上限 + 可选 TTL"""
+
+    def __init__(self, max_bytes: int = None, ttl_seconds: int = None, use_redis: bool = None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.CARD_CACHE_MAX_BYTES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else Config.CARD_CACHE_TTL
+        self.use_redis = use_redis if use_redis is not None else Config.CARD_CACHE_REDIS
+
+        self._entries: OrderedDict = OrderedDict()  # card_id -> (bytes, expires_at)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_cache_key(self, card_id: str) -> str:
+        return f"card:json:{card_id}"
+
+    # ------------------------------------------------------------------
+    # 本地 LRU
+    # ------------------------------------------------------------------
+
+    def _get_local(self, card_id: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(card_id)
+            if entry is None:
+                return None
+            encoded, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(card_id)
+                return None
+            self._entries.move_to_end(card_id)
+            return encoded
+
+    def _put_local(self, card_id: str, encoded: bytes):
+        if len(encoded) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if card_id in self._entries:
+                self._remove(card_id)
+            self._entries[card_id] = (encoded, expires_at)
+            self._size += len(encoded)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, card_id: str):
+        encoded, _ = self._entries.pop(card_id)
+        self._size -= len(encoded)
+
+    # ------------------------------------------------------------------
+    # 公共 API
+    # ------------------------------------------------------------------
+
+    def get(self, card_id: str) -> Optional[bytes]:
+        """获取卡片的预编码 JSON，未缓存时返回 None"""
+        card_id = str(card_id)
+        encoded = self._get_local(card_id)
+        if encoded is None and self.use_redis:
+            encoded = queue_service.with_redis(
+                lambda client: client.get(self.get_cache_key(card_id)), lambda: None
+            )
+            if encoded is not None:
+                encoded = encoded.encode('utf-8') if isinstance(encoded, str) else encoded
+                self._put_local(card_id, encoded)
+
+        if encoded is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return encoded
+
+    def put(self, card: Card) -> bytes:
+        """编码并缓存卡片，返回编码结果"""
+        card_id = str(card.id)
+        encoded = encode_json(card.to_dict())
+        self._put_local(card_id, encoded)
+
+        if self.use_redis:
+            queue_service.with_redis(
+                lambda client: client.set(self.get_cache_key(card_id), encoded, ex=self.ttl_seconds or None),
+                lambda: None
+            )
+        return encoded
+
+    def get_or_load(self, card_id: str) -> Optional[bytes]:
+        """获取卡片 JSON，未命中时从数据库加载（卡片不存在返回 None）"""
+        encoded = self.get(card_id)
+        if encoded is not None:
+            return encoded
+
+        card = CardService.get_card_by_id(str(card_id))
+        if card is None:
+            return None
+        return self.put(card)
+
+    def get_many(self, card_ids: Iterable[str]) -> Dict[str, bytes]:
+        """批量获取卡片 JSON，未命中的用一次 IN 查询加载（不存在的卡片不出现在结果中）"""
+        result = {}
+        missing = []
+        for card_id in card_ids:
+            card_id = str(card_id)
+            encoded = self.get(card_id)
+            if encoded is None:
+                missing.append(card_id)
+            else:
+                result[card_id] = encoded
+
+        if missing:
+            for card in CardService.get_cards_by_ids(missing):
+                result[str(card.id)] = self.put(card)
+        return result
+
+    def get_compressed(self, card_id: str, encoding: str, encoded: bytes) -> bytes:
+        """卡片 JSON 的压缩体（仅本地缓存，键为 `{card_id}|{encoding}`）"""
+        key = f"{card_id}|{encoding}"
+        body = self._get_local(key)
+        if body is None:
+            body = compress(encoded, encoding)
+            self._put_local(key, body)
+        return body
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+# 全局单例
+card_cache = CardCache()
@@ -0,0 +1,281 @@
+"""
+CardIndex - 卡片内存索引
+
+进程级的标签倒排索引 (tag -> card_id 集合)，用于替代推荐路径上的
+`Card.query.all()` 全表扫描：
+1. 首次使用时从数据库加载（只投影 id / tags / created_at，不读取 payload）
+2. CardService.create_card 写入新卡片后增量追加
+3. 定期按 created_at 水位线增量同步其他进程（如 scripts/factory.py）写入的卡片
+
+包含/排除标签查询变成倒排表上的集合运算，开销取决于结果集大小而不是卡片池大小。
+
+每张卡片在加入索引时分配一个稠密的进程内序号 (ordinal)，供已看集合位图等结构使用。
+序号只在本进程内有效，且只增不减。
+
+另外维护若干具名候选池（如通识 / 惊喜桶，标签集合固定），新卡片入索引时增量追加，
+补货时按 "池 - 已看集合" 做拒绝采样，开销与需要的数量 k 相关而不是池大小。
+"""
+
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from itertools import islice
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from models import db
+from models.card import Card
+
+
+class CardIndex:
+    """卡片内存索引 - 标签倒排表"""
+
+    # 增量同步间隔（秒），用于发现其他进程写入的卡片
+    SYNC_INTERVAL_SECONDS = 30
+
+    # 拒绝采样：首轮抽取 2k + SAMPLE_SLACK 个位置，之后每轮扩大 SAMPLE_GROWTH 倍直至抽完整池
+    SAMPLE_SLACK = 8
+    SAMPLE_GROWTH = 4
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._last_sync = 0.0
+        self._watermark: Optional[datetime] = None
+        self._postings: Dict[str, Set[uuid.UUID]] = defaultdict(set)
+        self._card_tags: Dict[uuid.UUID, Tuple[str, ...]] = {}
+        self._ordinals: Dict[uuid.UUID, int] = {}
+        self._ids: List[uuid.UUID] = []  # ordinal -> card_id
+        self._pools: Dict[str, Tuple[frozenset, List[int]]] = {}  # name -> (标签集合, 成员序号)
+
+    # ------------------------------------------------------------------
+    # 加载与维护
+    # ------------------------------------------------------------------
+
+    def ensure_loaded(self, force_sync: bool = False):
+        """确保索引已加载，并按间隔增量同步新卡片（需要 Flask 应用上下文）"""
+        now = time.monotonic()
+        if not force_sync and self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+            return
+
+        with self._lock:
+            if not force_sync and self._loaded and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+                return
+
+            query = db.session.query(Card.id, Card.tags, Card.created_at)
+            if self._loaded and self._watermark is not None:
+                # 使用 >= 并依赖 id 去重，避免漏掉同一时间戳写入的卡片
+                query = query.filter(Card.created_at >= self._watermark)
+
+            for card_id, tags, created_at in query.all():
+                self._add(card_id, tags, created_at)
+
+            if not self._loaded:
+                print(f"[CardIndex] Loaded {len(self._card_tags)} cards, {len(self._postings)} tags")
+            self._loaded = True
+            self._last_sync = now
+
+    def register_pool(self, name: str, tags: Iterable[str]):
+        """注册具名候选池：包含任一 tags 的卡片，之后随新卡片增量维护"""
+        with self._lock:
+            pool_tags = frozenset(tags)
+            members = [
+                self._ordinals[card_id]
+                for card_id, card_tags in self._card_tags.items()
+                if pool_tags.intersection(card_tags)
+            ]
+            self._pools[name] = (pool_tags, members)
+
+    def add_card(self, card: Card):
+        """新卡片入库后调用，增量更新索引"""
+        with self._lock:
+            self._add(card.id, card.tags, card.created_at)
+
+    def _add(self, card_id, tags, created_at: Optional[datetime]):
+        if isinstance(card_id, str):
+            card_id = uuid.UUID(card_id)
+        if card_id in self._card_tags:
+            return
+
+        tags = tuple(tags or [])
+        self._card_tags[card_id] = tags
+        self._ordinals[card_id] = len(self._ids)
+        self._ids.append(card_id)
+        for tag in tags:
+            self._postings[tag].add(card_id)
+        for pool_tags, members in self._pools.values():
+            if pool_tags.intersection(tags):
+                members.append(self._ordinals[card_id])
+
+        if created_at and (self._watermark is None or created_at > self._watermark):
+            self._watermark = created_at
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def query(self, tags: Iterable[str], exclude_tags: Iterable[str] = None,
+              exclude_ids: Iterable = None) -> Set[uuid.UUID]:
+        """
+        标签查询：包含任一 tags，且不包含任一 exclude_tags，且不在 exclude_ids 中
+
+        Returns:
+            满足条件的卡片 ID 集合
+        """
+        self.ensure_loaded()
+
+        with self._lock:
+            postings = [self._postings[tag] for tag in set(tags) if tag in self._postings]
+            if not postings:
+                return set()
+            candidates = set().union(*postings)
+
+            for tag in set(exclude_tags or []):
+                excluded = self._postings.get(tag)
+                if excluded:
+                    candidates -= excluded
+
+        if exclude_ids:
+            candidates.difference_update(exclude_ids)
+        return candidates
+
+    def sample(self, k: int, exclude_ids: Iterable = None,
+               accept: Callable[[List[uuid.UUID]], List[uuid.UUID]] = None) -> List[uuid.UUID]:
+        """
+        从全部卡片中随机抽取最多 k 张，替代 ORDER BY random() LIMIT k
+
+        开销与 k（以及被排除的比例）相关，不需要对整张表排序。
+        """
+        self.ensure_loaded()
+        n = len(self._ids)
+        return self._sample(range(n), n, k, exclude_ids, None, accept)
+
+    def sample_pool(self, name: str, k: int, exclude_ids: Iterable = None,
+                    exclude_tags: Iterable[str] = None,
+                    accept: Callable[[List[uuid.UUID]], List[uuid.UUID]] = None) -> List[uuid.UUID]:
+        """
+        从具名候选池中随机抽取最多 k 张卡片
+
+        Args:
+            name: 候选池名称
+            k: 需要的数量
+            exclude_ids: 排除的卡片 ID
+            exclude_tags: 排除包含这些标签的卡片
+            accept: 批量过滤回调（如已看集合过滤），返回通过的 ID
+        """
+        self.ensure_loaded()
+        # 成员列表只追加，取当前长度即可得到一致的快照，无需复制
+        members = self._pools[name][1]
+        return self._sample(members, len(members), k, exclude_ids, exclude_tags, accept)
+
+    @staticmethod
+    def _random_positions(n: int) -> Iterator[int]:
+        """
+        不放回地随机产生 range(n) 中的位置（惰性）
+
+        前一半用 randrange + 去重（碰撞概率不超过 1/2），之后只打乱剩余的位置，
+        抽 k 个位置的开销与 k 相关，只有抽完大半个池子后才付出与剩余部分成正比的开销。
+        """
+        drawn: Set[int] = set()
+        while 2 * len(drawn) < n:
+            position = random.randrange(n)
+            if position not in drawn:
+                drawn.add(position)
+                yield position
+        rest = [position for position in range(n) if position not in drawn]
+        random.shuffle(rest)
+        yield from rest
+
+    def _sample(self, members: Sequence[int], n: int, k: int, exclude_ids: Iterable = None,
+                exclude_tags: Iterable[str] = None,
+                accept: Callable[[List[uuid.UUID]], List[uuid.UUID]] = None) -> List[uuid.UUID]:
+        """在 members[:n] 上分轮拒绝采样，每轮只检查新抽到的位置，直到凑够 k 个或抽完整池"""
+        if n == 0 or k <= 0:
+            return []
+
+        exclude_ids = set(exclude_ids or [])
+        exclude_tags = set(exclude_tags or [])
+        chosen: List[uuid.UUID] = []
+        positions = self._random_positions(n)
+        size = 2 * k + self.SAMPLE_SLACK
+
+        while len(chosen) < k:
+            drawn = 0
+            batch = []
+            for position in islice(positions, size):
+                drawn += 1
+                card_id = self._ids[members[position]]
+                if card_id in exclude_ids:
+                    continue
+                if exclude_tags and exclude_tags.intersection(self._card_tags[card_id]):
+                    continue
+                batch.append(card_id)
+
+            if accept is not None and batch:
+                batch = accept(batch)
+            chosen.extend(batch[:k - len(chosen)])
+
+            if drawn < size:
+                break  # 整池已抽完
+            size *= self.SAMPLE_GROWTH
+
+        return chosen
+
+    def tag_counts(self) -> Dict[str, int]:
+        """各标签的卡片数量"""
+        self.ensure_loaded()
+        with self._lock:
+            return {tag: len(ids) for tag, ids in self._postings.items() if ids}
+
+    def ordinal(self, card_id, sync: bool = True) -> Optional[int]:
+        """卡片的进程内序号；未知卡片（sync=True 时）强制同步一次，仍不存在则返回 None"""
+        if isinstance(card_id, str):
+            card_id = uuid.UUID(card_id)
+        self.ensure_loaded()
+        ordinal = self._ordinals.get(card_id)
+        if ordinal is None and sync:
+            self.ensure_loaded(force_sync=True)
+            ordinal = self._ordinals.get(card_id)
+        return ordinal
+
+    def ordinals(self, card_ids: Iterable, sync: bool = True) -> List[Optional[int]]:
+        """
+        批量查询序号（与输入一一对应，未知卡片为 None）
+
+        sync=True 时存在未知卡片则强制同步一次（只同步一次，而不是每张未知卡片一次），
+        避免刚由其他进程写入、本进程还没同步到的卡片被当作不存在。
+        """
+        card_ids = [uuid.UUID(card_id) if isinstance(card_id, str) else card_id for card_id in card_ids]
+        self.ensure_loaded()
+        ordinals = [self._ordinals.get(card_id) for card_id in card_ids]
+        if sync and None in ordinals:
+            self.ensure_loaded(force_sync=True)
+            ordinals = [
+                ordinal if ordinal is not None else self._ordinals.get(card_id)
+                for card_id, ordinal in zip(card_ids, ordinals)
+            ]
+        return ordinals
+
+    def tags_from(self, start: int) -> List[Tuple[str, ...]]:
+        """序号 >= start 的卡片标签（按序号排列），用于增量构建打分矩阵"""
+        self.ensure_loaded()
+        with self._lock:
+            return [self._card_tags[card_id] for card_id in self._ids[start:]]
+
+    def ids_at(self, ordinals: Iterable[int]) -> List[uuid.UUID]:
+        """序号 -> 卡片 ID"""
+        return [self._ids[int(ordinal)] for ordinal in ordinals]
+
+    def total_cards(self) -> int:
+        """卡片总数（O(1)，随新卡片入索引增量维护）"""
+        self.ensure_loaded()
+        return len(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._card_tags)
+
+
+# 全局单例
+card_index = CardIndex()
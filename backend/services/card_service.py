@@ -1,25 +1,27 @@
 from models import db
 from models.card import Card
-from models.interaction import Interaction
+from services.card_index import card_index
+from services.seen_service import seen_set_service
 from typing import List
+import random
 import uuid
 
 class CardService:
     @staticmethod
     def get_unviewed_cards(user_id: str, limit: int = 10) -> List[Card]:
         """获取用户未查看过的卡片"""
-        # 1. 获取用户已看过的卡片 ID
-        viewed_card_ids = db.session.query(Interaction.card_id).filter(
-            Interaction.user_id == uuid.UUID(user_id)
-        ).all()
-        viewed_ids = [cid[0] for cid in viewed_card_ids]
+        uuid.UUID(user_id)  # 校验格式
         
-        # 2. 随机获取未看过的卡片
-        query = Card.query
-        if viewed_ids:
-            query = query.filter(Card.id.notin_(viewed_ids))
+        # 在卡片索引上随机采样，用已看集合拒绝，再按主键加载
+        card_ids = card_index.sample(
+            limit,
+            accept=lambda ids: seen_set_service.filter_unseen(user_id, ids)
+        )
+        if not card_ids:
+            return []
         
-        cards = query.order_by(db.func.random()).limit(limit).all()
+        cards = Card.query.filter(Card.id.in_(card_ids)).all()
+        random.shuffle(cards)
         return cards
     
     @staticmethod
@@ -33,6 +35,7 @@ class CardService:
         )
         db.session.add(card)
         db.session.commit()
+        card_index.add_card(card)
         return card
     
     @staticmethod
@@ -40,6 +43,13 @@ class CardService:
         """根据 ID 获取卡片"""
         return Card.query.get(uuid.UUID(card_id))
     
+    @staticmethod
+    def get_cards_by_ids(card_ids: List[str]) -> List[Card]:
+        """根据 ID 批量获取卡片（一次 IN 查询，不保证顺序）"""
+        if not card_ids:
+            return []
+        return Card.query.filter(Card.id.in_([uuid.UUID(str(cid)) for cid in card_ids])).all()
+    
     @staticmethod
     def get_all_cards(limit: int = 100) -> List[Card]:
         """获取所有卡片"""
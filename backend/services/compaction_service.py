@@ -0,0 +1,223 @@
+"""
+CompactionService - 交互压实与冷存储归档
+
+interactions 表只保留最近 INTERACTION_ARCHIVE_DAYS 天的交互（按天对齐），更早的分批处理：
+1. 原始行写入本地只追加的归档段（NDJSON，安装了 zstandard 时用 zstd 压缩，否则 gzip），
+   每批一个新文件，写完 fsync 后才修改数据库
+2. 同一事务里：按 (用户, 天, 标签) 累加进 interaction_rollups，(用户, 卡片) 写入 seen_cards，
+   删除原始行
+3. 事务失败时删除本批归档段；归档段写完后进程崩溃会留下仍在热表中的行，
+   下次运行会再归档一次，读取归档时按 id 去重即可
+
+画像重建、统计重建和已看集合加载都读取 "汇总 + 热表尾部"，结果与归档前一致，
+每个用户的查询开销只与热数据量和天数有关。/api/interaction/history 只返回热数据。
+"""
+
+import gzip
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import Dict, Iterator, List
+
+from sqlalchemy import delete
+
+try:
+    import zstandard
+except ImportError:  # zstandard 为可选依赖，未安装时归档段用 gzip
+    zstandard = None
+
+from config import Config
+from models import db
+from models.card import Card
+from models.interaction import Interaction
+from models.interaction_rollup import InteractionRollup
+from models.seen_card import SeenCard
+from models.user_stats import UserStats
+from services.interaction_service import InteractionService
+from services.recommendation_service import recommendation_service
+
+
+class CompactionService:
+    """交互压实：热表 -> 按天汇总 + 压缩归档段"""
+
+    # 归档段扩展名
+    SEGMENT_SUFFIXES = {'zstd': '.ndjson.zst', 'gzip': '.ndjson.gz'}
+    ZSTD_LEVEL = 10
+    GZIP_LEVEL = 6
+
+    def __init__(self):
+        self.archive_dir = Config.INTERACTION_ARCHIVE_DIR
+        self.horizon_days = Config.INTERACTION_ARCHIVE_DAYS
+        self.batch_size = Config.INTERACTION_ARCHIVE_BATCH
+        self.codec = 'zstd' if Config.INTERACTION_ARCHIVE_CODEC == 'zstd' and zstandard is not None else 'gzip'
+
+    def get_cutoff(self, horizon_days: int = None) -> datetime:
+        """早于该时刻（UTC 零点）的交互会被归档"""
+        days = self.horizon_days if horizon_days is None else horizon_days
+        return datetime.combine(datetime.utcnow().date() - timedelta(days=days), time.min)
+
+    # ------------------------------------------------------------------
+    # 归档段
+    # ------------------------------------------------------------------
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=self.ZSTD_LEVEL).compress(data)
+        return gzip.compress(data, compresslevel=self.GZIP_LEVEL)
+
+    def _write_segment(self, rows: List[Dict]) -> str:
+        """把一批交互写成新的归档段（先写临时文件，fsync 后改名），返回文件路径"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        first, last = rows[0]['created_at'], rows[-1]['created_at']
+        name = (f"interactions-{first:%Y%m%dT%H%M%S}-{last:%Y%m%dT%H%M%S}-"
+                f"{uuid.uuid4().hex[:8]}{self.SEGMENT_SUFFIXES[self.codec]}")
+        path = os.path.join(self.archive_dir, name)
+
+        data = ''.join(InteractionService.encode_row(row) + '\n' for row in rows).encode('utf-8')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self._compress(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return path
+
+    def list_segments(self) -> List[str]:
+        """按时间顺序列出归档段"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        suffixes = tuple(self.SEGMENT_SUFFIXES.values())
+        return sorted(
+            os.path.join(self.archive_dir, name)
+            for name in os.listdir(self.archive_dir) if name.endswith(suffixes)
+        )
+
+    @staticmethod
+    def read_segment(path: str) -> Iterator[Dict]:
+        """逐行读取归档段中的交互（InteractionService.decode_row 的格式）"""
+        with open(path, 'rb') as f:
+            data = f.read()
+        if path.endswith(CompactionService.SEGMENT_SUFFIXES['zstd']):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {path}")
+            data = zstandard.ZstdDecompressor().decompress(data)
+        else:
+            data = gzip.decompress(data)
+        for line in data.decode('utf-8').splitlines():
+            if line:
+                yield InteractionService.decode_row(line)
+
+    # ------------------------------------------------------------------
+    # 汇总
+    # ------------------------------------------------------------------
+
+    def _apply_batch(self, rows: List[Dict], card_tags: Dict[uuid.UUID, List[str]]):
+        """把一批交互累加进汇总和 seen_cards，并从热表删除（不提交事务）"""
+        totals: Dict[tuple, Dict] = defaultdict(lambda: defaultdict(int))
+        weights: Dict[tuple, float] = {}
+        pairs = set()
+
+        for row in rows:
+            day = row['created_at'].date()
+            delta = recommendation_service.weight_delta(row['action'], row['duration'])
+            tags = set(card_tags.get(row['card_id']) or [])
+            for tag in (InteractionRollup.ALL_TAGS, *tags):
+                key = (row['user_id'], day, tag)
+                counters = totals[key]
+                counters['total_count'] += 1
+                column = UserStats.ACTION_COLUMNS.get(row['action'])
+                if column:
+                    counters[column] += 1
+                if row['duration'] is not None:
+                    counters['duration_sum'] += row['duration']
+                    counters['duration_count'] += 1
+                if delta and tag != InteractionRollup.ALL_TAGS:
+                    weights[key] = weights.get(key, 0.0) + delta
+            pairs.add((row['user_id'], row['card_id']))
+
+        user_ids = {user_id for user_id, _, _ in totals}
+        days = {day for _, day, _ in totals}
+        existing = {
+            (rollup.user_id, rollup.day, rollup.tag): rollup
+            for rollup in InteractionRollup.query.filter(
+                InteractionRollup.user_id.in_(user_ids), InteractionRollup.day.in_(days)
+            )
+        }
+        for key, counters in totals.items():
+            rollup = existing.get(key)
+            if rollup is None:
+                user_id, day, tag = key
+                rollup = InteractionRollup(user_id=user_id, day=day, tag=tag, total_count=0,
+                                           like_count=0, skip_count=0, finish_count=0,
+                                           expand_count=0, duration_sum=0, duration_count=0)
+                db.session.add(rollup)
+            for column, value in counters.items():
+                setattr(rollup, column, getattr(rollup, column) + value)
+            if key in weights:
+                rollup.weight = (rollup.weight or 0.0) + weights[key]
+
+        seen = set(db.session.query(SeenCard.user_id, SeenCard.card_id).filter(
+            SeenCard.user_id.in_(user_ids),
+            SeenCard.card_id.in_({card_id for _, card_id in pairs})
+        ).all())
+        db.session.add_all(
+            SeenCard(user_id=user_id, card_id=card_id) for user_id, card_id in pairs - seen
+        )
+
+        db.session.execute(
+            delete(Interaction).where(Interaction.id.in_([row['id'] for row in rows])),
+            execution_options={'synchronize_session': False}
+        )
+
+    def _next_batch(self, cutoff: datetime, batch_size: int) -> List[Dict]:
+        rows = db.session.query(
+            Interaction.id, Interaction.user_id, Interaction.card_id,
+            Interaction.action, Interaction.duration, Interaction.created_at
+        ).filter(
+            Interaction.created_at < cutoff
+        ).order_by(Interaction.created_at, Interaction.id).limit(batch_size).all()
+        return [row._asdict() for row in rows]
+
+    def count_archivable(self, horizon_days: int = None) -> int:
+        """早于归档时刻、尚在热表中的交互数"""
+        return Interaction.query.filter(Interaction.created_at < self.get_cutoff(horizon_days)).count()
+
+    def compact(self, horizon_days: int = None, batch_size: int = None) -> Dict:
+        """
+        归档早于 horizon_days 天的交互（每批一个归档段、一次提交）
+
+        Returns:
+            {"cutoff", "archived", "segments": [路径, ...]}
+        """
+        cutoff = self.get_cutoff(horizon_days)
+        batch_size = batch_size or self.batch_size
+        archived = 0
+        segments = []
+
+        while True:
+            rows = self._next_batch(cutoff, batch_size)
+            if not rows:
+                break
+
+            card_tags = dict(db.session.query(Card.id, Card.tags).filter(
+                Card.id.in_({row['card_id'] for row in rows})
+            ).all())
+            path = self._write_segment(rows)
+            try:
+                self._apply_batch(rows, card_tags)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                os.remove(path)
+                raise
+
+            archived += len(rows)
+            segments.append(path)
+            print(f"[Compaction] Archived {len(rows)} interactions to {os.path.basename(path)}")
+
+        return {"cutoff": cutoff.isoformat(), "archived": archived, "segments": segments}
+
+
+# 全局单例
+compaction_service = CompactionService()
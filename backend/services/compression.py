@@ -0,0 +1,81 @@
+"""
+响应压缩 - gzip / brotli
+
+- negotiate_encoding: 按 Accept-Encoding 选择编码（brotli 为可选依赖，未安装时只用 gzip）
+- compress: 压缩 bytes
+- compress_response: app.py 的 after_request 钩子，超过阈值的 JSON / 文本响应自动压缩
+
+已经带 Content-Encoding 的响应（如 /api/cards/<id> 直接返回缓存的压缩体）不会被重复压缩。
+"""
+
+import gzip
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+from config import Config
+
+# 可压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript'}
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择编码：优先 br，其次 gzip；都不接受时返回 None
+
+    忽略 q=0 的编码，其余 q 值不细分优先级。
+    """
+    accepted = set()
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip())
+
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """用指定编码压缩数据"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=Config.COMPRESSION_GZIP_LEVEL)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_response(response, accept_encoding: str):
+    """
+    压缩超过 COMPRESSION_MIN_SIZE 的响应（after_request 钩子）
+
+    Returns:
+        处理后的 response
+    """
+    if not Config.COMPRESSION_ENABLED:
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    if 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
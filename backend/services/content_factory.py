@@ -9,6 +9,7 @@ import threading
 import time
 from typing import List, Optional
 from models import db
+from services.generation_engine import generation_engine
 
 
 class ContentFactoryService:
@@ -17,8 +18,8 @@ class ContentFactoryService:
     
     工作流程:
     1. Director Agent 生成选题清单
-    2. Actor Agent 根据选题生成卡片内容
-    3. 验证并存入数据库
+    2. Actor Agent 根据选题并行生成卡片内容（GenerationEngine，有界并发）
+    3. 每完成一张验证并存入数据库
     """
     
     _instance = None
@@ -42,6 +43,7 @@ class ContentFactoryService:
         self._generating = False
         self._generation_lock = threading.Lock()
         self._llm_available = False
+        self._last_generation = None  # 最近一批的吞吐统计
         
         # 尝试初始化 Agent（延迟导入避免循环依赖）
         try:
@@ -68,23 +70,19 @@ class ContentFactoryService:
     
     def get_card_pool_status(self) -> dict:
         """获取卡片池状态"""
-        from models.card import Card
-        from models.interaction import Interaction
+        from services.card_index import card_index
         
-        total_cards = Card.query.count()
+        total_cards = card_index.total_cards()
         
-        # 统计各标签的卡片数量
-        all_cards = Card.query.all()
-        tag_counts = {}
-        for card in all_cards:
-            for tag in card.tags:
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        # 统计各标签的卡片数量（直接读取倒排索引）
+        tag_counts = card_index.tag_counts()
         
         return {
             "total_cards": total_cards,
             "tag_distribution": tag_counts,
             "is_generating": self._generating,
-            "llm_available": self._llm_available
+            "llm_available": self._llm_available,
+            "last_generation": self._last_generation
         }
     
     def generate_cards_sync(self, count: int = 10, domains: str = None, 
@@ -133,30 +131,23 @@ class ContentFactoryService:
             
             print(f"[ContentFactory] Director generated {len(topics)} topics")
             
-            # 3. Actor 逐个生成卡片
+            # 3. Actor 并行生成，每完成一张校验并存入数据库
             generated_cards = []
-            for i, topic_data in enumerate(topics):
-                try:
-                    print(f"[ContentFactory] Actor generating card {i+1}/{len(topics)}: {topic_data.get('topic', 'Unknown')}")
-                    
-                    payload = self.actor.generate_card(topic_data)
-                    
-                    if payload and self._validate_payload(payload):
-                        # 4. 存入数据库
-                        card = CardService.create_card(
-                            topic=topic_data.get('topic', 'Unknown'),
-                            tags=topic_data.get('tags', []),
-                            complexity=topic_data.get('complexity', 3),
-                            payload=payload
-                        )
-                        generated_cards.append(card.to_dict())
-                        print(f"[ContentFactory] Card saved: {card.id}")
-                    else:
-                        print(f"[ContentFactory] Invalid payload for topic: {topic_data.get('topic')}")
-                        
-                except Exception as e:
-                    print(f"[ContentFactory] Error generating card: {e}")
-                    continue
+            
+            def save(topic_data, payload):
+                if not self._validate_payload(payload):
+                    raise ValueError("Invalid payload")
+                card = CardService.create_card(
+                    topic=topic_data.get('topic', 'Unknown'),
+                    tags=topic_data.get('tags', []),
+                    complexity=topic_data.get('complexity', 3),
+                    payload=payload
+                )
+                generated_cards.append(card.to_dict())
+                return card
+            
+            stats = generation_engine.run(topics, self.actor.generate_card, save)
+            self._last_generation = {key: value for key, value in stats.items() if key != 'errors'}
             
             print(f"[ContentFactory] Generation complete: {len(generated_cards)}/{len(topics)} cards created")
             return generated_cards
@@ -0,0 +1,271 @@
+"""
+事件日志消费者 - 从 EventLog 重放 / 追赶派生状态
+
+- profiles / stats：写入路径在同一事务里同步维护（inline），
+  只支持清空后重建（scripts/replay_events.py --reset）：已归档的交互从 interaction_rollups 恢复，
+  归档边界之后的从日志重放；要求日志覆盖全部未归档的交互（见 full_replay_blocker），
+  且重建期间暂停写入
+- seen / trending：进程内状态，由每个 worker 的 EventFollower 后台线程持续追赶，
+  启动时从 TRENDING_WINDOW_HOURS 之前开始重放预热，各 worker 之间通过共享的日志同步
+"""
+
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from config import Config
+from models import db
+from models.interaction import Interaction
+from models.interaction_rollup import InteractionRollup
+from models.user_profile import UserProfile
+from models.user_stats import UserStats
+from services.event_log import SOURCE_LOCAL, SOURCE_REDIS, event_log
+from services.queue_service import queue_service
+from services.recommendation_service import recommendation_service
+from services.seen_service import seen_set_service
+from services.stats_service import stats_service
+from services.trending_service import trending_service
+
+
+def archive_boundary() -> Optional[datetime]:
+    """
+    已归档交互的上界：早于该时刻的交互都已并入 interaction_rollups（压实按 UTC 零点对齐）
+
+    Returns:
+        最后一个汇总日的次日零点；没有归档时为 None
+    """
+    last_day = db.session.query(func.max(InteractionRollup.day)).scalar()
+    if last_day is None:
+        return None
+    return datetime(last_day.year, last_day.month, last_day.day) + timedelta(days=1)
+
+
+def full_replay_blocker(source: str) -> Optional[str]:
+    """
+    检查日志能否重建 inline 消费者：本地日志不按保留期删除，且最早的事件不晚于第一条未归档的交互
+
+    Returns:
+        不能重建的原因；可以重建时为 None
+    """
+    if source == SOURCE_LOCAL and event_log.retention_hours:
+        return (f"EVENT_LOG_RETENTION_HOURS keeps only {event_log.retention_hours}h of segments; "
+                f"set it to 0 so the log keeps the full history")
+
+    query = db.session.query(func.min(Interaction.created_at))
+    boundary = archive_boundary()
+    if boundary is not None:
+        query = query.filter(Interaction.created_at >= boundary)
+    first_interaction = query.scalar()
+    if first_interaction is None:
+        return None
+
+    oldest_event = event_log.oldest_event_time(source)
+    if oldest_event is None or oldest_event > first_interaction:
+        return (f"the {source} event log starts at {oldest_event.isoformat() if oldest_event else '(empty)'}, "
+                f"after the first unarchived interaction at {first_interaction.isoformat()}")
+    return None
+
+
+def group_by_user(events: List[Dict]) -> Dict[str, List[Dict]]:
+    """按用户分组，保持各用户事件的先后顺序"""
+    grouped = defaultdict(list)
+    for event in events:
+        grouped[event['user_id']].append(event)
+    return grouped
+
+
+class EventConsumer:
+    """消费者基类"""
+
+    name = ''
+    inline = False  # True：写入路径同步维护，只能清空后从头重放
+
+    def reset(self):
+        """清空派生状态（inline 消费者随后恢复已归档部分）"""
+
+    def apply(self, events: List[Dict]):
+        raise NotImplementedError
+
+
+class ProfileConsumer(EventConsumer):
+    """兴趣画像（user_profiles）"""
+
+    name = 'profiles'
+    inline = True
+
+    def reset(self):
+        UserProfile.query.delete()
+        # 已归档的交互不在重放范围内：画像基数从汇总恢复
+        for user_uuid, (weights, count) in recommendation_service.load_rollup_weights().items():
+            profile = UserProfile(user_id=user_uuid, interaction_count=count)
+            profile.set_weights(weights)
+            db.session.add(profile)
+        db.session.commit()
+
+    def apply(self, events: List[Dict]):
+        for user_id, user_events in group_by_user(events).items():
+            user_uuid = uuid.UUID(user_id)
+            profile = db.session.get(UserProfile, user_uuid)
+            if profile is None:
+                profile = UserProfile(user_id=user_uuid, tag_weights={}, interaction_count=0)
+                db.session.add(profile)
+            for event in user_events:
+                profile.apply(event['tags'], recommendation_service.weight_delta(event['action'], event['duration']))
+                profile.last_interaction_id = uuid.UUID(event['id'])
+            profile.interaction_count = (profile.interaction_count or 0) + len(user_events)
+        db.session.commit()
+
+
+class StatsConsumer(EventConsumer):
+    """统计汇总（user_stats）"""
+
+    name = 'stats'
+    inline = True
+
+    def reset(self):
+        UserStats.query.delete()
+        # 已归档的交互不在重放范围内：计数从汇总恢复
+        for user_uuid, counters in stats_service.load_rollup_totals().items():
+            db.session.add(UserStats(user_id=user_uuid, **counters))
+        db.session.commit()
+
+    def apply(self, events: List[Dict]):
+        for user_id, user_events in group_by_user(events).items():
+            user_uuid = uuid.UUID(user_id)
+            if db.session.get(UserStats, user_uuid) is None:
+                # 先建全零行，StatsService.apply 就不会回退到查询 interactions 重建
+                db.session.add(UserStats(user_id=user_uuid, total_count=0, like_count=0, skip_count=0,
+                                         finish_count=0, expand_count=0, duration_sum=0, duration_count=0))
+                db.session.flush()
+            stats_service.apply(user_uuid, [(event['action'], event['duration']) for event in user_events])
+        db.session.commit()
+
+
+class SeenConsumer(EventConsumer):
+    """已看集合：把其他 worker 的交互同步到本进程已加载的集合"""
+
+    name = 'seen'
+
+    def apply(self, events: List[Dict]):
+        for user_id, user_events in group_by_user(events).items():
+            seen_set_service.mark_seen_if_loaded(user_id, [event['card_id'] for event in user_events])
+
+
+class TrendingConsumer(EventConsumer):
+    """卡片热度"""
+
+    name = 'trending'
+
+    def reset(self):
+        trending_service.clear()
+
+    def apply(self, events: List[Dict]):
+        trending_service.apply(events)
+
+
+CONSUMERS: Dict[str, EventConsumer] = {
+    consumer.name: consumer
+    for consumer in (ProfileConsumer(), StatsConsumer(), SeenConsumer(), TrendingConsumer())
+}
+
+
+def replay(consumer: EventConsumer, source: str, position, batch_size: int = 1000,
+           save_offsets: bool = True, since: datetime = None) -> Tuple[int, object]:
+    """
+    从 position 开始把事件应用到消费者，直到读完
+
+    Args:
+        since: 跳过发生时间早于该时刻的事件（重建 inline 消费者时传归档边界，已归档的交互不重复计入）
+
+    Returns:
+        (应用的事件数, 新位置)
+    """
+    applied = 0
+    while True:
+        events, position = event_log.read(source, position, batch_size)
+        if not events:
+            return applied, position
+        if since is not None:
+            events = [event for event in events if datetime.fromisoformat(event['created_at']) >= since]
+        if events:
+            consumer.apply(events)
+            applied += len(events)
+        if save_offsets:
+            event_log.save_offset(consumer.name, source, position)
+
+
+class EventFollower:
+    """后台线程：持续把事件日志中的新事件应用到进程内派生状态（已看集合、热度）"""
+
+    def __init__(self):
+        self.enabled = Config.EVENT_LOG_FOLLOW and Config.EVENT_LOG_ENABLED
+        self.poll_interval = Config.EVENT_LOG_POLL_MS / 1000.0
+        self.consumers = [CONSUMERS['seen'], CONSUMERS['trending']]
+
+        self.source = SOURCE_LOCAL
+        self._position = None
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+
+        self.applied = 0
+        self.failures = 0
+        self.lag_seconds = 0.0
+
+    def start(self, app):
+        """启动跟随线程（EVENT_LOG_FOLLOW 未开启时什么也不做）"""
+        if not self.enabled or self._thread is not None:
+            return
+
+        self._app = app
+        # Redis Stream 跨主机共享；Redis 不可用时读本地段文件（同一主机的各 worker）
+        self.source = SOURCE_REDIS if event_log.use_redis and queue_service.redis_client is not None else SOURCE_LOCAL
+        since = datetime.utcnow() - timedelta(hours=trending_service.window_hours)
+        self._position = event_log.start_position(self.source, since)
+
+        self._thread = threading.Thread(target=self._run, name='event-follower', daemon=True)
+        self._thread.start()
+        print(f"[EventFollower] Following {self.source} event log since {since.isoformat()}")
+
+    def poll(self) -> int:
+        """读取并应用一批新事件，返回事件数（需要应用上下文）"""
+        events, position = event_log.read(self.source, self._position)
+        if not events:
+            self.lag_seconds = 0.0
+            return 0
+        for consumer in self.consumers:
+            consumer.apply(events)
+        self._position = position
+        self.applied += len(events)
+        newest = datetime.fromisoformat(events[-1]['created_at'])
+        self.lag_seconds = max(0.0, (datetime.utcnow() - newest).total_seconds())
+        return len(events)
+
+    def _run(self):
+        while True:
+            try:
+                with self._app.app_context():
+                    applied = self.poll()
+            except Exception as e:
+                self.failures += 1
+                print(f"[EventFollower] Apply failed: {e}")
+                applied = 0
+            if not applied:
+                time.sleep(self.poll_interval)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "source": self.source,
+            "applied": self.applied,
+            "failures": self.failures,
+            "lag_seconds": round(self.lag_seconds, 3)
+        }
+
+
+# 全局单例
+event_follower = EventFollower()
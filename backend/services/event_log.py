@@ -0,0 +1,382 @@
+"""
+EventLog - 交互事件日志（只追加）
+
+InteractionService.write_batch 提交成功后，每条交互（连同卡片标签）追加为一个事件：
+1. 本地段文件：每个 worker 一个目录 `{EVENT_LOG_DIR}/{worker_id}/`，
+   段文件 `{序号:08d}.ndjson`，超过 EVENT_LOG_SEGMENT_BYTES 换新段
+2. 可选 Redis Stream `events:interactions`（EVENT_LOG_REDIS=true，MAXLEN 近似截断），
+   Redis 不可用时只写本地
+
+消费者按偏移量读取（本地：worker_id -> [段序号, 字节偏移]；Redis：最后读到的 stream ID），
+偏移量由消费者自己保存（save_offset / load_offset），重放见 services/event_consumers.py。
+
+保留期（EVENT_LOG_RETENTION_HOURS，不少于 TRENDING_WINDOW_HOURS）：每次打开新段时删除最后修改时间
+早于保留期的段文件（仍在读取它们的消费者偏移量会阻止删除），以及已停止 worker 留下的空目录。
+
+事件在数据库提交之后追加：提交后、追加前进程崩溃会丢这一批事件（数据库仍是权威数据）。
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import Config
+from services.queue_service import queue_service
+
+# 读取来源
+SOURCE_LOCAL = 'local'
+SOURCE_REDIS = 'redis'
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def process_worker_id() -> str:
+    """
+    本进程的 worker 标识：EVENT_LOG_WORKER_ID，为空时用 主机名-进程号
+
+    按进程区分的本地文件（事件日志目录、写后缓冲的溢出文件）都用它命名；
+    gunicorn --preload 时应在 fork 之后调用，否则各 worker 拿到的是主进程的进程号。
+    """
+    return Config.EVENT_LOG_WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def epoch_seconds(value: datetime) -> float:
+    """UTC naive datetime -> Unix 时间戳（datetime.timestamp() 会把 naive 值当作本地时间）"""
+    return (value - EPOCH).total_seconds()
+
+
+class EventLog:
+    """交互事件日志 - 每 worker 段文件 + 可选 Redis Stream"""
+
+    STREAM_KEY = 'events:interactions'
+    SEGMENT_SUFFIX = '.ndjson'
+
+    def __init__(self):
+        self.enabled = Config.EVENT_LOG_ENABLED
+        self.directory = Config.EVENT_LOG_DIR
+        # 首次追加时（fork 之后）才确定，gunicorn --preload 的各 worker 不会共用主进程的标识
+        self.worker_id: Optional[str] = None
+        self._pid: Optional[int] = None
+        self.segment_bytes = Config.EVENT_LOG_SEGMENT_BYTES
+        self.use_redis = Config.EVENT_LOG_REDIS
+        self.stream_maxlen = Config.EVENT_LOG_STREAM_MAXLEN
+        retention = Config.EVENT_LOG_RETENTION_HOURS
+        self.retention_hours = max(retention, Config.TRENDING_WINDOW_HOURS) if retention > 0 else 0
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment = 0
+
+        self.appended = 0
+        self.stream_appended = 0
+        self.errors = 0
+        self.pruned = 0
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def make_event(row: Dict, tags: Optional[List[str]]) -> Dict:
+        """InteractionService.new_row 构造的行 -> 事件（JSON 可序列化）"""
+        return {
+            'id': str(row['id']),
+            'user_id': str(row['user_id']),
+            'card_id': str(row['card_id']),
+            'action': row['action'],
+            'duration': row['duration'],
+            'tags': list(tags or []),
+            'created_at': row['created_at'].isoformat()
+        }
+
+    def _segment_path(self, worker_id: str, segment: int) -> str:
+        return os.path.join(self.directory, worker_id, f"{segment:08d}{self.SEGMENT_SUFFIX}")
+
+    def _open_segment(self):
+        """打开本 worker 最新的段文件（调用方持有锁）"""
+        worker_dir = os.path.join(self.directory, self.worker_id)
+        os.makedirs(worker_dir, exist_ok=True)
+        segments = self._list_segments(self.worker_id)
+        self._segment = segments[-1] if segments else 0
+        self._file = open(self._segment_path(self.worker_id, self._segment), 'a', encoding='utf-8')
+
+    def append(self, events: Iterable[Dict]):
+        """追加一批事件（失败只记录日志，不影响已提交的交互）"""
+        if not self.enabled:
+            return
+        events = list(events)
+        if not events:
+            return
+        lines = [json.dumps(event, ensure_ascii=False, separators=(',', ':')) for event in events]
+
+        opened = False
+        try:
+            with self._lock:
+                if self._pid != os.getpid():
+                    # 首次写入，或在 fork 出的子进程中：不沿用父进程的标识和文件
+                    self._file = None
+                    self.worker_id = process_worker_id()
+                    self._pid = os.getpid()
+                if self._file is None or os.fstat(self._file.fileno()).st_nlink == 0:
+                    # 首次写入，或当前段已被其他进程按保留期删除
+                    if self._file is not None:
+                        self._file.close()
+                    self._open_segment()
+                    opened = True
+                elif self._file.tell() >= self.segment_bytes:
+                    self._file.close()
+                    self._segment += 1
+                    self._file = open(self._segment_path(self.worker_id, self._segment), 'a', encoding='utf-8')
+                    opened = True
+                # 一次写入整批，读取方只消费以换行结尾的完整行
+                self._file.write(''.join(line + '\n' for line in lines))
+                self._file.flush()
+                self.appended += len(lines)
+        except OSError as e:
+            self.errors += 1
+            print(f"[EventLog] Local append failed: {e}")
+
+        if opened:
+            try:
+                self.prune()
+            except OSError as e:
+                print(f"[EventLog] Prune failed: {e}")
+
+        if self.use_redis:
+            def add_redis(client):
+                pipe = client.pipeline()
+                for line in lines:
+                    pipe.xadd(self.STREAM_KEY, {'data': line}, maxlen=self.stream_maxlen, approximate=True)
+                pipe.execute()
+                self.stream_appended += len(lines)
+
+            queue_service.with_redis(add_redis, lambda: None)
+
+    # ------------------------------------------------------------------
+    # 读取
+    # ------------------------------------------------------------------
+
+    def _list_workers(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name != 'offsets' and os.path.isdir(os.path.join(self.directory, name))
+        )
+
+    def _list_segments(self, worker_id: str) -> List[int]:
+        worker_dir = os.path.join(self.directory, worker_id)
+        if not os.path.isdir(worker_dir):
+            return []
+        return sorted(
+            int(name[:-len(self.SEGMENT_SUFFIX)]) for name in os.listdir(worker_dir)
+            if name.endswith(self.SEGMENT_SUFFIX) and name[:-len(self.SEGMENT_SUFFIX)].isdigit()
+        )
+
+    def start_position(self, source: str, since: datetime = None):
+        """
+        读取起点：since 为空时从头开始；
+        否则本地跳过最后修改时间早于 since 的段，Redis 从 since 对应的 stream ID 开始
+        """
+        if source == SOURCE_REDIS:
+            if since is None:
+                return '0-0'
+            return f"{int(epoch_seconds(since) * 1000)}-0"
+
+        position = {}
+        if since is not None:
+            cutoff = epoch_seconds(since)
+            for worker_id in self._list_workers():
+                for segment in self._list_segments(worker_id):
+                    if os.path.getmtime(self._segment_path(worker_id, segment)) >= cutoff:
+                        position[worker_id] = [segment, 0]
+                        break
+                else:
+                    # 整个 worker 都早于 since：从最后一段末尾开始
+                    segments = self._list_segments(worker_id)
+                    if segments:
+                        path = self._segment_path(worker_id, segments[-1])
+                        position[worker_id] = [segments[-1], os.path.getsize(path)]
+        return position
+
+    def oldest_event_time(self, source: str) -> Optional[datetime]:
+        """日志中仍保留的最早事件的发生时间（各 worker 第一条事件的最小值）；日志为空时为 None"""
+        if source == SOURCE_REDIS:
+            def first_redis(client):
+                entries = client.xrange(self.STREAM_KEY, count=1)
+                return json.loads(entries[0][1]['data']) if entries else None
+
+            first = queue_service.with_redis(first_redis, lambda: None)
+            return datetime.fromisoformat(first['created_at']) if first else None
+
+        oldest = None
+        for worker_id in self._list_workers():
+            for segment in self._list_segments(worker_id):
+                try:
+                    with open(self._segment_path(worker_id, segment), 'rb') as f:
+                        line = f.readline()
+                    created_at = datetime.fromisoformat(json.loads(line)['created_at'])
+                except (OSError, ValueError, KeyError):
+                    # 已被删除的段、空段或写了一半的行：看下一段
+                    continue
+                oldest = created_at if oldest is None else min(oldest, created_at)
+                break
+        return oldest
+
+    def read(self, source: str, position, max_events: int = 1000) -> Tuple[List[Dict], object]:
+        """
+        读取 position 之后的事件
+
+        Returns:
+            (events, new_position)；没有新事件时 new_position 与 position 相同
+        """
+        if source == SOURCE_REDIS:
+            return self._read_stream(position or '0-0', max_events)
+        return self._read_local(dict(position or {}), max_events)
+
+    def _read_local(self, position: Dict, max_events: int) -> Tuple[List[Dict], Dict]:
+        events = []
+        for worker_id in self._list_workers():
+            segment, offset = position.get(worker_id, [None, 0])
+            for current in self._list_segments(worker_id):
+                if segment is not None and current < segment:
+                    continue
+                if current != segment:
+                    segment, offset = current, 0
+
+                with open(self._segment_path(worker_id, current), 'rb') as f:
+                    f.seek(offset)
+                    while len(events) < max_events:
+                        line = f.readline()
+                        if not line.endswith(b'\n'):
+                            # 文件末尾或正在写入的半行
+                            break
+                        offset += len(line)
+                        try:
+                            events.append(json.loads(line))
+                        except ValueError:
+                            print(f"[EventLog] Skipping malformed event in {worker_id}/{current}")
+                position[worker_id] = [segment, offset]
+                if len(events) >= max_events:
+                    return events, position
+        return events, position
+
+    def _read_stream(self, last_id: str, max_events: int) -> Tuple[List[Dict], str]:
+        def read_redis(client):
+            result = client.xread({self.STREAM_KEY: last_id}, count=max_events)
+            events = []
+            new_id = last_id
+            for _, entries in result or []:
+                for entry_id, fields in entries:
+                    events.append(json.loads(fields['data']))
+                    new_id = entry_id
+            return events, new_id
+
+        return queue_service.with_redis(read_redis, lambda: ([], last_id))
+
+    # ------------------------------------------------------------------
+    # 消费者偏移量
+    # ------------------------------------------------------------------
+
+    def _offset_path(self, consumer: str, source: str) -> str:
+        return os.path.join(self.directory, 'offsets', f"{consumer}-{source}.json")
+
+    def load_offset(self, consumer: str, source: str):
+        """读取消费者保存的偏移量，没有时返回 None"""
+        path = self._offset_path(consumer, source)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_offset(self, consumer: str, source: str, position):
+        """原子保存消费者偏移量"""
+        path = self._offset_path(consumer, source)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(position, f)
+        os.replace(tmp_path, path)
+
+    # ------------------------------------------------------------------
+    # 保留期
+    # ------------------------------------------------------------------
+
+    def _active_offsets(self, cutoff: float) -> List[Dict]:
+        """保留期内更新过的本地消费者偏移量（更早的视为已停止的消费者，不再阻止删除）"""
+        offsets_dir = os.path.join(self.directory, 'offsets')
+        if not os.path.isdir(offsets_dir):
+            return []
+        positions = []
+        for name in os.listdir(offsets_dir):
+            path = os.path.join(offsets_dir, name)
+            if not name.endswith(f"-{SOURCE_LOCAL}.json") or os.path.getmtime(path) < cutoff:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    positions.append(json.load(f) or {})
+            except (OSError, ValueError):
+                continue
+        return positions
+
+    def prune(self, now: float = None) -> int:
+        """
+        删除最后修改时间早于保留期的段文件，以及删除后为空的其他 worker 目录
+
+        不删除本进程正在写入的段，也不删除保留期内更新过偏移量的消费者还没读完的段。
+
+        Returns:
+            删除的段文件数
+        """
+        if not self.retention_hours:
+            return 0
+        cutoff = (time.time() if now is None else now) - self.retention_hours * 3600
+        offsets = self._active_offsets(cutoff)
+        removed = 0
+
+        for worker_id in self._list_workers():
+            worker_removed = 0
+            for segment in self._list_segments(worker_id):
+                if worker_id == self.worker_id and self._file is not None and segment >= self._segment:
+                    break
+                path = self._segment_path(worker_id, segment)
+                # 同一 worker 的段按序号先后写入，遇到保留期内的段即可停止
+                if os.path.getmtime(path) >= cutoff:
+                    break
+                # 偏移量里没有该 worker 的消费者还没开始读它
+                if any(position.get(worker_id, [-1])[0] <= segment for position in offsets):
+                    break
+                os.remove(path)
+                worker_removed += 1
+
+            removed += worker_removed
+            if worker_id != self.worker_id and worker_removed and not self._list_segments(worker_id):
+                try:
+                    os.rmdir(os.path.join(self.directory, worker_id))
+                except OSError:
+                    pass  # 目录里还有其他文件，或该 worker 恰好重新开始写入
+
+        if removed:
+            self.pruned += removed
+            print(f"[EventLog] Pruned {removed} segment(s) older than {self.retention_hours}h")
+        return removed
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "worker_id": self.worker_id,
+            "segment": self._segment,
+            "redis": self.use_redis,
+            "appended": self.appended,
+            "stream_appended": self.stream_appended,
+            "errors": self.errors,
+            "pruned": self.pruned
+        }
+
+
+# 全局单例
+event_log = EventLog()
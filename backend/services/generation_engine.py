@@ -0,0 +1,110 @@
+"""
+GenerationEngine - 并行卡片生成
+
+Actor 的 LLM 调用是阻塞的网络 I/O，逐个选题生成时一批 N 张卡片要花 N × LLM 延迟。
+GenerationEngine 用线程池并行调用（同时进行的 LLM 调用不超过 FACTORY_MAX_INFLIGHT），
+按完成顺序把结果交回调用线程：
+1. 生成（工作线程）：generate(topic) -> payload，抛异常或返回空只记为该选题失败
+2. 保存（调用线程）：save(topic, payload)，在调用方的应用上下文 / 数据库会话中执行，
+   每完成一张保存一张；抛异常时回滚并记为该选题失败，不影响其他选题
+3. 返回本批统计：成功 / 失败数、耗时、吞吐、LLM 平均耗时、失败原因
+
+ContentFactoryService.generate_cards_sync 和 scripts/factory.py 共用。
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from models import db
+
+
+class GenerationEngine:
+    """有界并发的卡片生成"""
+
+    def __init__(self, max_inflight: int = None):
+        self.max_inflight = max_inflight if max_inflight is not None else Config.FACTORY_MAX_INFLIGHT
+        self.last_stats: Optional[Dict] = None
+
+    @staticmethod
+    def _timed(generate: Callable[[Dict], Any], topic_data: Dict):
+        started = time.monotonic()
+        payload = generate(topic_data)
+        return payload, time.monotonic() - started
+
+    def run(self, topics: List[Dict], generate: Callable[[Dict], Any],
+            save: Callable[[Dict, Any], Any], max_inflight: int = None) -> Dict:
+        """
+        并行生成并逐个保存一批选题
+
+        Args:
+            topics: Director 生成的选题
+            generate: 选题 -> payload（在工作线程中调用，需线程安全）
+            save: (选题, payload) -> 任意结果（在调用线程中调用），校验失败时抛出 ValueError
+            max_inflight: 本批最多同时进行的生成数（默认 FACTORY_MAX_INFLIGHT）
+
+        Returns:
+            本批统计 {"total", "created", "failed", "max_inflight", "elapsed_seconds",
+                      "cards_per_minute", "avg_generate_seconds", "errors": [{"topic", "error"}]}
+        """
+        max_inflight = max(1, max_inflight or self.max_inflight)
+        total = len(topics)
+        created = 0
+        errors = []
+        durations = []
+        started = time.monotonic()
+
+        def fail(topic_data: Dict, reason: str):
+            topic = topic_data.get('topic', 'Unknown')
+            errors.append({"topic": topic, "error": reason})
+            print(f"[GenerationEngine] [{created + len(errors)}/{total}] ✗ {topic}: {reason}")
+
+        if topics:
+            with ThreadPoolExecutor(max_workers=min(max_inflight, total),
+                                    thread_name_prefix='generate') as executor:
+                futures = {
+                    executor.submit(self._timed, generate, topic_data): topic_data
+                    for topic_data in topics
+                }
+                for future in as_completed(futures):
+                    topic_data = futures[future]
+                    try:
+                        payload, duration = future.result()
+                    except Exception as e:
+                        fail(topic_data, f"Generation error: {e}")
+                        continue
+                    durations.append(duration)
+                    if not payload:
+                        fail(topic_data, "Empty payload")
+                        continue
+
+                    try:
+                        save(topic_data, payload)
+                    except Exception as e:
+                        db.session.rollback()
+                        fail(topic_data, str(e))
+                        continue
+                    created += 1
+                    print(f"[GenerationEngine] [{created + len(errors)}/{total}] ✓ "
+                          f"{topic_data.get('topic', 'Unknown')} ({duration:.1f}s)")
+
+        elapsed = time.monotonic() - started
+        stats = {
+            "total": total,
+            "created": created,
+            "failed": len(errors),
+            "max_inflight": max_inflight,
+            "elapsed_seconds": round(elapsed, 2),
+            "cards_per_minute": round(created / elapsed * 60, 2) if elapsed > 0 else 0,
+            "avg_generate_seconds": round(sum(durations) / len(durations), 2) if durations else 0,
+            "errors": errors
+        }
+        self.last_stats = stats
+        print(f"[GenerationEngine] {created}/{total} cards in {stats['elapsed_seconds']}s "
+              f"({stats['cards_per_minute']} cards/min, max in-flight {max_inflight})")
+        return stats
+
+
+# 全局单例
+generation_engine = GenerationEngine()
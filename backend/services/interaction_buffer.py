@@ -0,0 +1,438 @@
+"""
+InteractionBuffer - 交互写后缓冲（可选，INTERACTION_WRITE_BEHIND=true 时启用）
+
+/record 不再每次请求提交一个事务，而是：
+1. 追加一行到本地溢出文件（NDJSON，崩溃后可恢复），放入内存缓冲区，立即返回
+2. 后台 flusher 线程每 FLUSH_INTERVAL_MS 毫秒或攒够 FLUSH_BATCH 条时组提交
+   （InteractionService.write_batch：一次插入 + 画像更新 + 一次提交，随后更新已看集合），
+   画像和已看集合与持久化的交互来自同一条流，保持一致
+3. 缓冲区满时 submit 最多等待 SUBMIT_TIMEOUT 秒，仍满则抛出 BufferFullError（路由返回 503，背压）
+4. 组提交失败：连接类错误（数据库不可用）整批稍后重试；其他错误按二分拆批重试，
+   单独提交仍失败的行写入死信文件（INTERACTION_DEAD_LETTER_FILE）后移出缓冲区，不阻塞后面的交互
+
+溢出文件：
+- 每个进程一个：INTERACTION_SPILL_FILE 加 worker 标识后缀（`interaction_spill.{worker_id}.ndjson`，
+  worker_id 见 event_log.process_worker_id），死信文件同样按进程区分；在 start() 中（fork 之后）确定
+- 进程持有 `<溢出文件>.lock` 的排他锁直到退出（fcntl.flock，非 POSIX 平台不加锁）
+- 缓冲区清空后截断；持续有积压时行数超过 2 × 缓冲区上限就按剩余事件重写
+- 启动时重放：本进程的溢出文件、旧版不带后缀的溢出文件，以及锁已释放（所属进程已退出）的
+  其他 worker 的溢出文件；按 id 去掉已入库的行，其余重新入队，写入本进程的溢出文件后删除原文件
+- flusher 只在服务进程中启动（app.start_background_workers），脚本导入 app 时不会碰溢出文件
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 平台：不加锁，只重放本进程和旧版的溢出文件
+    fcntl = None
+
+from sqlalchemy.exc import DisconnectionError, InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from config import Config
+from models import db
+from models.interaction import Interaction
+from services.event_log import process_worker_id
+from services.interaction_service import InteractionService
+
+
+# 数据库连接类错误：整批稍后重试（不拆批，不进死信）
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, DisconnectionError, PoolTimeoutError)
+
+
+class BufferFullError(Exception):
+    """缓冲区已满（背压）"""
+
+
+class InteractionBuffer:
+    """交互写后缓冲 + 组提交"""
+
+    # 组提交失败后的重试间隔（秒）
+    RETRY_BACKOFF_SECONDS = 1.0
+
+    def __init__(self):
+        self.enabled = Config.INTERACTION_WRITE_BEHIND
+        self.flush_interval = Config.INTERACTION_FLUSH_INTERVAL_MS / 1000.0
+        self.flush_batch = Config.INTERACTION_FLUSH_BATCH
+        self.max_size = Config.INTERACTION_BUFFER_MAX
+        self.submit_timeout = Config.INTERACTION_SUBMIT_TIMEOUT
+        # 配置的基础路径；本进程实际使用的文件在 start() 中加上 worker 标识
+        self.spill_path = Config.INTERACTION_SPILL_FILE
+        self.dead_letter_path = Config.INTERACTION_DEAD_LETTER_FILE
+        self.fsync = Config.INTERACTION_SPILL_FSYNC
+        self.spill_file: Optional[str] = None
+        self.dead_letter_file: Optional[str] = None
+
+        self._pending: deque = deque()
+        self._cond = threading.Condition()
+        self._spill = None
+        self._spill_lock = None
+        self._spill_lines = 0
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        self.submitted = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self.last_flush_ms = 0.0
+
+    def is_active(self) -> bool:
+        return self.enabled and self._thread is not None and not self._stopping
+
+    # ------------------------------------------------------------------
+    # 溢出文件
+    # ------------------------------------------------------------------
+
+    def _append_spill(self, row: Dict):
+        """追加到溢出文件（调用方持有锁）"""
+        self._spill.write(InteractionService.encode_row(row) + '\n')
+        self._spill.flush()
+        if self.fsync:
+            os.fsync(self._spill.fileno())
+        self._spill_lines += 1
+
+    def _rewrite_spill(self):
+        """按当前缓冲区内容重写溢出文件（调用方持有锁）"""
+        tmp_path = self.spill_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self._pending:
+                f.write(InteractionService.encode_row(row) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._spill.close()
+        os.replace(tmp_path, self.spill_file)
+        self._spill = open(self.spill_file, 'a', encoding='utf-8')
+        self._spill_lines = len(self._pending)
+
+    @staticmethod
+    def _existing_ids(rows: List[Dict]) -> set:
+        """已经入库的交互 ID（一次 IN 查询）"""
+        ids = [row['id'] for row in rows]
+        return {
+            row[0] for row in
+            db.session.query(Interaction.id).filter(Interaction.id.in_(ids)).all()
+        }
+
+    @staticmethod
+    def _worker_path(path: str, worker_id: str) -> str:
+        """interaction_spill.ndjson -> interaction_spill.{worker_id}.ndjson"""
+        root, ext = os.path.splitext(path)
+        return f"{root}.{worker_id}{ext}"
+
+    @staticmethod
+    def _try_lock(path: str):
+        """
+        非阻塞地获取 `<path>.lock` 的排他锁
+
+        Returns:
+            持有锁的文件对象（关闭即释放）；锁被其他进程持有时为 None；不支持 flock 时为 False
+        """
+        if fcntl is None:
+            return False
+        lock = open(path + '.lock', 'a')
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        return lock
+
+    def _orphaned_spill_files(self) -> List[tuple]:
+        """
+        需要由本进程接管的其他溢出文件：旧版不带后缀的文件，以及锁已释放的其他 worker 的文件
+
+        Returns:
+            [(路径, 锁文件对象或 False)]，锁持有到文件删除为止
+        """
+        orphans = []
+        if os.path.exists(self.spill_path):
+            orphans.append((self.spill_path, False))
+        if fcntl is None:
+            return orphans
+
+        root, ext = os.path.splitext(self.spill_path)
+        for path in sorted(glob.glob(f"{glob.escape(root)}.*{ext}")):
+            if path == self.spill_file or path.endswith(('.lock', '.tmp')):
+                continue
+            lock = self._try_lock(path)
+            if lock is None:
+                continue  # 所属进程仍在运行
+            if not os.path.exists(path):
+                lock.close()  # 已被其他进程接管
+                continue
+            orphans.append((path, lock))
+        return orphans
+
+    @staticmethod
+    def _release_spill_files(files: List[tuple], remove: bool):
+        """释放溢出文件的锁；remove 时连同锁文件删除"""
+        for path, lock in files:
+            if remove:
+                for stale in (path, path + '.lock'):
+                    try:
+                        os.remove(stale)
+                    except FileNotFoundError:
+                        pass
+            if lock:
+                lock.close()
+
+    def _recover(self, paths: List[str]):
+        """重放溢出文件中未入库的交互（需要应用上下文）"""
+        rows = {}
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = InteractionService.decode_row(line)
+                    except (ValueError, KeyError):
+                        # 崩溃时写了一半的最后一行
+                        continue
+                    rows.setdefault(row['id'], row)
+        if not rows:
+            return
+
+        existing = self._existing_ids(list(rows.values()))
+        db.session.remove()
+        pending = [row for row_id, row in rows.items() if row_id not in existing]
+        with self._cond:
+            self._pending.extendleft(reversed(pending))
+        print(f"[InteractionBuffer] Recovered {len(pending)} interactions from {len(paths)} spill file(s)")
+
+    # ------------------------------------------------------------------
+    # 生命周期
+    # ------------------------------------------------------------------
+
+    def start(self, app):
+        """启动 flusher 线程（INTERACTION_WRITE_BEHIND 未开启时什么也不做）"""
+        if not self.enabled or self._thread is not None:
+            return
+
+        self._app = app
+        worker_id = process_worker_id()
+        self.spill_file = self._worker_path(self.spill_path, worker_id)
+        self.dead_letter_file = self._worker_path(self.dead_letter_path, worker_id)
+        for path in (self.spill_file, self.dead_letter_file):
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self._spill_lock = self._try_lock(self.spill_file)
+        if self._spill_lock is None:
+            # EVENT_LOG_WORKER_ID 被多个进程共用：不能共享溢出文件，退回同步写入
+            print(f"[InteractionBuffer] Spill file {self.spill_file} is locked by another process, "
+                  f"write-behind disabled")
+            return
+
+        orphans = self._orphaned_spill_files()
+        with app.app_context():
+            try:
+                self._recover([self.spill_file] + [path for path, _ in orphans])
+            except Exception as e:
+                # 表尚未创建等情况：保留溢出文件，下次启动再重放
+                print(f"[InteractionBuffer] Spill file recovery failed: {e}")
+                self._release_spill_files(orphans + [(self.spill_file, self._spill_lock)], remove=False)
+                with self._cond:
+                    self._pending.clear()
+                return
+
+        with self._cond:
+            self._spill = open(self.spill_file, 'a', encoding='utf-8')
+            self._rewrite_spill()
+        # 接管的行已写入本进程的溢出文件，原文件可以删除
+        self._release_spill_files(orphans, remove=True)
+
+        self._thread = threading.Thread(target=self._run, name='interaction-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        print(f"[InteractionBuffer] Write-behind enabled (spill file: {self.spill_file})")
+
+    def stop(self, timeout: float = 5.0):
+        """停止 flusher，尽量把缓冲区写完（未写完的留在溢出文件中，下次启动重放）"""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return
+        with self._cond:
+            drained = not self._pending
+            self._spill.close()
+        # 写完时删除本进程的溢出文件（否则每次重启都留下一个空文件）；没写完的留给下次启动重放
+        self._release_spill_files([(self.spill_file, self._spill_lock)], remove=drained)
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+
+    def submit(self, row: Dict):
+        """
+        缓冲一条交互（InteractionService.new_row 构造）
+
+        Raises:
+            BufferFullError: 等待 submit_timeout 后缓冲区仍满，或缓冲正在停止
+        """
+        deadline = time.monotonic() + self.submit_timeout
+        with self._cond:
+            if self._stopping:
+                raise BufferFullError("Interaction buffer is stopping")
+            while len(self._pending) >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += 1
+                    raise BufferFullError("Interaction buffer is full")
+                self._cond.wait(remaining)
+
+            self._append_spill(row)
+            self._pending.append(row)
+            self.submitted += 1
+            if len(self._pending) >= self.flush_batch:
+                self._cond.notify_all()
+
+    def _take_batch(self) -> List[Dict]:
+        """等待到达批量或时间间隔，取出一批（不移出缓冲区，提交成功后再移出）"""
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while not self._stopping and len(self._pending) < self.flush_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return [self._pending[i] for i in range(min(self.flush_batch, len(self._pending)))]
+
+    def _commit_batch(self, batch: List[Dict]) -> int:
+        """组提交一批，返回写入的行数"""
+        card_tags = InteractionService.load_card_tags(row['card_id'] for row in batch)
+        # 不存在的卡片会让整批违反外键，单独丢弃
+        valid = [row for row in batch if row['card_id'] in card_tags]
+        if len(valid) < len(batch):
+            self.dropped += len(batch) - len(valid)
+            print(f"[InteractionBuffer] Dropped {len(batch) - len(valid)} interactions with unknown cards")
+        # 已入库的行（例如重启后从溢出文件重放）不再插入，否则主键冲突会让整批反复失败
+        existing = self._existing_ids(valid) if valid else set()
+        rows = [row for row in valid if row['id'] not in existing]
+        InteractionService.write_batch(rows, card_tags)
+        return len(rows)
+
+    def _dead_letter(self, row: Dict, error: Exception):
+        """单独提交仍失败的行写入死信文件（每行 {"error", "row"}），之后不再重试"""
+        self.dead_lettered += 1
+        print(f"[InteractionBuffer] Dead-lettered interaction {row['id']}: {error}")
+        try:
+            with open(self.dead_letter_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({
+                    'error': str(error),
+                    'row': json.loads(InteractionService.encode_row(row))
+                }, separators=(',', ':')) + '\n')
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[InteractionBuffer] Dead-letter write failed: {e}")
+
+    def _commit_isolating(self, batch: List[Dict], done: List[Dict]):
+        """
+        提交一批；非连接类错误时拆成两半分别重试，单行仍失败则进死信
+
+        处理完（已提交或进了死信）的行追加到 done；连接类错误直接抛出，done 中是已处理的部分。
+        """
+        try:
+            written = self._commit_batch(batch)
+        except TRANSIENT_ERRORS:
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                self._dead_letter(batch[0], e)
+                done.extend(batch)
+                return
+            mid = len(batch) // 2
+            self._commit_isolating(batch[:mid], done)
+            self._commit_isolating(batch[mid:], done)
+            return
+        self.flushed += written
+        done.extend(batch)
+
+    def _flush(self, batch: List[Dict]) -> bool:
+        """
+        组提交缓冲区头部的一批，把处理完的行移出缓冲区
+
+        Returns:
+            是否整批处理完；False 表示遇到连接类错误，剩余的行留在缓冲区头部稍后重试
+        """
+        started = time.monotonic()
+        done: List[Dict] = []
+        error = None
+        try:
+            with self._app.app_context():
+                self._commit_isolating(batch, done)
+        except Exception as e:
+            error = e
+
+        with self._cond:
+            for _ in batch:
+                self._pending.popleft()
+            if len(done) < len(batch):
+                processed = {row['id'] for row in done}
+                self._pending.extendleft(reversed([row for row in batch if row['id'] not in processed]))
+            if done:
+                self.batches += 1
+                self.last_flush_ms = (time.monotonic() - started) * 1000
+            if not self._pending:
+                self._spill.truncate(0)
+                self._spill_lines = 0
+            elif self._spill_lines > 2 * self.max_size:
+                self._rewrite_spill()
+            self._cond.notify_all()  # 唤醒等待空间的 submit
+
+        if error is not None:
+            self.failures += 1
+            print(f"[InteractionBuffer] Group commit failed ({error}), retrying")
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                if self._stopping:
+                    return
+                continue
+
+            if not self._flush(batch):
+                if self._stopping:
+                    return
+                time.sleep(self.RETRY_BACKOFF_SECONDS)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "spill_file": self.spill_file,
+                "pending": len(self._pending),
+                "max_size": self.max_size,
+                "submitted": self.submitted,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "dropped": self.dropped,
+                "dead_lettered": self.dead_lettered,
+                "last_flush_ms": round(self.last_flush_ms, 2)
+            }
+
+
+# 全局单例
+interaction_buffer = InteractionBuffer()
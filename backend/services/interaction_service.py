@@ -0,0 +1,118 @@
+"""
+InteractionService - 交互写入
+
+/record、/record/batch 和写后缓冲 (InteractionBuffer) 共用的写入路径：
+一次 executemany 插入 + 按用户更新画像和统计汇总 + 一次提交，
+提交成功后再更新已看集合并追加到事件日志 (EventLog)。
+"""
+
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import insert
+
+from models import db
+from models.card import Card
+from models.interaction import Interaction
+from services.event_log import EventLog, event_log
+from services.recommendation_service import recommendation_service
+from services.seen_service import seen_set_service
+from services.stats_service import stats_service
+
+
+class InteractionService:
+    @staticmethod
+    def new_row(user_id: uuid.UUID, card_id: uuid.UUID, action: str, duration: int = None,
+                created_at: datetime = None) -> Dict:
+        """构造一行交互（id 在写入前生成，便于先返回给客户端）"""
+        return {
+            'id': uuid.uuid4(),
+            'user_id': user_id,
+            'card_id': card_id,
+            'action': action,
+            'duration': duration,
+            'created_at': created_at or datetime.utcnow()
+        }
+
+    @staticmethod
+    def encode_row(row: Dict) -> str:
+        """一行交互编码为一行 JSON（溢出文件和归档文件共用）"""
+        return json.dumps({
+            'id': str(row['id']),
+            'user_id': str(row['user_id']),
+            'card_id': str(row['card_id']),
+            'action': row['action'],
+            'duration': row['duration'],
+            'created_at': row['created_at'].isoformat()
+        }, separators=(',', ':'))
+
+    @staticmethod
+    def decode_row(line: str) -> Dict:
+        """encode_row 的逆过程，格式不合法时抛出 ValueError / KeyError"""
+        data = json.loads(line)
+        return {
+            'id': uuid.UUID(data['id']),
+            'user_id': uuid.UUID(data['user_id']),
+            'card_id': uuid.UUID(data['card_id']),
+            'action': data['action'],
+            'duration': data['duration'],
+            'created_at': datetime.fromisoformat(data['created_at'])
+        }
+
+    @staticmethod
+    def load_card_tags(card_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, List[str]]:
+        """一次 IN 查询取回卡片标签（不存在的卡片不出现在结果中）"""
+        card_ids = set(card_ids)
+        if not card_ids:
+            return {}
+        return dict(db.session.query(Card.id, Card.tags).filter(Card.id.in_(card_ids)).all())
+
+    @staticmethod
+    def write_batch(rows: List[Dict], card_tags: Dict[uuid.UUID, List[str]] = None):
+        """
+        写入一批交互：一次 executemany 插入，画像和统计汇总按用户各更新一次，一次提交
+
+        失败时回滚并抛出异常；提交成功后更新已看集合并追加事件日志（这两步失败只记录日志，不抛出）。
+
+        Args:
+            rows: new_row 构造的行（按发生顺序）
+            card_tags: card_id -> 标签（缺省时查询一次）
+        """
+        if not rows:
+            return
+        if card_tags is None:
+            card_tags = InteractionService.load_card_tags(row['card_id'] for row in rows)
+
+        by_user = defaultdict(list)  # user_id -> 画像更新用的交互
+        seen_by_user = defaultdict(list)  # user_id -> 卡片 ID
+        for row in rows:
+            by_user[row['user_id']].append(
+                (row['id'], row['action'], row['duration'], card_tags.get(row['card_id']))
+            )
+            seen_by_user[row['user_id']].append(row['card_id'])
+
+        try:
+            db.session.execute(insert(Interaction), rows)
+            for user_id, interactions in by_user.items():
+                recommendation_service.apply_interactions(user_id, interactions)
+                stats_service.apply(user_id, [(action, duration) for _, action, duration, _ in interactions])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        # 以下都在提交之后：失败只记录日志，不能抛给调用方（写后缓冲会把已入库的行当作失败重试）
+        try:
+            for user_id, card_ids in seen_by_user.items():
+                seen_set_service.mark_seen(str(user_id), card_ids)
+        except Exception as e:
+            print(f"[InteractionService] Seen-set update failed after commit: {e}")
+
+        # 提交成功后追加到事件日志（派生状态可据此重放）
+        try:
+            event_log.append(EventLog.make_event(row, card_tags.get(row['card_id'])) for row in rows)
+        except Exception as e:
+            print(f"[InteractionService] Event log append failed after commit: {e}")
@@ -1,74 +1,681 @@
 import os
-from typing import List, Optional
-from collections import defaultdict
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from collections import Counter, OrderedDict, deque
+
+# 脚本只访问 KEYS 中声明的键（Redis Cluster 要求），快照键由调用方在脚本外读写；
+# 同一用户的队列键和成员集合键用 {user_id} 哈希标签落在同一个槽
+
+# 弹出队首 N 个，同时返回剩余长度和是否低于补货阈值，一次往返
+# KEYS[1] = 队列键；ARGV = [N, 补货阈值]
+# 返回 [剩余长度, 是否低于阈值(0/1), id1, id2, ...]
+POP_AND_INSPECT_SCRIPT = """
+local count = tonumber(ARGV[1])
+local ids = redis.call('LRANGE', KEYS[1], 0, count - 1)
+if #ids > 0 then
+    redis.call('LTRIM', KEYS[1], #ids, -1)
+end
+local remaining = redis.call('LLEN', KEYS[1])
+local result = {remaining, remaining < tonumber(ARGV[2]) and 1 or 0}
+for i, card_id in ipairs(ids) do
+    result[i + 2] = card_id
+end
+return result
+"""
+
+
+# 入队时跳过成员集合中已有的卡片（已在队列里或已出队未过期），一次往返
+# KEYS[1] = 队列键, KEYS[2] = 成员集合键
+# ARGV = [成员集合 TTL, id1, id2, ...]
+# 返回实际入队的 ID 列表
+PUSH_UNIQUE_SCRIPT = """
+local pushed = {}
+for i = 2, #ARGV do
+    local card_id = ARGV[i]
+    if redis.call('SADD', KEYS[2], card_id) == 1 then
+        redis.call('RPUSH', KEYS[1], card_id)
+        pushed[#pushed + 1] = card_id
+    end
+end
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return pushed
+"""
+
+
+class QueuePop(NamedTuple):
+    """一次出队的结果：取出的 (card_id, 快照) 列表、剩余长度、是否低于补货阈值"""
+    items: List[Tuple[str, Optional[bytes]]]
+    remaining: int
+    below_min: bool
+
+
+class _UserQueue:
+    """内存模式下单个用户的队列、成员集合和最后访问时间"""
+    
+    __slots__ = ('queue', 'members', 'members_expire', 'last_access')
+    
+    def __init__(self):
+        self.queue = deque()
+        self.members = {}  # 入过队且未过期的卡片（含已出队，按入队先后），用于去重
+        self.members_expire = None  # 已出队成员的过期时间（每次入队顺延，对应 Redis 成员集合的 EXPIRE）
+        self.last_access = time.monotonic()
+
+
+class MemoryQueueStore:
+    """
+    内存队列后端 - 每个用户一个 deque，O(1) 出队
+    
+    - 按最近访问时间 LRU 排序，超过 max_users 或空闲超过 idle_ttl 的用户整队淘汰
+    - 全局条目数（各用户成员集合大小之和，排队中的卡片也在成员集合里）超过 max_entries 时
+      从最久未访问的用户开始淘汰；单个用户超限时先丢弃最早的已出队成员
+    - 匿名请求每次生成新 UUID，没有上限时内存会无限增长
+    - 每个用户带一个成员集合，push 时跳过已入过队的卡片（与 Redis 模式的 members 集合对应）；
+      与 Redis 一样，最后一次入队 members_ttl 秒后丢弃已出队的成员（排队中的保留）
+    """
+    
+    def __init__(self, max_users: int = 10000, max_entries: int = 500000,
+                 idle_ttl: int = 3600, on_evict: Callable[[Iterable[str]], None] = None,
+                 members_ttl: int = 24 * 3600):
+        self.max_users = max_users
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.members_ttl = members_ttl
+        self.on_evict = on_evict  # 淘汰时回调被丢弃的卡片 ID（用于释放快照）
+        
+        self._queues: OrderedDict = OrderedDict()  # user_id -> _UserQueue
+        self._entries = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+    
+    def _touch(self, user_id: str, create: bool = False) -> Optional[_UserQueue]:
+        """取出用户队列并移到 LRU 末尾（调用方持有锁）"""
+        item = self._queues.get(user_id)
+        if item is None:
+            if not create:
+                return None
+            item = self._queues[user_id] = _UserQueue()
+        item.last_access = time.monotonic()
+        self._queues.move_to_end(user_id)
+        return item
+    
+    def _drop(self, user_id: str) -> List[str]:
+        """移除用户队列，返回其中的卡片 ID（调用方持有锁）"""
+        item = self._queues.pop(user_id)
+        self._entries -= len(item.members)
+        return list(item.queue)
+    
+    def _evict(self, keep: str = None) -> List[str]:
+        """按 LRU 淘汰空闲或超限的用户（调用方持有锁），返回被丢弃的卡片 ID"""
+        dropped = []
+        deadline = time.monotonic() - self.idle_ttl if self.idle_ttl else None
+        while self._queues:
+            user_id, item = next(iter(self._queues.items()))
+            if user_id == keep:
+                break
+            over_limit = len(self._queues) > self.max_users or self._entries > self.max_entries
+            idle = deadline is not None and item.last_access < deadline
+            if not (over_limit or idle):
+                break
+            dropped.extend(self._drop(user_id))
+            self.evictions += 1
+        return dropped
+    
+    def _release(self, dropped: List[str]):
+        if dropped and self.on_evict:
+            self.on_evict(dropped)
+    
+    def length(self, user_id: str) -> int:
+        with self._lock:
+            item = self._queues.get(user_id)
+            return len(item.queue) if item else 0
+    
+    def _trim_served(self, item: _UserQueue, count: int = None):
+        """丢弃最早的 count 个（默认全部）已出队成员（调用方持有锁）"""
+        queued = set(item.queue)
+        served = [card_id for card_id in item.members if card_id not in queued][:count]
+        for card_id in served:
+            del item.members[card_id]
+        self._entries -= len(served)
+    
+    def _expire_members(self, item: _UserQueue):
+        """成员集合过期时丢弃已出队的成员（调用方持有锁）"""
+        if item.members_expire is not None and item.members_expire <= time.monotonic():
+            self._trim_served(item)
+            item.members_expire = None
+    
+    def _extend_members_ttl(self, item: _UserQueue):
+        if self.members_ttl:
+            item.members_expire = time.monotonic() + self.members_ttl
+    
+    def push(self, user_id: str, card_ids: List[str]) -> List[str]:
+        """入队不在成员集合中的卡片，返回实际入队的 ID"""
+        with self._lock:
+            item = self._touch(user_id, create=True)
+            self._expire_members(item)
+            new = [card_id for card_id in dict.fromkeys(card_ids) if card_id not in item.members]
+            # 单个用户超过全局上限：先腾出已出队的成员，仍放不下时只保留能放下的部分
+            overflow = len(item.members) + len(new) - self.max_entries
+            if overflow > 0:
+                self._trim_served(item, overflow)
+            accepted = new[:max(0, self.max_entries - len(item.members))]
+            item.members.update(dict.fromkeys(accepted))
+            item.queue.extend(accepted)
+            self._entries += len(accepted)
+            self._extend_members_ttl(item)
+            dropped = self._evict(keep=user_id)
+        self._release(dropped)
+        return accepted
+    
+    def pop(self, user_id: str, count: int = 1) -> Tuple[List[str], int]:
+        """取出最多 count 个，返回 (卡片 ID 列表, 剩余长度)；出队的卡片保留在成员集合中直到过期（仍计入条目数）"""
+        with self._lock:
+            item = self._touch(user_id)
+            if not item or not item.queue:
+                return [], 0
+            queue = item.queue
+            cards = [queue.popleft() for _ in range(min(count, len(queue)))]
+            remaining = len(queue)
+            dropped = self._evict(keep=user_id)
+        self._release(dropped)
+        return cards, remaining
+    
+    def push_front(self, user_id: str, card_ids: List[str]):
+        """把出队后未展示的卡片放回队首（保持原顺序），并登记到成员集合"""
+        with self._lock:
+            item = self._touch(user_id, create=True)
+            self._expire_members(item)
+            item.queue.extendleft(reversed(card_ids))
+            new = [card_id for card_id in dict.fromkeys(card_ids) if card_id not in item.members]
+            item.members.update(dict.fromkeys(new))
+            self._entries += len(new)
+            self._extend_members_ttl(item)
+            dropped = self._evict(keep=user_id)
+        self._release(dropped)
+    
+    def peek(self, user_id: str, count: int = 10) -> List[str]:
+        with self._lock:
+            item = self._queues.get(user_id)
+            if not item:
+                return []
+            return [item.queue[i] for i in range(min(count, len(item.queue)))]
+    
+    def members(self, user_id: str) -> set:
+        with self._lock:
+            item = self._queues.get(user_id)
+            if not item:
+                return set()
+            self._expire_members(item)
+            return set(item.members)
+    
+    def clear(self, user_id: str) -> List[str]:
+        with self._lock:
+            if user_id not in self._queues:
+                return []
+            return self._drop(user_id)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "users": len(self._queues),
+                "entries": self._entries,
+                "max_users": self.max_users,
+                "max_entries": self.max_entries,
+                "idle_ttl": self.idle_ttl,
+                "evictions": self.evictions
+            }
+
+
+class RedisConnection:
+    """
+    Redis 连接管理 - 连接池 + 熔断器 + 健康检查
+    
+    - 首次使用时才连接（导入模块不会因 Redis 慢而阻塞启动）
+    - 有界连接池，带 socket / 连接超时
+    - 连续 failure_threshold 次连接类错误后熔断（circuit=open），请求直接走内存，不再逐个等超时
+    - 后台健康检查线程定期 PING：熔断 retry_seconds 后探测成功即恢复 Redis（circuit=closed），
+      正常状态下 PING 失败则立即熔断
+    """
+    
+    def __init__(self, host: str, port: int, password: Optional[str] = None,
+                 max_connections: int = 50, socket_timeout: float = 0.5,
+                 connect_timeout: float = 0.5, failure_threshold: int = 3,
+                 retry_seconds: float = 10, health_check_interval: float = 5,
+                 on_connect: Callable = None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.max_connections = max_connections
+        self.socket_timeout = socket_timeout
+        self.connect_timeout = connect_timeout
+        self.failure_threshold = failure_threshold
+        self.retry_seconds = retry_seconds
+        self.health_check_interval = health_check_interval
+        self.on_connect = on_connect  # 客户端创建后回调（注册 Lua 脚本等）
+        
+        self.errors: tuple = ()  # 触发熔断的异常类型
+        self.circuit = 'closed'
+        self._client = None
+        self._started = False
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self.failovers = 0
+        self.recoveries = 0
+        self.last_error: Optional[str] = None
+    
+    # ------------------------------------------------------------------
+    # 连接
+    # ------------------------------------------------------------------
+    
+    def _start(self):
+        """首次使用时创建连接池、探测一次并启动健康检查线程"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            try:
+                import redis
+            except ImportError:
+                self._open("redis package not installed")
+                print("[QueueService] redis package not installed, using in-memory queue")
+                return
+            
+            self.errors = (redis.ConnectionError, redis.TimeoutError)
+            pool = redis.ConnectionPool(
+                host=self.host,
+                port=self.port,
+                password=self.password,
+                max_connections=self.max_connections,
+                socket_timeout=self.socket_timeout,
+                socket_connect_timeout=self.connect_timeout,
+                decode_responses=True
+            )
+            self._client = redis.Redis(connection_pool=pool)
+            if self.on_connect:
+                self.on_connect(self._client)
+            
+            try:
+                self._client.ping()
+                print("[QueueService] Using Redis backend")
+            except Exception as e:
+                self._open(e)
+                print(f"[QueueService] Redis not available ({e}), using in-memory queue")
+        
+        thread = threading.Thread(target=self._health_loop, name='redis-health', daemon=True)
+        thread.start()
+    
+    def client(self):
+        """熔断关闭时返回 Redis 客户端，否则返回 None（调用方走内存）"""
+        if not self._started:
+            self._start()
+        return self._client if self.circuit == 'closed' else None
+    
+    # ------------------------------------------------------------------
+    # 熔断器
+    # ------------------------------------------------------------------
+    
+    def _open(self, error):
+        self.circuit = 'open'
+        self._opened_at = time.monotonic()
+        self.last_error = str(error)
+    
+    def record_success(self):
+        self._failures = 0
+    
+    def record_failure(self, error):
+        """记录一次 Redis 连接类错误，连续达到阈值后熔断"""
+        with self._lock:
+            self._failures += 1
+            self.last_error = str(error)
+            if self.circuit == 'closed' and self._failures >= self.failure_threshold:
+                self._open(error)
+                self.failovers += 1
+                print(f"[QueueService] Redis failing ({error}), switched to in-memory queue")
+    
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_check_interval)
+            if self._client is None:
+                return
+            if self.circuit == 'open' and time.monotonic() - self._opened_at < self.retry_seconds:
+                continue
+            
+            try:
+                self._client.ping()
+            except Exception as e:
+                with self._lock:
+                    if self.circuit == 'closed':
+                        self.failovers += 1
+                        print(f"[QueueService] Redis health check failed ({e}), switched to in-memory queue")
+                    self._open(e)
+                continue
+            
+            with self._lock:
+                if self.circuit == 'open':
+                    self.circuit = 'closed'
+                    self._failures = 0
+                    self.recoveries += 1
+                    print("[QueueService] Redis is back, switched to Redis backend")
+    
+    def stats(self) -> Dict:
+        return {
+            "host": f"{self.host}:{self.port}",
+            "circuit": self.circuit,
+            "initialized": self._started,
+            "consecutive_failures": self._failures,
+            "failovers": self.failovers,
+            "recoveries": self.recoveries,
+            "last_error": self.last_error
+        }
+
 
 class QueueService:
     """
     队列服务 - 支持 Redis 和内存队列两种模式
-    在没有 Redis 的情况下自动使用内存队列（适用于开发/MVP）
+    在没有 Redis 的情况下自动使用内存队列（适用于开发/MVP）；
+    运行中 Redis 故障时熔断切到内存，恢复后自动切回（见 RedisConnection）
+    
+    快照模式（QUEUE_SNAPSHOTS=true）：push_cards 同时写入序列化后的卡片
+    （Redis: `card:{id}` 带 TTL，在 Lua 脚本之外读写；内存: 按引用计数回收），
+    pop 时 ID 和卡片内容一起返回，出队无需再查数据库。
     """
     
+    SNAPSHOT_KEY_PREFIX = 'card:'
+    
     def __init__(self):
-        self.redis_client = None
-        self.use_memory = True
-        self._memory_queues: dict[str, list] = defaultdict(list)
-        
-        # 尝试连接 Redis
-        try:
-            import redis
-            client = redis.Redis(
-                host=os.getenv('REDIS_HOST', 'localhost'),
-                port=int(os.getenv('REDIS_PORT', 6379)),
-                password=os.getenv('REDIS_PASSWORD', None),
-                decode_responses=True
-            )
-            # 测试连接
-            client.ping()
-            self.redis_client = client
-            self.use_memory = False
-            print("[QueueService] Using Redis backend")
-        except Exception as e:
-            print(f"[QueueService] Redis not available ({e}), using in-memory queue")
+        self.snapshots_enabled = os.getenv('QUEUE_SNAPSHOTS', 'false').lower() == 'true'
+        self.snapshot_ttl = int(os.getenv('QUEUE_SNAPSHOT_TTL', 24 * 3600))
+        self.members_ttl = int(os.getenv('QUEUE_MEMBERS_TTL', 24 * 3600))
+        # 旧版键名（queue:user:<id>，不带哈希标签）按用户在首次访问时迁移，切换完成后可关闭
+        self.migrate_legacy_keys = os.getenv('QUEUE_MIGRATE_LEGACY_KEYS', 'true').lower() == 'true'
+        self._legacy_checked: set = set()
+        self._legacy_lock = threading.Lock()
+        
+        self._memory_snapshots: Dict[str, list] = {}  # card_id -> [bytes, 引用数]
+        self._snapshot_lock = threading.Lock()
+        self._memory_queues = MemoryQueueStore(
+            max_users=int(os.getenv('QUEUE_MEMORY_MAX_USERS', 10000)),
+            max_entries=int(os.getenv('QUEUE_MEMORY_MAX_ENTRIES', 500000)),
+            idle_ttl=int(os.getenv('QUEUE_MEMORY_IDLE_TTL', 3600)),
+            on_evict=self._release_snapshots,
+            members_ttl=self.members_ttl
+        )
+        
+        # Redis 连接在首次使用时建立，不可用时自动使用内存队列并在恢复后切回
+        self._connection = RedisConnection(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', 6379)),
+            password=os.getenv('REDIS_PASSWORD', None),
+            max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 50)),
+            socket_timeout=float(os.getenv('REDIS_SOCKET_TIMEOUT', 0.5)),
+            connect_timeout=float(os.getenv('REDIS_CONNECT_TIMEOUT', 0.5)),
+            failure_threshold=int(os.getenv('REDIS_FAILURE_THRESHOLD', 3)),
+            retry_seconds=float(os.getenv('REDIS_RETRY_SECONDS', 10)),
+            health_check_interval=float(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', 5)),
+            on_connect=self._register_scripts
+        )
+    
+    def _register_scripts(self, client):
+        self._pop_and_inspect = client.register_script(POP_AND_INSPECT_SCRIPT)
+        self._push_unique = client.register_script(PUSH_UNIQUE_SCRIPT)
+    
+    @property
+    def redis_client(self):
+        """当前可用的 Redis 客户端；熔断或未配置时为 None"""
+        return self._connection.client()
+    
+    @property
+    def use_memory(self) -> bool:
+        return self.redis_client is None
+    
+    def with_redis(self, redis_op: Callable, memory_op: Callable):
+        """
+        Redis 可用时执行 redis_op(client)，否则执行 memory_op()
+        
+        连接类错误计入熔断器并回退到 memory_op()，供其他基于 Redis 的服务（已看集合、卡片缓存）复用。
+        """
+        client = self._connection.client()
+        if client is not None:
+            try:
+                result = redis_op(client)
+                self._connection.record_success()
+                return result
+            except self._connection.errors as e:
+                self._connection.record_failure(e)
+        return memory_op()
     
     def get_queue_key(self, user_id: str) -> str:
-        return f"queue:user:{user_id}"
+        return f"queue:user:{{{user_id}}}"
+    
+    def get_members_key(self, user_id: str) -> str:
+        return f"queue:members:{{{user_id}}}"
+    
+    def get_snapshot_key(self, card_id: str) -> str:
+        return f"{self.SNAPSHOT_KEY_PREFIX}{card_id}"
+    
+    def _migrate_legacy_keys(self, client, user_id: str):
+        """
+        把旧版键（queue:user:<id> / queue:members:<id>）里的队列和成员并入带哈希标签的新键
+        
+        每个进程对每个用户只检查一次（一次管道往返）；旧队列接在新队列之后，
+        重复的卡片按成员集合跳过。多个进程同时迁移时结果相同（入队去重、删除幂等）。
+        """
+        if not self.migrate_legacy_keys or user_id in self._legacy_checked:
+            return
+        legacy_queue, legacy_members = f"queue:user:{user_id}", f"queue:members:{user_id}"
+        pipe = client.pipeline(transaction=False)
+        pipe.lrange(legacy_queue, 0, -1)
+        pipe.smembers(legacy_members)
+        queued, members = pipe.execute()
+        if queued or members:
+            # 新旧键不在同一个槽，分开执行（不用事务）
+            pipe = client.pipeline(transaction=False)
+            if queued:
+                self._push_unique(
+                    keys=[self.get_queue_key(user_id), self.get_members_key(user_id)],
+                    args=[self.members_ttl, *queued], client=pipe
+                )
+            if members:
+                pipe.sadd(self.get_members_key(user_id), *members)
+                pipe.expire(self.get_members_key(user_id), self.members_ttl)
+            pipe.delete(legacy_queue, legacy_members)
+            pipe.execute()
+            print(f"[QueueService] Migrated legacy queue keys for {user_id}: {len(queued)} queued")
+        with self._legacy_lock:
+            # 记录只用于省掉重复检查，超出上限时清空重来
+            if len(self._legacy_checked) >= self._memory_queues.max_users:
+                self._legacy_checked.clear()
+            self._legacy_checked.add(user_id)
+    
+    def _for_user(self, user_id: str, redis_op: Callable) -> Callable:
+        """按用户的 Redis 操作：先迁移该用户的旧版键"""
+        def run(client):
+            self._migrate_legacy_keys(client, user_id)
+            return redis_op(client)
+        return run
     
     def get_queue_length(self, user_id: str) -> int:
         """获取队列长度"""
-        if self.use_memory:
-            return len(self._memory_queues[user_id])
-        key = self.get_queue_key(user_id)
-        return self.redis_client.llen(key)
+        return self.with_redis(
+            self._for_user(user_id, lambda client: client.llen(self.get_queue_key(user_id))),
+            lambda: self._memory_queues.length(user_id)
+        )
     
-    def push_cards(self, user_id: str, card_ids: List[str]):
-        """批量推送卡片 ID 到用户队列"""
+    def push_cards(self, user_id: str, card_ids: List[str],
+                   snapshots: Dict[str, bytes] = None) -> List[str]:
+        """
+        批量推送卡片 ID 到用户队列，跳过已在成员集合中的卡片（原子操作）
+        
+        成员集合记录入过队的卡片（出队后仍保留，直到过期/被淘汰），
+        避免补货把已在队列里、或已出队但还没产生交互的卡片再推一次。
+        
+        Args:
+            snapshots: card_id -> 序列化后的卡片（仅快照模式下写入）
+        
+        Returns:
+            实际入队的卡片 ID
+        """
+        if not card_ids:
+            return []
+        if not self.snapshots_enabled:
+            snapshots = None
+        
+        def push_redis(client):
+            # 快照先于入队写入（同一管道），出队时不会读到还没有快照的 ID；
+            # 未入队（重复）的卡片多写的快照按 TTL 过期
+            pipe = client.pipeline(transaction=False)
+            for card_id, snapshot in (snapshots or {}).items():
+                pipe.set(self.get_snapshot_key(card_id), snapshot, ex=self.snapshot_ttl)
+            self._push_unique(
+                keys=[self.get_queue_key(user_id), self.get_members_key(user_id)],
+                args=[self.members_ttl, *card_ids], client=pipe
+            )
+            return pipe.execute()[-1]
+        
+        def push_memory():
+            if snapshots:
+                # 先登记快照再入队，避免入队时触发的淘汰先释放了引用
+                with self._snapshot_lock:
+                    for card_id in card_ids:
+                        if card_id in snapshots:
+                            entry = self._memory_snapshots.setdefault(card_id, [snapshots[card_id], 0])
+                            entry[1] += 1
+            accepted = self._memory_queues.push(user_id, card_ids)
+            if snapshots and len(accepted) < len(card_ids):
+                rejected = Counter(card_id for card_id in card_ids if card_id in snapshots)
+                rejected.subtract(accepted)
+                self._release_snapshots(rejected.elements())
+            return accepted
+        
+        return self.with_redis(self._for_user(user_id, push_redis), push_memory)
+    
+    def return_cards(self, user_id: str, card_ids: List[str]):
+        """
+        把已出队但没有展示的卡片放回队首（前端预取后页面关闭时调用）
+        
+        这些卡片仍在成员集合中，不放回的话补货会一直跳过它们，直到成员集合过期。
+        """
         if not card_ids:
             return
-        if self.use_memory:
-            self._memory_queues[user_id].extend(card_ids)
-        else:
-            key = self.get_queue_key(user_id)
-            self.redis_client.rpush(key, *card_ids)
+        
+        def return_redis(client):
+            pipe = client.pipeline()
+            pipe.lpush(self.get_queue_key(user_id), *reversed(card_ids))
+            pipe.sadd(self.get_members_key(user_id), *card_ids)
+            pipe.expire(self.get_members_key(user_id), self.members_ttl)
+            pipe.execute()
+        
+        self.with_redis(self._for_user(user_id, return_redis), lambda: self._memory_queues.push_front(user_id, card_ids))
+    
+    def get_members(self, user_id: str) -> set:
+        """用户队列的成员集合（排队中 + 已出队未过期的卡片 ID），推荐时用于排除"""
+        return self.with_redis(
+            self._for_user(user_id, lambda client: client.smembers(self.get_members_key(user_id))),
+            lambda: self._memory_queues.members(user_id)
+        )
+    
+    def _release_snapshot(self, card_id: Optional[str]) -> Optional[bytes]:
+        """内存模式：出队时取回快照并减少引用，引用归零即回收"""
+        if not card_id or not self._memory_snapshots:
+            return None
+        with self._snapshot_lock:
+            entry = self._memory_snapshots.get(card_id)
+            if entry is None:
+                return None
+            entry[1] -= 1
+            if entry[1] <= 0:
+                self._memory_snapshots.pop(card_id, None)
+            return entry[0]
+    
+    def _release_snapshots(self, card_ids: Iterable[str]):
+        for card_id in card_ids:
+            self._release_snapshot(card_id)
+    
+    @staticmethod
+    def _as_bytes(snapshot) -> Optional[bytes]:
+        if isinstance(snapshot, str):
+            return snapshot.encode('utf-8')
+        return snapshot
+    
+    def pop_and_inspect(self, user_id: str, count: int = 1, min_length: int = 0) -> QueuePop:
+        """
+        原子地从队列头部取出最多 count 张卡片（快照模式下连同快照），
+        并返回剩余长度和是否低于 min_length
+        
+        Redis 模式下出队是一次 Lua 脚本调用（一次往返），不会与并发请求交错，
+        快照模式下再用一次管道读取快照；内存模式在队列锁内完成。
+        """
+        count = max(0, count)
+        
+        def pop_redis(client):
+            result = self._pop_and_inspect(
+                keys=[self.get_queue_key(user_id)], args=[count, min_length], client=client
+            )
+            card_ids = result[2:]
+            snapshots = [None] * len(card_ids)
+            if self.snapshots_enabled and card_ids:
+                # 快照键分布在不同的槽，用管道逐个 GET（不用跨槽的 MGET）
+                pipe = client.pipeline(transaction=False)
+                for card_id in card_ids:
+                    pipe.get(self.get_snapshot_key(card_id))
+                snapshots = pipe.execute()
+            items = [
+                (card_id, self._as_bytes(snapshot) if snapshot else None)
+                for card_id, snapshot in zip(card_ids, snapshots)
+            ]
+            return QueuePop(items, int(result[0]), bool(result[1]))
+        
+        def pop_memory():
+            cards, remaining = self._memory_queues.pop(user_id, count) if count else (
+                [], self._memory_queues.length(user_id))
+            items = [(card_id, self._release_snapshot(card_id)) for card_id in cards]
+            return QueuePop(items, remaining, remaining < min_length)
+        
+        return self.with_redis(self._for_user(user_id, pop_redis), pop_memory)
     
     def pop_card(self, user_id: str) -> Optional[str]:
         """从队列头部取出一张卡片"""
-        if self.use_memory:
-            queue = self._memory_queues[user_id]
-            return queue.pop(0) if queue else None
-        key = self.get_queue_key(user_id)
-        return self.redis_client.lpop(key)
+        return self.pop_card_with_snapshot(user_id)[0]
+    
+    def pop_card_with_snapshot(self, user_id: str) -> Tuple[Optional[str], Optional[bytes]]:
+        """从队列头部取出一张卡片，连同其快照（没有快照时为 None）"""
+        items = self.pop_and_inspect(user_id, 1).items
+        return items[0] if items else (None, None)
+    
+    def pop_cards(self, user_id: str, count: int) -> List[str]:
+        """从队列头部一次取出最多 count 张卡片"""
+        return [card_id for card_id, _ in self.pop_cards_with_snapshots(user_id, count)]
+    
+    def pop_cards_with_snapshots(self, user_id: str, count: int) -> List[Tuple[str, Optional[bytes]]]:
+        """从队列头部一次取出最多 count 张卡片，连同各自的快照"""
+        if count <= 0:
+            return []
+        return self.pop_and_inspect(user_id, count).items
     
     def peek_queue(self, user_id: str, count: int = 10) -> List[str]:
         """查看队列前 N 张卡片（不移除）"""
-        if self.use_memory:
-            return self._memory_queues[user_id][:count]
-        key = self.get_queue_key(user_id)
-        return self.redis_client.lrange(key, 0, count - 1)
+        return self.with_redis(
+            self._for_user(user_id, lambda client: client.lrange(self.get_queue_key(user_id), 0, count - 1)),
+            lambda: self._memory_queues.peek(user_id, count)
+        )
+    
+    def stats(self) -> Dict:
+        """队列后端状态：当前后端、Redis 熔断/故障切换状态、内存队列用量"""
+        return {
+            "backend": "memory" if self.use_memory else "redis",
+            "redis": self._connection.stats(),
+            "memory": dict(self._memory_queues.stats(), snapshots=len(self._memory_snapshots))
+        }
     
     def clear_queue(self, user_id: str):
-        """清空用户队列"""
-        if self.use_memory:
-            self._memory_queues[user_id] = []
-        else:
-            key = self.get_queue_key(user_id)
-            self.redis_client.delete(key)
+        """清空用户队列（连同成员集合）"""
+        self.with_redis(
+            self._for_user(user_id, lambda client: client.delete(
+                self.get_queue_key(user_id), self.get_members_key(user_id))),
+            lambda: self._release_snapshots(self._memory_queues.clear(user_id))
+        )
+
+
+# 全局单例
+queue_service = QueueService()
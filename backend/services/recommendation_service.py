@@ -2,21 +2,35 @@
 RecommendationService - 推荐服务
 
 基于用户行为数据实现个性化推荐，包括：
-1. 用户兴趣分析 - 基于 LIKE/SKIP 计算标签权重
-2. 斯金纳箱混合 - 60% 兴趣 / 30% 通识 / 10% 惊喜
+1. 用户兴趣分析 - 基于 LIKE/SKIP 计算标签权重（持久化画像，按交互增量更新）
+2. 斯金纳箱混合 - 60% 兴趣 / 30% 通识 / 10% 惊喜（numpy 可用时各桶按向量化打分取 top-k，
+   通识/惊喜候选池在 CardIndex 中预计算，冷启动用户直接从池中抽样）
 3. 短期记忆 - 避免连续推送相似内容
 4. 秒滑检测 - 识别不感兴趣的话题
+
+同一请求内对兴趣、已看集合、会话上下文的重复计算通过短 TTL 缓存合并，
+缓存以用户最新交互 ID 作为版本号，新的 /record 之后自动失效。
 """
 
-from typing import List, Dict, Optional, Tuple
-from collections import defaultdict
+from typing import Any, Callable, Iterable, List, Dict, Optional, Tuple
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 import random
+import threading
+import time
 import uuid
 
-from models import db
+from flask import g, has_request_context
+from sqlalchemy import func
+
+from models import db, insert_if_absent
 from models.card import Card
 from models.interaction import Interaction
+from models.user_profile import UserProfile
+from models.interaction_rollup import InteractionRollup
+from services.card_index import card_index
+from services.seen_service import seen_set_service
+from services.scoring_engine import scoring_engine
 
 
 class RecommendationService:
@@ -30,6 +44,10 @@ class RecommendationService:
     # 秒滑阈值（毫秒）
     QUICK_SKIP_THRESHOLD = 2000  # 停留少于 2 秒视为秒滑
     
+    # 兴趣权重
+    LIKE_WEIGHT = 2.0
+    QUICK_SKIP_WEIGHT = -1.0
+    
     # 短期记忆窗口
     SESSION_WINDOW_MINUTES = 30
     
@@ -39,8 +57,68 @@ class RecommendationService:
     # 惊喜/整活标签
     SURPRISE_TAGS = ['Memes', 'Dark_Humor', 'Controversy', 'Mind_Blown', 'Random']
     
+    # 分析结果缓存
+    MEMO_TTL_SECONDS = 5
+    MEMO_MAX_ENTRIES = 10000
+    
+    # 预计算候选池名称
+    GENERAL_POOL = 'general'
+    SURPRISE_POOL = 'surprise'
+    
     def __init__(self):
-        pass
+        self._memo: OrderedDict = OrderedDict()
+        self._memo_lock = threading.Lock()
+        
+        card_index.register_pool(self.GENERAL_POOL, self.GENERAL_TAGS)
+        card_index.register_pool(self.SURPRISE_POOL, self.SURPRISE_TAGS)
+    
+    def _user_version(self, user_id: str) -> Optional[uuid.UUID]:
+        """
+        用户数据版本号 = 最新一次交互的 ID（取自兴趣画像）
+        
+        请求上下文内只查询一次；后台线程中每次都重新查询。
+        """
+        if has_request_context():
+            versions = g.setdefault('_recommendation_versions', {})
+            if user_id not in versions:
+                versions[user_id] = db.session.query(UserProfile.last_interaction_id).filter(
+                    UserProfile.user_id == uuid.UUID(user_id)
+                ).scalar()
+            return versions[user_id]
+        
+        return db.session.query(UserProfile.last_interaction_id).filter(
+            UserProfile.user_id == uuid.UUID(user_id)
+        ).scalar()
+    
+    def _memoized(self, user_id: str, name: str, compute: Callable[[], Any]) -> Any:
+        """
+        按 (用户, 名称) 缓存计算结果，版本号变化或超过 TTL 时重新计算
+        
+        返回值在缓存中共享，调用方不应原地修改。
+        """
+        try:
+            version = self._user_version(user_id)
+        except ValueError:
+            return compute()
+        
+        key = (user_id, name)
+        now = time.monotonic()
+        
+        with self._memo_lock:
+            entry = self._memo.get(key)
+            if entry and entry[0] == version and now - entry[1] < self.MEMO_TTL_SECONDS:
+                self._memo.move_to_end(key)
+                return entry[2]
+        
+        value = compute()
+        
+        with self._memo_lock:
+            self._memo[key] = (version, now, value)
+            self._memo.move_to_end(key)
+            while len(self._memo) > self.MEMO_MAX_ENTRIES:
+                self._memo.popitem(last=False)
+        
+        return value
     
     def analyze_user_interests(self, user_id: str) -> Dict[str, float]:
         """
@@ -51,59 +129,178 @@ class RecommendationService:
         - SKIP (停留 > 2s): 标签权重 +0 (中性)
         - SKIP (停留 < 2s，秒滑): 标签权重 -1
         
+        权重由 /api/interaction/record 增量写入 UserProfile，这里只读取一行；
+        画像不存在时（历史数据）从归档汇总 + interactions 表在内存中计算（读路径不写库）。
+        
         Returns:
             {tag: weight} 标签权重字典，已归一化
         """
+        return self._memoized(user_id, 'interests', lambda: self._compute_user_interests(user_id))
+    
+    def _compute_user_interests(self, user_id: str) -> Dict[str, float]:
         try:
             user_uuid = uuid.UUID(user_id)
         except ValueError:
             return {}
         
-        # 获取所有交互记录
-        interactions = Interaction.query.filter_by(user_id=user_uuid).all()
+        profile = db.session.get(UserProfile, user_uuid)
+        if profile is None:
+            # 读路径不写库：只在内存中从历史计算，画像在该用户下一次交互时建立
+            computed = next(self._iter_profile_weights(user_id), None)
+            if computed is None:
+                return {}
+            profile = UserProfile(user_id=user_uuid)
+            profile.set_weights(computed[1])
+        
+        return profile.normalized()
+    
+    def weight_delta(self, action: str, duration: Optional[int]) -> float:
+        """单次交互对其卡片标签的权重影响"""
+        if action == 'LIKE':
+            return self.LIKE_WEIGHT
+        if action == 'SKIP' and (duration or 0) < self.QUICK_SKIP_THRESHOLD:
+            # 秒滑 = 不感兴趣
+            return self.QUICK_SKIP_WEIGHT
+        # 正常跳过、读完、展开不影响权重
+        return 0.0
+    
+    def update_user_profile(self, interaction: Interaction, tags: List[str]):
+        """
+        将一次新交互增量计入用户画像，O(标签数)
+        
+        由记录交互的请求在同一事务中调用（调用方负责 commit），
+        interaction 需已 flush 以获得 id。
+        """
+        self.apply_interactions(
+            interaction.user_id,
+            [(interaction.id, interaction.action, interaction.duration, tags)]
+        )
+    
+    @staticmethod
+    def _lock_profile(user_id) -> Optional[UserProfile]:
+        return UserProfile.query.filter_by(user_id=user_id).with_for_update().first()
+    
+    def apply_interactions(self, user_id, interactions: List[Tuple]):
+        """
+        将同一用户的一批新交互按顺序计入画像（一次加锁读取画像）
         
+        Args:
+            user_id: 用户ID（UUID）
+            interactions: [(interaction_id, action, duration, tags), ...]，需已写入当前事务
+        """
         if not interactions:
-            return {}
+            return
+        
+        profile = self._lock_profile(user_id)
+        if profile is None:
+            if insert_if_absent(UserProfile, user_id=user_id, tag_weights={}, interaction_count=0):
+                # 本事务建立画像：从历史（已包含本批交互）重建
+                self.rebuild_user_profiles(str(user_id))
+                return
+            # 并发的首次写入已建立画像（已提交，不含本批交互）：本批照常增量计入
+            profile = self._lock_profile(user_id)
+        
+        for interaction_id, action, duration, tags in interactions:
+            profile.apply(tags or [], self.weight_delta(action, duration))
+            profile.last_interaction_id = interaction_id
+        profile.interaction_count = (profile.interaction_count or 0) + len(interactions)
+    
+    def load_rollup_weights(self, user_id: str = None) -> Dict[uuid.UUID, Tuple[Dict[str, float], int]]:
+        """已归档交互的画像基数：user_id -> (标签权重, 交互数)，来自 interaction_rollups"""
+        query = db.session.query(
+            InteractionRollup.user_id,
+            InteractionRollup.tag,
+            func.sum(InteractionRollup.weight),
+            func.sum(InteractionRollup.total_count)
+        )
+        if user_id:
+            query = query.filter(InteractionRollup.user_id == uuid.UUID(user_id))
+        query = query.group_by(InteractionRollup.user_id, InteractionRollup.tag)
+        
+        base: Dict[uuid.UUID, Tuple[Dict[str, float], int]] = {}
+        for row_user, tag, weight, total in query:
+            weights, count = base.get(row_user, ({}, 0))
+            if tag == InteractionRollup.ALL_TAGS:
+                count = int(total)
+            elif weight is not None:
+                weights[tag] = weight
+            base[row_user] = (weights, count)
+        return base
+    
+    def _iter_profile_weights(self, user_id: str = None, batch_size: int = 1000):
+        """
+        从已归档汇总 + interactions 表计算画像（只读）
         
-        tag_weights = defaultdict(float)
-        tag_counts = defaultdict(int)
+        汇总提供权重基数，热表尾部用单次 interactions ⋈ cards 流式查询按用户分组累加。
         
-        for interaction in interactions:
-            # 获取卡片的标签
-            card = Card.query.get(interaction.card_id)
-            if not card:
-                continue
+        Yields:
+            (user_id, 标签权重, 交互数, 最后一次交互 ID)；只有归档数据时最后一次交互 ID 为 None
+        """
+        base = self.load_rollup_weights(user_id)
+        
+        query = db.session.query(
+            Interaction.user_id,
+            Interaction.id,
+            Interaction.action,
+            Interaction.duration,
+            Card.tags
+        ).join(Card, Card.id == Interaction.card_id)
+        
+        if user_id:
+            query = query.filter(Interaction.user_id == uuid.UUID(user_id))
+        
+        query = query.order_by(Interaction.user_id, Interaction.created_at)
+        
+        current_user = None
+        weights: Dict[str, float] = defaultdict(float)
+        count = 0
+        last_id = None
+        
+        for row_user, interaction_id, action, duration, tags in query.yield_per(batch_size):
+            if row_user != current_user:
+                if current_user is not None:
+                    yield current_user, weights, count, last_id
+                current_user = row_user
+                rolled_weights, count = base.pop(row_user, ({}, 0))
+                weights = defaultdict(float, rolled_weights)
+                last_id = None
             
-            for tag in card.tags:
-                tag_counts[tag] += 1
-                
-                if interaction.action == 'LIKE':
-                    tag_weights[tag] += 2.0
-                elif interaction.action == 'SKIP':
-                    duration = interaction.duration or 0
-                    if duration < self.QUICK_SKIP_THRESHOLD:
-                        # 秒滑 = 不感兴趣
-                        tag_weights[tag] -= 1.0
-                    # 正常跳过不影响权重
-        
-        # 归一化权重
-        if not tag_weights:
-            return {}
-        
-        min_weight = min(tag_weights.values())
-        max_weight = max(tag_weights.values())
-        weight_range = max_weight - min_weight
+            delta = self.weight_delta(action, duration)
+            if delta:
+                for tag in tags or []:
+                    weights[tag] += delta
+            count += 1
+            last_id = interaction_id
+        
+        if current_user is not None:
+            yield current_user, weights, count, last_id
+        
+        # 热表里已经没有交互、只有归档汇总的用户
+        for current_user, (weights, count) in base.items():
+            yield current_user, weights, count, None
+    
+    def rebuild_user_profiles(self, user_id: str = None, batch_size: int = 1000) -> int:
+        """
+        从已归档汇总 + interactions 表重建用户画像（不提交事务）
         
-        if weight_range > 0:
-            normalized = {
-                tag: (weight - min_weight) / weight_range
-                for tag, weight in tag_weights.items()
-            }
-        else:
-            # 所有权重相同
-            normalized = {tag: 0.5 for tag in tag_weights.keys()}
+        Args:
+            user_id: 只重建指定用户；为空时重建全部用户
+            batch_size: 流式读取的批大小
         
-        return normalized
+        Returns:
+            重建的画像数量
+        """
+        rebuilt = 0
+        for row_user, weights, count, last_id in self._iter_profile_weights(user_id, batch_size):
+            profile = db.session.get(UserProfile, row_user) or UserProfile(user_id=row_user)
+            profile.set_weights(weights)
+            profile.interaction_count = count
+            if last_id is not None:
+                # 只有归档数据时保留原来的版本号
+                profile.last_interaction_id = last_id
+            db.session.add(profile)
+            rebuilt += 1
+        return rebuilt
     
     def get_preferred_tags(self, user_id: str, top_n: int = 5) -> List[str]:
         """获取用户最感兴趣的 N 个标签"""
@@ -134,6 +331,9 @@ class RecommendationService:
                 'quick_skipped_tags': [被秒滑的标签]
             }
         """
+        return self._memoized(user_id, 'session', lambda: self._compute_session_context(user_id))
+    
+    def _compute_session_context(self, user_id: str) -> Dict:
         try:
             user_uuid = uuid.UUID(user_id)
         except ValueError:
@@ -142,7 +342,14 @@ class RecommendationService:
         # 最近 30 分钟的交互
         cutoff_time = datetime.utcnow() - timedelta(minutes=self.SESSION_WINDOW_MINUTES)
         
-        recent_interactions = Interaction.query.filter(
+        # 单次 interactions ⋈ cards 查询，只投影需要的列（不读取 payload）
+        recent_rows = db.session.query(
+            Interaction.action,
+            Interaction.duration,
+            Card.id,
+            Card.tags,
+            Card.complexity
+        ).join(Card, Card.id == Interaction.card_id).filter(
             Interaction.user_id == user_uuid,
             Interaction.created_at >= cutoff_time
         ).order_by(Interaction.created_at.desc()).all()
@@ -152,21 +359,16 @@ class RecommendationService:
         quick_skipped_tags = []
         last_complexity = 3  # 默认中等
         
-        for interaction in recent_interactions:
-            card = Card.query.get(interaction.card_id)
-            if not card:
-                continue
-            
-            recent_card_ids.append(str(card.id))
-            recent_tags.extend(card.tags)
+        for action, duration, card_id, tags, complexity in recent_rows:
+            recent_card_ids.append(str(card_id))
+            recent_tags.extend(tags)
             
-            if interaction.action == 'SKIP':
-                duration = interaction.duration or 0
-                if duration < self.QUICK_SKIP_THRESHOLD:
-                    quick_skipped_tags.extend(card.tags)
+            if action == 'SKIP':
+                if (duration or 0) < self.QUICK_SKIP_THRESHOLD:
+                    quick_skipped_tags.extend(tags)
             
-            if not last_complexity and card.complexity:
-                last_complexity = card.complexity
+            if not last_complexity and complexity:
+                last_complexity = complexity
         
         return {
             'recent_tags': list(set(recent_tags)),
@@ -175,7 +377,8 @@ class RecommendationService:
             'quick_skipped_tags': list(set(quick_skipped_tags))
         }
     
-    def get_recommended_cards(self, user_id: str, count: int = 10) -> List[Card]:
+    def get_recommended_cards(self, user_id: str, count: int = 10,
+                              exclude_ids: Iterable = None) -> List[Card]:
         """
         获取推荐卡片列表（核心推荐算法）
         
@@ -187,117 +390,177 @@ class RecommendationService:
         Args:
             user_id: 用户ID
             count: 需要的卡片数量
+            exclude_ids: 额外排除的卡片 ID（如 QueueService.get_members 返回的已入队卡片）
         
         Returns:
             推荐的卡片列表
         """
+        excluded = {
+            card_id if isinstance(card_id, uuid.UUID) else uuid.UUID(card_id)
+            for card_id in exclude_ids or []
+        }
+        
         try:
-            user_uuid = uuid.UUID(user_id)
+            uuid.UUID(user_id)
         except ValueError:
             # 无效用户ID，返回随机卡片
-            return self._get_random_cards(count, [])
+            return self._get_random_cards(count, excluded)
         
-        # 1. 获取用户已看过的卡片
-        viewed_card_ids = db.session.query(Interaction.card_id).filter(
-            Interaction.user_id == user_uuid
-        ).all()
-        viewed_ids = [cid[0] for cid in viewed_card_ids]
-        
-        # 2. 获取用户兴趣和会话上下文
+        # 1. 获取用户兴趣和会话上下文
         preferred_tags = self.get_preferred_tags(user_id)
         session_context = self.get_session_context(user_id)
         disliked_tags = session_context.get('quick_skipped_tags', [])
         
-        # 3. 计算各类卡片数量
+        # 2. 计算各类卡片数量
         interest_count = int(count * self.INTEREST_RATIO)
         general_count = int(count * self.GENERAL_RATIO)
         surprise_count = count - interest_count - general_count
         
+        # 有兴趣画像时做全量打分；冷启动用户打分没有区分度，直接从候选池抽样
+        if preferred_tags and scoring_engine.is_available():
+            return self._rank_recommended_cards(
+                user_id, count, preferred_tags, session_context,
+                interest_count, general_count, surprise_count, excluded
+            )
+        
         recommended = []
         
-        # 4. 获取兴趣卡片
+        # 3. 获取兴趣卡片
         if preferred_tags:
             interest_cards = self._get_cards_by_tags(
                 preferred_tags, 
                 interest_count, 
-                exclude_ids=viewed_ids,
+                exclude_ids=excluded,
+                user_id=user_id,
                 exclude_tags=disliked_tags
             )
             recommended.extend(interest_cards)
         
-        # 5. 获取通识卡片
-        general_cards = self._get_cards_by_tags(
-            self.GENERAL_TAGS,
+        # 4. 获取通识卡片（预计算候选池）
+        general_cards = self._sample_pool_cards(
+            self.GENERAL_POOL,
             general_count,
-            exclude_ids=viewed_ids + [c.id for c in recommended],
+            user_id,
+            exclude_ids=excluded | {c.id for c in recommended},
             exclude_tags=disliked_tags
         )
         recommended.extend(general_cards)
         
-        # 6. 获取惊喜卡片
-        surprise_cards = self._get_cards_by_tags(
-            self.SURPRISE_TAGS,
+        # 5. 获取惊喜卡片（预计算候选池）
+        surprise_cards = self._sample_pool_cards(
+            self.SURPRISE_POOL,
             surprise_count,
-            exclude_ids=viewed_ids + [c.id for c in recommended],
+            user_id,
+            exclude_ids=excluded | {c.id for c in recommended},
             exclude_tags=[]  # 惊喜卡片不排除
         )
         recommended.extend(surprise_cards)
         
-        # 7. 如果不够数量，用随机卡片补充
+        # 6. 如果不够数量，用随机卡片补充
         if len(recommended) < count:
             remaining = count - len(recommended)
             random_cards = self._get_random_cards(
                 remaining,
-                exclude_ids=viewed_ids + [c.id for c in recommended]
+                exclude_ids=excluded | {c.id for c in recommended},
+                user_id=user_id
             )
             recommended.extend(random_cards)
         
-        # 8. 打乱顺序（斯金纳箱的随机性）
+        # 7. 打乱顺序（斯金纳箱的随机性）
         random.shuffle(recommended)
         
         return recommended
     
-    def _get_cards_by_tags(self, tags: List[str], count: int, 
-                           exclude_ids: List = None,
-                           exclude_tags: List[str] = None) -> List[Card]:
-        """根据标签获取卡片"""
-        if not tags:
+    def _rank_recommended_cards(self, user_id: str, count: int,
+                                preferred_tags: List[str], session_context: Dict,
+                                interest_count: int, general_count: int,
+                                surprise_count: int, exclude_ids: Iterable = None) -> List[Card]:
+        """向量化版本：一次给所有未看卡片打分，各桶按得分取 top-k"""
+        disliked_tags = session_context.get('quick_skipped_tags', [])
+        
+        ranking = scoring_engine.rank(
+            user_id,
+            self.analyze_user_interests(user_id),
+            recent_tags=session_context.get('recent_tags', []),
+            quick_skipped_tags=disliked_tags
+        )
+        if ranking is None:
             return []
+        ranking.exclude(exclude_ids)
         
-        exclude_ids = exclude_ids or []
-        exclude_tags = exclude_tags or []
+        card_ids = []
+        if preferred_tags:
+            card_ids += ranking.top_k(interest_count, tags=preferred_tags, exclude_tags=disliked_tags)
+        card_ids += ranking.top_k(general_count, tags=self.GENERAL_TAGS, exclude_tags=disliked_tags)
+        card_ids += ranking.top_k(surprise_count, tags=self.SURPRISE_TAGS)  # 惊喜卡片不排除
         
-        # SQLite 的 JSON 查询比较受限，使用 Python 过滤
-        all_cards = Card.query.all()
+        # 不够数量时用剩余卡片中得分最高的补充
+        if len(card_ids) < count:
+            card_ids += ranking.top_k(count - len(card_ids))
         
-        matching_cards = []
-        for card in all_cards:
-            if card.id in exclude_ids:
-                continue
-            
-            # 检查是否包含排除标签
-            if any(tag in card.tags for tag in exclude_tags):
-                continue
-            
-            # 检查是否包含目标标签
-            if any(tag in card.tags for tag in tags):
-                matching_cards.append(card)
+        recommended = self._load_cards(card_ids)
+        random.shuffle(recommended)
+        return recommended
+    
+    def _get_cards_by_tags(self, tags: List[str], count: int, 
+                           exclude_ids: Iterable = None,
+                           exclude_tags: List[str] = None,
+                           user_id: str = None) -> List[Card]:
+        """根据标签获取卡片（传入 user_id 时排除该用户看过的卡片）"""
+        if not tags:
+            return []
+        
+        # 在标签倒排索引上做集合运算，避免全表加载
+        candidate_ids = card_index.query(
+            tags,
+            exclude_tags=exclude_tags,
+            exclude_ids=set(exclude_ids or [])
+        )
+        if user_id:
+            candidate_ids = seen_set_service.filter_unseen(user_id, candidate_ids)
         
-        # 随机选择
-        random.shuffle(matching_cards)
-        return matching_cards[:count]
+        return self._sample_cards(candidate_ids, count)
+    
+    def _sample_pool_cards(self, pool: str, count: int, user_id: str,
+                           exclude_ids: Iterable = None,
+                           exclude_tags: List[str] = None) -> List[Card]:
+        """从预计算候选池中抽取该用户没看过的卡片"""
+        card_ids = card_index.sample_pool(
+            pool,
+            count,
+            exclude_ids=exclude_ids,
+            exclude_tags=exclude_tags,
+            accept=lambda ids: seen_set_service.filter_unseen(user_id, ids)
+        )
+        return self._load_cards(card_ids)
     
-    def _get_random_cards(self, count: int, exclude_ids: List = None) -> List[Card]:
+    def _get_random_cards(self, count: int, exclude_ids: Iterable = None,
+                          user_id: str = None) -> List[Card]:
         """获取随机卡片"""
-        exclude_ids = exclude_ids or []
+        accept = None
+        if user_id:
+            accept = lambda ids: seen_set_service.filter_unseen(user_id, ids)
         
-        query = Card.query
-        if exclude_ids:
-            query = query.filter(Card.id.notin_(exclude_ids))
+        card_ids = card_index.sample(count, exclude_ids=exclude_ids, accept=accept)
+        return self._load_cards(card_ids)
+    
+    def _sample_cards(self, candidate_ids: Iterable, count: int) -> List[Card]:
+        """从候选 ID 中随机抽取 count 张，并用一次 IN 查询加载"""
+        candidate_ids = list(candidate_ids)
+        if not candidate_ids or count <= 0:
+            return []
         
-        cards = query.order_by(db.func.random()).limit(count).all()
+        chosen_ids = random.sample(candidate_ids, min(count, len(candidate_ids)))
+        cards = self._load_cards(chosen_ids)
+        random.shuffle(cards)
         return cards
     
+    def _load_cards(self, card_ids: List) -> List[Card]:
+        """一次 IN 查询加载卡片"""
+        if not card_ids:
+            return []
+        return Card.query.filter(Card.id.in_(card_ids)).all()
+    
     def get_user_preferences(self, user_id: str) -> Dict:
         """
         获取用户偏好摘要（用于传递给 ContentFactory）
@@ -0,0 +1,191 @@
+"""
+ReplenishWorker - 后台队列补货
+
+队列低于 MIN_QUEUE_LENGTH 时，/next 和 /batch 把该用户提交给后台线程池补货，
+推荐管线不再在用户请求里同步执行：
+1. 同一用户同一时刻最多一个补货任务（进程内按 user_id 去重；
+   Redis 模式下另加 `replenish:lock:{id}` 锁，避免多个 worker 进程重复补货；
+   锁的值是本次任务的随机令牌，只有持有者能释放，超时后被别人拿走的锁不会被误删）
+2. 队列被取空时请求先等待进行中的补货任务（最多 WAIT_TIMEOUT_SECONDS），等不到再同步补货
+
+补货函数由调用方传入（routes/feed.py 的 replenish_queue），任务在独立的应用上下文中运行。
+"""
+
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, Optional
+
+from config import Config
+from services.queue_service import queue_service
+
+# 比较令牌后删除：锁已过期并被其他进程重新获取时不删除
+# KEYS[1] = 锁键；ARGV[1] = 获取锁时写入的令牌
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class ReplenishWorker:
+    """后台补货线程池 - 按用户去重"""
+
+    # Redis 锁过期时间（秒），防止进程崩溃后锁不释放
+    LOCK_TTL_SECONDS = 30
+    # 队列取空时等待进行中补货的最长时间（秒）
+    WAIT_TIMEOUT_SECONDS = 2.0
+
+    def __init__(self, max_workers: int = None, enabled: bool = None):
+        self.max_workers = max_workers if max_workers is not None else Config.REPLENISH_WORKERS
+        self.enabled = enabled if enabled is not None else Config.REPLENISH_ASYNC
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[str, Optional[Future]] = {}
+        self._lock = threading.Lock()
+        self._release_script = None
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+
+    def get_lock_key(self, user_id: str) -> str:
+        return f"replenish:lock:{user_id}"
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='replenish'
+            )
+        return self._executor
+
+    def _acquire_redis_lock(self, user_id: str) -> Optional[str]:
+        """
+        获取跨进程补货锁（经 queue_service.with_redis，连接错误计入熔断器）
+
+        Returns:
+            本次持有的令牌；Redis 不可用时为空串（不加锁）；锁被其他进程持有时为 None
+        """
+        token = uuid.uuid4().hex
+
+        def acquire(client):
+            acquired = client.set(
+                self.get_lock_key(user_id), token, nx=True, px=int(self.LOCK_TTL_SECONDS * 1000)
+            )
+            return token if acquired else None
+
+        return queue_service.with_redis(acquire, lambda: '')
+
+    def _release_redis_lock(self, user_id: str, token: str):
+        """只在锁仍属于本次任务（令牌一致）时删除；Redis 不可用时等锁自行过期"""
+        if not token:
+            return
+
+        def release(client):
+            if self._release_script is None:
+                self._release_script = client.register_script(RELEASE_LOCK_SCRIPT)
+            return self._release_script(keys=[self.get_lock_key(user_id)], args=[token], client=client)
+
+        queue_service.with_redis(release, lambda: None)
+
+    def schedule(self, user_id: str, refill: Callable[[str], int], app) -> bool:
+        """
+        提交后台补货任务（同一用户已有任务在跑时直接返回）
+
+        进程内先在 self._lock 下占位，Redis 锁在 self._lock 之外获取，
+        Redis 变慢时不会阻塞其他用户的 schedule / wait。
+
+        Args:
+            user_id: 用户ID
+            refill: 补货函数，参数为 user_id，返回补货数量
+            app: Flask 应用对象（任务在其应用上下文中运行）
+
+        Returns:
+            是否提交了新任务
+        """
+        if not self.enabled:
+            return False
+
+        with self._lock:
+            if user_id in self._inflight:
+                self.deduplicated += 1
+                return False
+            # 占位：获取 Redis 锁期间同一用户的其他请求直接去重
+            self._inflight[user_id] = None
+
+        try:
+            token = self._acquire_redis_lock(user_id)
+        except Exception as e:
+            print(f"[ReplenishWorker] Lock error for {user_id}: {e}")
+            with self._lock:
+                del self._inflight[user_id]
+            return False
+        if token is None:
+            with self._lock:
+                del self._inflight[user_id]
+                self.deduplicated += 1
+            return False
+
+        with self._lock:
+            future = self._get_executor().submit(self._run, user_id, refill, app)
+            self._inflight[user_id] = future
+            self.scheduled += 1
+
+        future.add_done_callback(lambda _: self._finish(user_id, future, token))
+        return True
+
+    def _run(self, user_id: str, refill: Callable[[str], int], app) -> int:
+        with app.app_context():
+            try:
+                return refill(user_id)
+            except Exception as e:
+                print(f"[ReplenishWorker] Refill failed for {user_id}: {e}")
+                raise
+
+    def _finish(self, user_id: str, future: Future, token: str):
+        with self._lock:
+            if self._inflight.get(user_id) is future:
+                del self._inflight[user_id]
+            if future.exception() is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        try:
+            self._release_redis_lock(user_id, token)
+        except Exception as e:
+            print(f"[ReplenishWorker] Unlock error for {user_id}: {e}")
+
+    def wait(self, user_id: str, timeout: float = None) -> bool:
+        """
+        等待该用户进行中的补货任务
+
+        Returns:
+            有任务且在超时前成功完成时为 True
+        """
+        with self._lock:
+            future = self._inflight.get(user_id)
+        if future is None:
+            return False
+        try:
+            future.result(timeout=self.WAIT_TIMEOUT_SECONDS if timeout is None else timeout)
+            return True
+        except TimeoutError:
+            return False
+        except Exception:
+            return False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_workers": self.max_workers,
+                "inflight": len(self._inflight),
+                "scheduled": self.scheduled,
+                "deduplicated": self.deduplicated,
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+
+# 全局单例
+replenish_worker = ReplenishWorker()
@@ -0,0 +1,176 @@
+"""
+ScoringEngine - 向量化候选打分引擎
+
+维护一个 卡片×标签 的稀疏矩阵（CSR：indptr / indices，行号 = CardIndex 序号），
+一次向量运算给所有未看过的卡片打分，再用 argpartition 取每个桶的 top-k：
+- 得分 = 卡片各标签的用户兴趣权重之和
+- 惩罚：最近看过的标签（防撞车）、被秒滑的标签
+- 随机扰动：保留斯金纳箱的不确定性
+
+numpy 为可选依赖，未安装时 RecommendationService 回退到按标签随机抽取。
+"""
+
+import threading
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖
+    np = None
+
+from services.card_index import card_index
+from services.seen_service import seen_set_service
+
+
+class _Matrix:
+    """某一时刻的不可变矩阵快照，打分期间不受并发追加影响"""
+
+    __slots__ = ('rows', 'cols', 'n_cards', 'tag_ids', 'mask_cache')
+
+    def __init__(self, rows, cols, n_cards: int, tag_ids: Dict[str, int]):
+        self.rows = rows
+        self.cols = cols
+        self.n_cards = n_cards
+        self.tag_ids = tag_ids
+        self.mask_cache: Dict[frozenset, object] = {}
+
+    def tag_vector(self, weights: Dict[str, float]):
+        vector = np.zeros(len(self.tag_ids), dtype=np.float64)
+        for tag, weight in weights.items():
+            col = self.tag_ids.get(tag)
+            if col is not None:
+                vector[col] += weight
+        return vector
+
+    def row_sum(self, tag_vector):
+        """稀疏矩阵 × 标签向量：每张卡片的标签权重之和"""
+        return np.bincount(self.rows, weights=tag_vector[self.cols], minlength=self.n_cards)
+
+    def tag_mask(self, tags: Iterable[str]):
+        """包含任一 tags 的卡片布尔掩码（按标签集合缓存）"""
+        key = frozenset(tags)
+        mask = self.mask_cache.get(key)
+        if mask is None:
+            mask = self.row_sum(self.tag_vector({tag: 1.0 for tag in key})) > 0
+            self.mask_cache[key] = mask
+        return mask
+
+
+class RankingContext:
+    """单次推荐的打分结果：scores 为每张卡片得分，available 标记仍可选的卡片"""
+
+    def __init__(self, matrix: _Matrix, scores, available):
+        self.matrix = matrix
+        self.scores = scores
+        self.available = available
+
+    def exclude(self, card_ids: Iterable):
+        """把指定卡片（如已在队列中的）标记为不可选"""
+        ordinals = [card_index.ordinal(card_id, sync=False) for card_id in card_ids or []]
+        ordinals = [o for o in ordinals if o is not None and o < self.matrix.n_cards]
+        if ordinals:
+            self.available[ordinals] = False
+
+    def top_k(self, k: int, tags: Iterable[str] = None,
+              exclude_tags: Iterable[str] = None) -> List:
+        """
+        在可选卡片中取得分最高的 k 张（tags 为空表示不限标签），选中后标记为不可选
+
+        Returns:
+            卡片 ID 列表（按得分从高到低）
+        """
+        if k <= 0:
+            return []
+
+        valid = self.available.copy()
+        if tags is not None:
+            valid &= self.matrix.tag_mask(tags)
+        if exclude_tags:
+            valid &= ~self.matrix.tag_mask(exclude_tags)
+
+        candidates = np.flatnonzero(valid)
+        if len(candidates) > k:
+            part = np.argpartition(-self.scores[candidates], k - 1)[:k]
+            candidates = candidates[part]
+        candidates = candidates[np.argsort(-self.scores[candidates])]
+
+        self.available[candidates] = False
+        return card_index.ids_at(candidates)
+
+
+class ScoringEngine:
+    """向量化打分引擎"""
+
+    # 最近 30 分钟出现过的标签，每个扣分
+    RECENT_TAG_PENALTY = 0.3
+    # 被秒滑的标签，每个扣分
+    QUICK_SKIP_PENALTY = 1.0
+    # 随机扰动幅度
+    NOISE_SCALE = 0.25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tag_ids: Dict[str, int] = {}
+        self._indptr = [0]
+        self._indices: List[int] = []
+        self._matrix: Optional[_Matrix] = None
+
+    def is_available(self) -> bool:
+        return np is not None
+
+    def refresh(self) -> Optional[_Matrix]:
+        """把 CardIndex 中新增的卡片追加到矩阵，返回最新快照"""
+        card_index.ensure_loaded()
+        matrix = self._matrix
+        if matrix is not None and matrix.n_cards == len(card_index):
+            return matrix
+
+        with self._lock:
+            new_rows = card_index.tags_from(len(self._indptr) - 1)
+            if not new_rows and self._matrix is not None:
+                return self._matrix
+
+            for tags in new_rows:
+                for tag in tags:
+                    col = self._tag_ids.setdefault(tag, len(self._tag_ids))
+                    self._indices.append(col)
+                self._indptr.append(len(self._indices))
+
+            n_cards = len(self._indptr) - 1
+            indptr = np.asarray(self._indptr, dtype=np.int64)
+            rows = np.repeat(np.arange(n_cards, dtype=np.int32), np.diff(indptr))
+            cols = np.asarray(self._indices, dtype=np.int32)
+            self._matrix = _Matrix(rows, cols, n_cards, dict(self._tag_ids))
+            return self._matrix
+
+    def rank(self, user_id: str, interests: Dict[str, float],
+             recent_tags: Iterable[str] = None,
+             quick_skipped_tags: Iterable[str] = None) -> Optional[RankingContext]:
+        """
+        给用户没看过的全部卡片打分
+
+        Args:
+            user_id: 用户ID
+            interests: 归一化的标签兴趣权重
+            recent_tags: 最近看过的标签（扣分）
+            quick_skipped_tags: 被秒滑的标签（扣分）
+        """
+        matrix = self.refresh()
+        if matrix is None or matrix.n_cards == 0:
+            return None
+
+        weights = dict(interests)
+        for tag in recent_tags or []:
+            weights[tag] = weights.get(tag, 0.0) - self.RECENT_TAG_PENALTY
+        for tag in quick_skipped_tags or []:
+            weights[tag] = weights.get(tag, 0.0) - self.QUICK_SKIP_PENALTY
+
+        scores = matrix.row_sum(matrix.tag_vector(weights))
+        scores += np.random.default_rng().random(matrix.n_cards) * self.NOISE_SCALE
+
+        available = ~seen_set_service.seen_mask(user_id, matrix.n_cards)
+        return RankingContext(matrix, scores, available)
+
+
+# 全局单例
+scoring_engine = ScoringEngine()
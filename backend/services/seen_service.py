@@ -0,0 +1,284 @@
+"""
+SeenSetService - 用户已看卡片集合
+
+替代各处 "查出用户全部交互过的 card_id → NOT IN (...)" 的做法：
+1. Redis 模式（QueueService 连接 Redis 时）：每个用户一个 Set `seen:user:{id}`，
+   Redis 故障时经 QueueService 熔断回退到内存模式
+2. 内存模式：按 CardIndex 序号编码的位图，LRU 限制常驻用户数
+
+本次请求新生成的匿名 ID 可以用 assume_empty 标记为空集合，请求内不加载。
+首次访问某个用户时从 interactions 表（及已归档的 seen_cards）加载一次，之后由 /api/interaction/record 增量维护。
+Redis 故障期间的标记只写入内存位图；恢复后删除这些用户的 Redis 集合，下次访问时从数据库重新加载。
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Iterable, List
+
+from flask import g, has_request_context
+
+from models import db
+from models.interaction import Interaction
+from models.seen_card import SeenCard
+from services.card_index import card_index
+from services.queue_service import queue_service
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅 seen_mask 需要
+    np = None
+
+
+class _Bitmap:
+    """按卡片序号置位的紧凑位图，容量随最大序号增长"""
+
+    __slots__ = ('bits', 'count')
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.count = 0
+
+    def add(self, ordinal: int):
+        byte, bit = divmod(ordinal, 8)
+        if byte >= len(self.bits):
+            self.bits.extend(b'\x00' * (byte + 1 - len(self.bits)))
+        mask = 1 << bit
+        if not self.bits[byte] & mask:
+            self.bits[byte] |= mask
+            self.count += 1
+
+    def __contains__(self, ordinal: int) -> bool:
+        byte = ordinal >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (ordinal & 7)))
+
+
+class SeenSetService:
+    """已看卡片集合服务"""
+
+    # 内存模式下最多常驻的用户数（超出按 LRU 淘汰，下次访问从数据库重新加载）
+    MAX_MEMORY_USERS = 5000
+
+    # Redis 模式
+    KEY_TTL_SECONDS = 7 * 24 * 3600
+    LOADED_MARKER = '__loaded__'  # 区分 "已加载但为空" 和 "未加载"
+    SMISMEMBER_MAX_IDS = 256  # 候选较多时改为一次取回全部成员在本地过滤
+    # 最多记录多少个 Redis 故障期间被标记过的用户（超出时最早的用户只能等集合过期）
+    MAX_OUTAGE_USERS = 50000
+
+    def __init__(self):
+        self._bitmaps: OrderedDict = OrderedDict()
+        self._outage_users: OrderedDict = OrderedDict()  # Redis 故障期间只在内存中标记过的用户
+        self._lock = threading.Lock()
+
+    def get_seen_key(self, user_id: str) -> str:
+        return f"seen:user:{user_id}"
+
+    def _load_from_db(self, user_id: str) -> List[uuid.UUID]:
+        user_uuid = uuid.UUID(user_id)
+        # 热表 + 已归档交互的卡片
+        rows = db.session.query(Interaction.card_id).filter(
+            Interaction.user_id == user_uuid
+        ).union(
+            db.session.query(SeenCard.card_id).filter(SeenCard.user_id == user_uuid)
+        ).all()
+        return [row[0] for row in rows]
+
+    # ------------------------------------------------------------------
+    # 内存位图
+    # ------------------------------------------------------------------
+
+    def _get_bitmap(self, user_id: str) -> _Bitmap:
+        with self._lock:
+            bitmap = self._bitmaps.get(user_id)
+            if bitmap is not None:
+                self._bitmaps.move_to_end(user_id)
+                return bitmap
+
+        bitmap = _Bitmap()
+        # 看过的卡片可能是其他进程刚写入、本进程索引还没同步到的：缺失时同步一次再置位
+        for ordinal in card_index.ordinals(self._load_from_db(user_id)):
+            if ordinal is not None:
+                bitmap.add(ordinal)
+
+        with self._lock:
+            existing = self._bitmaps.get(user_id)
+            if existing is not None:
+                return existing
+            self._bitmaps[user_id] = bitmap
+            while len(self._bitmaps) > self.MAX_MEMORY_USERS:
+                self._bitmaps.popitem(last=False)
+        return bitmap
+
+    # ------------------------------------------------------------------
+    # Redis Set
+    # ------------------------------------------------------------------
+
+    def _invalidate_outage_marks(self, client):
+        """
+        Redis 恢复后删除故障期间在内存中标记过的用户集合
+
+        这些集合带着加载标记，不删除的话永远不会重新加载，故障期间看过的卡片会被再次推荐；
+        删除后下次访问从数据库重新加载（标记都在交互提交之后，数据库里已有这些交互）。
+        """
+        if not self._outage_users:
+            return
+        with self._lock:
+            users, self._outage_users = list(self._outage_users), OrderedDict()
+        try:
+            pipe = client.pipeline(transaction=False)
+            for user_id in users:
+                pipe.delete(self.get_seen_key(user_id))
+            pipe.execute()
+        except Exception:
+            with self._lock:
+                for user_id in users:
+                    self._outage_users.setdefault(user_id, None)
+            raise
+        print(f"[SeenSetService] Invalidated {len(users)} seen set(s) marked during the Redis outage")
+
+    def _ensure_redis_loaded(self, client, user_id: str):
+        self._invalidate_outage_marks(client)
+        key = self.get_seen_key(user_id)
+        if client.sismember(key, self.LOADED_MARKER):
+            return
+        members = [str(card_id) for card_id in self._load_from_db(user_id)]
+        pipe = client.pipeline()
+        pipe.sadd(key, self.LOADED_MARKER, *members)
+        pipe.expire(key, self.KEY_TTL_SECONDS)
+        pipe.execute()
+
+    # ------------------------------------------------------------------
+    # 公共 API
+    # ------------------------------------------------------------------
+
+    def assume_empty(self, user_id: str):
+        """本次请求新生成的用户 ID：请求内视为空集合，不加载（不建 Redis 键，不查数据库）"""
+        if has_request_context():
+            g.setdefault('_empty_seen_users', set()).add(user_id)
+
+    @staticmethod
+    def _assumed_empty(user_id: str) -> bool:
+        return has_request_context() and user_id in g.get('_empty_seen_users', ())
+
+    def mark_seen(self, user_id: str, card_ids: Iterable):
+        """记录用户看过的卡片"""
+        card_ids = list(card_ids)
+        if not card_ids:
+            return
+
+        def mark_redis(client):
+            self._ensure_redis_loaded(client, user_id)
+            key = self.get_seen_key(user_id)
+            pipe = client.pipeline()
+            pipe.sadd(key, *[str(card_id) for card_id in card_ids])
+            pipe.expire(key, self.KEY_TTL_SECONDS)
+            pipe.execute()
+
+        def mark_memory():
+            bitmap = self._get_bitmap(user_id)
+            ordinals = card_index.ordinals(card_ids)
+            with self._lock:
+                for ordinal in ordinals:
+                    if ordinal is not None:
+                        bitmap.add(ordinal)
+                # Redis 恢复后该用户的 Redis 集合已过时
+                self._outage_users[user_id] = None
+                self._outage_users.move_to_end(user_id)
+                while len(self._outage_users) > self.MAX_OUTAGE_USERS:
+                    self._outage_users.popitem(last=False)
+
+        queue_service.with_redis(mark_redis, mark_memory)
+
+    def mark_seen_if_loaded(self, user_id: str, card_ids: Iterable):
+        """
+        只更新已加载的集合（EventFollower 同步其他 worker 的交互时使用）
+
+        未加载的用户下次访问时会从数据库完整加载；Redis 集合各 worker 共享，写入路径已经更新过。
+        """
+        def mark_memory():
+            with self._lock:
+                bitmap = self._bitmaps.get(user_id)
+            if bitmap is None:
+                return
+            ordinals = card_index.ordinals(card_ids)
+            with self._lock:
+                for ordinal in ordinals:
+                    if ordinal is not None:
+                        bitmap.add(ordinal)
+
+        queue_service.with_redis(lambda client: None, mark_memory)
+
+    def seen_count(self, user_id: str) -> int:
+        """用户看过的卡片数量（O(1)）"""
+        if self._assumed_empty(user_id):
+            return 0
+
+        def count_redis(client):
+            self._ensure_redis_loaded(client, user_id)
+            return max(0, client.scard(self.get_seen_key(user_id)) - 1)  # 去掉加载标记
+
+        return queue_service.with_redis(count_redis, lambda: self._get_bitmap(user_id).count)
+
+    def has_seen(self, user_id: str, card_id) -> bool:
+        """用户是否看过某张卡片"""
+        return not self.filter_unseen(user_id, [card_id])
+
+    def filter_unseen(self, user_id: str, card_ids: Iterable) -> List:
+        """过滤出用户没看过的卡片 ID（保持输入顺序和类型）"""
+        card_ids = list(card_ids)
+        if not card_ids or self._assumed_empty(user_id):
+            return card_ids
+
+        def filter_redis(client):
+            self._ensure_redis_loaded(client, user_id)
+            key = self.get_seen_key(user_id)
+            if len(card_ids) <= self.SMISMEMBER_MAX_IDS:
+                flags = client.smismember(key, [str(card_id) for card_id in card_ids])
+                return [card_id for card_id, seen in zip(card_ids, flags) if not seen]
+            members = client.smembers(key)
+            return [card_id for card_id in card_ids if str(card_id) not in members]
+
+        def filter_memory():
+            bitmap = self._get_bitmap(user_id)
+            return [
+                card_id for card_id, ordinal in zip(card_ids, card_index.ordinals(card_ids))
+                if ordinal is None or ordinal not in bitmap
+            ]
+
+        return queue_service.with_redis(filter_redis, filter_memory)
+
+    def seen_mask(self, user_id: str, size: int):
+        """
+        返回长度为 size 的 numpy 布尔数组，下标为 CardIndex 序号，True 表示已看过
+
+        内存模式直接展开位图；Redis 模式取回成员后映射为序号。
+        """
+        mask = np.zeros(size, dtype=bool)
+        if self._assumed_empty(user_id):
+            return mask
+
+        def mask_redis(client):
+            self._ensure_redis_loaded(client, user_id)
+            members = [member for member in client.smembers(self.get_seen_key(user_id))
+                       if member != self.LOADED_MARKER]
+            ordinals = [o for o in card_index.ordinals(members) if o is not None and o < size]
+            if ordinals:
+                mask[ordinals] = True
+            return mask
+
+        def mask_memory():
+            bitmap = self._get_bitmap(user_id)
+            with self._lock:
+                bits = bytes(bitmap.bits)
+            if bits:
+                unpacked = np.unpackbits(np.frombuffer(bits, dtype=np.uint8), bitorder='little')
+                limit = min(size, len(unpacked))
+                mask[:limit] = unpacked[:limit].astype(bool)
+            return mask
+
+        return queue_service.with_redis(mask_redis, mask_memory)
+
+
+# 全局单例
+seen_set_service = SeenSetService()
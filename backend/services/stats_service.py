@@ -0,0 +1,157 @@
+"""
+StatsService - 用户交互统计汇总
+
+维护 user_stats 表（各 action 计数、停留时间之和与条数）：
+1. InteractionService.write_batch 在同一事务里用一条原子 UPDATE 累加
+2. 没有汇总行（老用户 / 首次交互）时从已归档的 interaction_rollups + interactions 热表重建
+
+/api/interaction/stats 只读一行，开销与历史长度无关；还没有汇总行的老用户在内存中聚合一次，不写库。
+"""
+
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import func, update
+
+from models import db, insert_if_absent
+from models.interaction import Interaction
+from models.interaction_rollup import InteractionRollup
+from models.user_stats import UserStats
+
+# user_stats 与 interaction_rollups 共有的计数列
+COUNTER_COLUMNS = ('total_count', 'duration_sum', 'duration_count', *UserStats.ACTION_COLUMNS.values())
+
+
+class StatsService:
+    """用户统计汇总服务"""
+
+    def apply(self, user_id: uuid.UUID, interactions: Iterable[Tuple[str, Optional[int]]]):
+        """
+        把一批新交互累加到用户汇总（调用方负责提交，交互需已写入当前事务）
+
+        Args:
+            interactions: [(action, duration), ...]
+        """
+        interactions = list(interactions)
+        if not interactions:
+            return
+
+        actions = Counter(action for action, _ in interactions)
+        durations = [duration for _, duration in interactions if duration is not None]
+
+        values = {
+            'total_count': UserStats.total_count + len(interactions),
+            'duration_sum': UserStats.duration_sum + sum(durations),
+            'duration_count': UserStats.duration_count + len(durations),
+            'updated_at': datetime.utcnow()
+        }
+        for action, count in actions.items():
+            column = UserStats.ACTION_COLUMNS.get(action)
+            if column:
+                values[column] = getattr(UserStats, column) + count
+
+        # 原子累加，不需要先加锁读取
+        statement = update(UserStats).where(UserStats.user_id == user_id).values(**values)
+        if db.session.execute(statement).rowcount:
+            return
+        if self._create_row(user_id):
+            # 本事务建立汇总行：从历史（已包含本批交互）重建
+            self.rebuild(str(user_id))
+        else:
+            # 并发的首次写入已建立汇总行（已提交，不含本批交互）：照常累加
+            db.session.execute(statement)
+
+    @staticmethod
+    def _create_row(user_id: uuid.UUID) -> bool:
+        """插入全零汇总行（已存在时什么也不做），返回是否由本事务插入"""
+        return insert_if_absent(UserStats, user_id=user_id, updated_at=datetime.utcnow(),
+                                **{column: 0 for column in COUNTER_COLUMNS})
+
+    @staticmethod
+    def load_rollup_totals(user_uuid: Optional[uuid.UUID] = None) -> Dict[uuid.UUID, Dict[str, int]]:
+        """已归档交互的计数：user_id -> {计数列: 值}，来自 interaction_rollups 的 ALL_TAGS 行"""
+        rollups = db.session.query(
+            InteractionRollup.user_id,
+            *(func.coalesce(func.sum(getattr(InteractionRollup, column)), 0) for column in COUNTER_COLUMNS)
+        ).filter(InteractionRollup.tag == InteractionRollup.ALL_TAGS)
+        if user_uuid:
+            rollups = rollups.filter(InteractionRollup.user_id == user_uuid)
+        return {
+            row_user_id: {column: int(value) for column, value in zip(COUNTER_COLUMNS, sums)}
+            for row_user_id, *sums in rollups.group_by(InteractionRollup.user_id)
+        }
+
+    @classmethod
+    def _aggregate(cls, user_uuid: Optional[uuid.UUID] = None) -> Dict[uuid.UUID, Dict[str, int]]:
+        """
+        从已归档汇总 + interactions 表聚合各用户的计数（各一次 GROUP BY，只读）
+
+        Returns:
+            user_id -> {计数列: 值}
+        """
+        # 1. 已归档部分：每天一行 ALL_TAGS 汇总
+        totals = cls.load_rollup_totals(user_uuid)
+
+        def get_totals(row_user_id: uuid.UUID) -> Dict[str, int]:
+            return totals.setdefault(row_user_id, {column: 0 for column in COUNTER_COLUMNS})
+
+        # 2. 热表尾部
+        query = db.session.query(
+            Interaction.user_id,
+            Interaction.action,
+            func.count(Interaction.id),
+            func.coalesce(func.sum(Interaction.duration), 0),
+            func.count(Interaction.duration)
+        )
+        if user_uuid:
+            query = query.filter(Interaction.user_id == user_uuid)
+        query = query.group_by(Interaction.user_id, Interaction.action)
+
+        for row_user_id, action, count, duration_sum, duration_count in query:
+            counters = get_totals(row_user_id)
+            counters['total_count'] += count
+            counters['duration_sum'] += int(duration_sum)
+            counters['duration_count'] += duration_count
+            column = UserStats.ACTION_COLUMNS.get(action)
+            if column:
+                counters[column] += count
+
+        return totals
+
+    def rebuild(self, user_id: str = None) -> int:
+        """
+        从已归档汇总 + interactions 表重建汇总行（不提交事务）
+
+        Args:
+            user_id: 只重建指定用户；为空时重建全部用户
+
+        Returns:
+            重建的汇总行数
+        """
+        totals = self._aggregate(uuid.UUID(user_id) if user_id else None)
+        for row_user_id, counters in totals.items():
+            stats = db.session.get(UserStats, row_user_id) or UserStats(user_id=row_user_id)
+            for column, value in counters.items():
+                setattr(stats, column, value)
+            db.session.add(stats)
+        return len(totals)
+
+    def get_stats(self, user_id: str) -> Dict:
+        """
+        读取用户统计（O(1)）
+
+        还没有汇总行时在内存中从历史聚合后返回，不落库：汇总行只由写入路径（apply / rebuild）建立，
+        读请求不产生写入，也不会与首次写入竞争建行。
+        """
+        user_uuid = uuid.UUID(user_id)
+        stats = db.session.get(UserStats, user_uuid)
+        if stats is None:
+            counters = self._aggregate(user_uuid).get(user_uuid) or {column: 0 for column in COUNTER_COLUMNS}
+            stats = UserStats(user_id=user_uuid, **counters)
+        return stats.to_dict()
+
+
+# 全局单例
+stats_service = StatsService()
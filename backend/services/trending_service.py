@@ -0,0 +1,75 @@
+"""
+TrendingService - 卡片热度
+
+由事件日志派生（EventFollower 持续应用新事件，启动时重放最近 TRENDING_WINDOW_HOURS 小时），
+不查询 interactions 表：
+- 按小时分桶累加每张卡片的得分（LIKE 3 / FINISH_READ 2 / EXPAND 1 / SKIP 0）
+- 只保留窗口内的桶，top_cards 对窗口内各桶求和
+"""
+
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from config import Config
+from services.event_log import epoch_seconds
+
+
+class TrendingService:
+    """按小时分桶的卡片热度（进程内）"""
+
+    ACTION_SCORES = {'LIKE': 3.0, 'FINISH_READ': 2.0, 'EXPAND': 1.0, 'SKIP': 0.0}
+
+    def __init__(self, window_hours: int = None):
+        self.window_hours = window_hours if window_hours is not None else Config.TRENDING_WINDOW_HOURS
+        self._buckets: Dict[int, Counter] = {}  # 小时序号 -> Counter(card_id -> 得分)
+        self._lock = threading.Lock()
+        self.applied = 0
+
+    @staticmethod
+    def _hour(value: datetime) -> int:
+        return int(epoch_seconds(value) // 3600)
+
+    def _first_hour(self) -> int:
+        return self._hour(datetime.utcnow()) - self.window_hours + 1
+
+    def apply(self, events: Iterable[Dict]):
+        """累加一批事件（EventLog 事件格式），窗口外的事件忽略"""
+        first_hour = self._first_hour()
+        with self._lock:
+            for event in events:
+                score = self.ACTION_SCORES.get(event['action'], 0.0)
+                hour = self._hour(datetime.fromisoformat(event['created_at']))
+                if not score or hour < first_hour:
+                    continue
+                self._buckets.setdefault(hour, Counter())[event['card_id']] += score
+                self.applied += 1
+            for hour in [hour for hour in self._buckets if hour < first_hour]:
+                del self._buckets[hour]
+
+    def top_cards(self, limit: int = 20) -> List[Tuple[str, float]]:
+        """窗口内得分最高的卡片 [(card_id, score), ...]"""
+        first_hour = self._first_hour()
+        totals = Counter()
+        with self._lock:
+            for hour, bucket in self._buckets.items():
+                if hour >= first_hour:
+                    totals.update(bucket)
+        return totals.most_common(limit)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "window_hours": self.window_hours,
+                "buckets": len(self._buckets),
+                "applied": self.applied
+            }
+
+
+# 全局单例
+trending_service = TrendingService()
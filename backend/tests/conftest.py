@@ -0,0 +1,135 @@
+"""
+测试夹具
+
+导入应用之前把外部依赖指向临时位置：
+- 数据库：临时目录中的 SQLite 文件，每个测试前建表、测试后删表
+- Redis：不可用的端口，服务走内存后备（需要 Redis 的测试自己用 fakeredis 客户端）
+- 溢出文件 / 事件日志 / 归档目录：临时目录
+- 进程级单例（卡片索引、打分矩阵、已看集合、推荐记忆化、内存队列、卡片缓存、热度、事件日志）：每个测试前清空
+
+运行：cd backend && python -m pytest -q tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix='mindslot-tests-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}",
+    'REDIS_HOST': '127.0.0.1',
+    'REDIS_PORT': '1',
+    'REPLENISH_ASYNC': 'false',
+    'INTERACTION_SPILL_FILE': os.path.join(TEST_DIR, 'interaction_spill.ndjson'),
+    'INTERACTION_ARCHIVE_DIR': os.path.join(TEST_DIR, 'archive'),
+    'EVENT_LOG_DIR': os.path.join(TEST_DIR, 'events'),
+})
+
+# 添加 backend 目录到路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+from services.card_cache import card_cache  # noqa: E402
+from services.card_index import card_index  # noqa: E402
+from services.card_service import CardService  # noqa: E402
+from services.event_log import event_log  # noqa: E402
+from services.queue_service import queue_service  # noqa: E402
+from services.recommendation_service import recommendation_service  # noqa: E402
+from services.scoring_engine import scoring_engine  # noqa: E402
+from services.seen_service import seen_set_service  # noqa: E402
+from services.trending_service import trending_service  # noqa: E402
+
+TAGS = ['Java', 'Python', 'History', 'Science', 'Memes', 'Random', 'AI', 'Philosophy']
+
+
+@pytest.fixture(autouse=True)
+def reset_singletons():
+    """清空进程级单例的状态，测试结果不依赖执行顺序"""
+    pools = {name: tags for name, (tags, _) in card_index._pools.items()}
+    card_index.__init__()
+    for name, tags in pools.items():
+        card_index.register_pool(name, tags)
+    scoring_engine.__init__()
+
+    seen_set_service.__init__()
+    with recommendation_service._memo_lock:
+        recommendation_service._memo.clear()
+
+    store = queue_service._memory_queues
+    with store._lock:
+        store._queues.clear()
+        store._entries = 0
+        store.evictions = 0
+    with queue_service._snapshot_lock:
+        queue_service._memory_snapshots.clear()
+    queue_service._legacy_checked.clear()
+
+    card_cache.__init__()
+    trending_service.clear()
+
+    with event_log._lock:
+        if event_log._file is not None:
+            event_log._file.close()
+            event_log._file = None
+        event_log._segment = 0
+    shutil.rmtree(event_log.directory, ignore_errors=True)
+    yield
+
+
+@pytest.fixture
+def app():
+    """应用上下文 + 空数据库"""
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_cards(app):
+    """创建 n 张卡片，标签在 TAGS 中轮换"""
+    def make(count):
+        return [
+            CardService.create_card(
+                f'topic-{i}', [TAGS[i % len(TAGS)], TAGS[(i + 1) % len(TAGS)]], 3,
+                {'title': f'Card {i}', 'blocks': [{'type': 'markdown', 'content': 'x' * 50}]}
+            )
+            for i in range(count)
+        ]
+    return make
+
+
+@pytest.fixture
+def user_id():
+    return uuid.uuid4()
+
+
+@pytest.fixture
+def fake_redis():
+    """内存中的 Redis（fakeredis，Lua 脚本需要 lupa），缺少时跳过"""
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def attach_redis(service, client):
+    """让 QueueService 直接使用给定的 Redis 客户端（跳过连接探测和健康检查线程）"""
+    import redis
+
+    connection = service._connection
+    connection._started = True
+    connection._client = client
+    connection.errors = (redis.ConnectionError, redis.TimeoutError)
+    connection.circuit = 'closed'
+    service._register_scripts(client)
+    return service
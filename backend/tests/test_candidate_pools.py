@@ -0,0 +1,44 @@
+"""预计算候选池：通识 / 惊喜桶随新卡片增量维护，抽样排除已看卡片（user-007）"""
+from services.card_index import card_index
+from services.interaction_service import InteractionService
+from services.recommendation_service import RecommendationService, recommendation_service
+
+GENERAL = RecommendationService.GENERAL_POOL
+SURPRISE = RecommendationService.SURPRISE_POOL
+
+
+def pool_ids(name):
+    return set(card_index.ids_at(card_index._pools[name][1]))
+
+
+def test_pools_follow_new_cards(app, make_cards):
+    cards = make_cards(8)  # TAGS 轮换：History / Science / Philosophy 属于通识，Memes / Random 属于惊喜
+    card_index.ensure_loaded()
+
+    general = {card.id for card in cards if set(card.tags) & set(RecommendationService.GENERAL_TAGS)}
+    surprise = {card.id for card in cards if set(card.tags) & set(RecommendationService.SURPRISE_TAGS)}
+    assert pool_ids(GENERAL) == general
+    assert pool_ids(SURPRISE) == surprise
+
+    more = make_cards(4)
+    assert pool_ids(SURPRISE) == surprise | {more[3].id}
+
+
+def test_pool_sampling_skips_seen_cards(app, make_cards, user_id):
+    cards = make_cards(8)
+    surprise = [card for card in cards if set(card.tags) & set(RecommendationService.SURPRISE_TAGS)]
+    InteractionService.write_batch([InteractionService.new_row(user_id, surprise[0].id, 'SKIP', 5000)])
+
+    sampled = recommendation_service._sample_pool_cards(SURPRISE, 10, str(user_id))
+
+    assert {card.id for card in sampled} == {card.id for card in surprise[1:]}
+
+
+def test_cold_start_mix_comes_from_pools(app, make_cards, user_id):
+    make_cards(16)
+
+    recommended = recommendation_service.get_recommended_cards(str(user_id), 10)
+
+    assert len(recommended) == 10 and len({card.id for card in recommended}) == 10
+    ids = {card.id for card in recommended}
+    assert ids & pool_ids(GENERAL) and ids & pool_ids(SURPRISE)
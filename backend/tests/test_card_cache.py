@@ -0,0 +1,62 @@
+"""卡片 JSON 缓存：LRU 字节上限、TTL、批量加载与字段拼接（user-010）"""
+import json
+import time
+
+from models import db
+from services.card_cache import CardCache, card_cache, merge_json
+from test_session_context import count_statements
+
+
+def test_merge_json_appends_fields():
+    merged = merge_json(b'{"id":"a"}', {'queue_length': 3})
+    assert json.loads(merged) == {'id': 'a', 'queue_length': 3}
+    assert merge_json(b'{"id":"a"}', {}) == b'{"id":"a"}'
+
+
+def test_get_or_load_hits_the_database_once(app, make_cards):
+    card = make_cards(1)[0]
+    card_id, expected = str(card.id), card.to_dict()
+    db.session.expunge_all()
+
+    first, statements = count_statements(db.engine, lambda: card_cache.get_or_load(card_id))
+    second, cached = count_statements(db.engine, lambda: card_cache.get_or_load(card_id))
+
+    assert json.loads(first) == expected and second == first
+    assert len(statements) == 1 and cached == []
+    assert card_cache.get_or_load('00000000-0000-0000-0000-000000000000') is None
+
+
+def test_get_many_loads_misses_in_one_query(app, make_cards):
+    cards = make_cards(4)
+    card_cache.put(cards[0])
+    card_ids = [str(card.id) for card in cards]
+
+    result, statements = count_statements(db.engine, lambda: card_cache.get_many(card_ids))
+
+    assert set(result) == set(card_ids)
+    assert len(statements) == 1
+
+
+def test_lru_evicts_by_bytes():
+    cache = CardCache(max_bytes=25, ttl_seconds=0, use_redis=False)
+    cache._put_local('a', b'x' * 10)
+    cache._put_local('b', b'x' * 10)
+    cache._get_local('a')  # a 变为最近使用
+    cache._put_local('c', b'x' * 10)
+
+    assert cache._get_local('b') is None
+    assert cache._get_local('a') is not None and cache._get_local('c') is not None
+    assert cache.stats()['bytes'] == 20 and cache.evictions == 1
+
+    cache._put_local('huge', b'x' * 100)  # 超过上限的条目不缓存
+    assert cache._get_local('huge') is None
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = CardCache(max_bytes=1000, ttl_seconds=60, use_redis=False)
+    cache._put_local('a', b'{}')
+    clock = time.monotonic() + 61
+    monkeypatch.setattr('services.card_cache.time.monotonic', lambda: clock)
+
+    assert cache._get_local('a') is None
+    assert cache.stats()['entries'] == 0
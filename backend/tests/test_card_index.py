@@ -0,0 +1,86 @@
+"""卡片内存索引：标签倒排查询、增量同步与随机采样（user-001）"""
+import time
+import uuid
+
+from models import db
+from models.card import Card
+from services.card_index import CardIndex, card_index
+
+
+def synthetic_index(n, tags=('A',)):
+    """不经过数据库的索引：n 张卡片，全部带 tags"""
+    index = CardIndex()
+    index._loaded = True
+    index._last_sync = time.monotonic()
+    for _ in range(n):
+        index._add(uuid.uuid4(), tags, None)
+    return index
+
+
+def test_query_includes_and_excludes_tags(app, make_cards):
+    cards = make_cards(4)  # 标签：[Java, Python] [Python, History] [History, Science] [Science, Memes]
+
+    assert card_index.query(['Python']) == {cards[0].id, cards[1].id}
+    assert card_index.query(['Python', 'Science'], exclude_tags=['History']) == {cards[0].id, cards[3].id}
+    assert card_index.query(['Python'], exclude_ids=[cards[0].id]) == {cards[1].id}
+    assert card_index.query(['Unknown']) == set()
+
+
+def test_cards_written_by_other_processes_are_synced(app, make_cards):
+    make_cards(1)
+    assert card_index.total_cards() == 1
+
+    # 另一个进程写入的卡片不经过 CardService.create_card
+    other = Card(topic='other', tags=['AI'], complexity=1, payload={})
+    db.session.add(other)
+    db.session.commit()
+
+    assert card_index.ordinal(other.id, sync=False) is None
+    assert card_index.ordinal(other.id) == 1
+    assert card_index.query(['AI']) == {other.id}
+
+
+def test_sample_respects_exclusions_and_accept():
+    index = synthetic_index(50)
+    excluded = set(index._ids[:40])
+    rejected = index._ids[40]
+
+    result = index.sample(20, exclude_ids=excluded,
+                          accept=lambda ids: [card_id for card_id in ids if card_id != rejected])
+
+    assert len(result) == 9 and len(set(result)) == 9
+    assert not set(result) & excluded and rejected not in result
+
+
+def test_sample_work_scales_with_k_under_heavy_exclusion():
+    index = synthetic_index(20000)
+    excluded = set(index._ids[:15000])
+    checked = []
+
+    def accept(ids):
+        checked.extend(ids)
+        return ids
+
+    result = index.sample(5, exclude_ids=excluded, accept=accept)
+
+    assert len(result) == 5 and not set(result) & excluded
+    # 75% 被排除时只需要检查几十个位置，而不是整池
+    assert len(checked) < 200
+
+
+def test_random_positions_cover_the_pool_once():
+    positions = list(CardIndex._random_positions(1000))
+    assert sorted(positions) == list(range(1000))
+
+
+def test_sample_pool_skips_excluded_tags():
+    index = synthetic_index(0)
+    index.register_pool('pool', ['A', 'B'])
+    only_a = [uuid.uuid4() for _ in range(5)]
+    for card_id in only_a:
+        index._add(card_id, ('A',), None)
+    for _ in range(5):
+        index._add(uuid.uuid4(), ('A', 'B'), None)
+    index._add(uuid.uuid4(), ('C',), None)
+
+    assert sorted(index.sample_pool('pool', 20, exclude_tags=['B'])) == sorted(only_a)
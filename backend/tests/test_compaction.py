@@ -0,0 +1,81 @@
+"""压实：归档前后画像、统计、已看集合的重建结果一致（user-023）"""
+import uuid
+from datetime import datetime, timedelta
+
+from models import db
+from models.interaction import Interaction
+from models.user_profile import UserProfile
+from models.user_stats import UserStats
+from services.compaction_service import compaction_service
+from services.interaction_service import InteractionService
+from services.recommendation_service import recommendation_service
+from services.seen_service import seen_set_service
+from services.stats_service import stats_service
+
+ACTIONS = ['LIKE', 'SKIP', 'SKIP', 'FINISH_READ', 'EXPAND']
+
+
+def rebuild_all(users):
+    """清空汇总后从 "汇总 + 热表" 重建每个用户的画像、统计和已看集合"""
+    UserProfile.query.delete()
+    UserStats.query.delete()
+    db.session.commit()
+    recommendation_service.rebuild_user_profiles()
+    stats_service.rebuild()
+    db.session.commit()
+
+    result = {}
+    for user in users:
+        profile = db.session.get(UserProfile, user)
+        result[user] = (
+            {tag: round(weight, 9) for tag, weight in profile.normalized().items()},
+            profile.interaction_count,
+            stats_service.get_stats(str(user)),
+            sorted(map(str, seen_set_service._load_from_db(str(user))))
+        )
+    return result
+
+
+def test_compaction_preserves_rebuilt_state(app, make_cards, monkeypatch, tmp_path):
+    monkeypatch.setattr(compaction_service, 'archive_dir', str(tmp_path))
+    cards = make_cards(6)
+    users = [uuid.uuid4() for _ in range(3)]
+    now = datetime.utcnow()
+    rows = [
+        InteractionService.new_row(users[i % 3], cards[i % 6].id, ACTIONS[i % 5],
+                                   None if i % 4 == 0 else 100 * i,
+                                   created_at=now - timedelta(days=(i * 7) % 90, seconds=i))
+        for i in range(120)
+    ]
+    rows.sort(key=lambda row: row['created_at'])
+    for start in range(0, len(rows), 40):
+        InteractionService.write_batch(rows[start:start + 40])
+
+    before = rebuild_all(users)
+    archivable = compaction_service.count_archivable(30)
+    result = compaction_service.compact(30, 17)
+
+    assert result['archived'] == archivable > 0
+    assert Interaction.query.count() == len(rows) - archivable
+    assert rebuild_all(users) == before
+
+    archived = [row for path in compaction_service.list_segments()
+                for row in compaction_service.read_segment(path)]
+    assert len({row['id'] for row in archived}) == archivable
+    # 再次运行无事可做
+    assert compaction_service.compact(30)['archived'] == 0
+
+
+def test_rollup_only_user_rebuilds(app, make_cards, user_id, monkeypatch, tmp_path):
+    monkeypatch.setattr(compaction_service, 'archive_dir', str(tmp_path))
+    cards = make_cards(1)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, cards[0].id, 'LIKE', 3000,
+                                   created_at=datetime.utcnow() - timedelta(days=60))
+    ])
+    before = rebuild_all([user_id])
+
+    compaction_service.compact(30)
+
+    assert Interaction.query.count() == 0
+    assert rebuild_all([user_id]) == before
@@ -0,0 +1,88 @@
+"""响应压缩与 /api/cards/<id> 的条件缓存（user-018）"""
+import gzip
+import json
+import uuid
+
+import pytest
+from flask import Response
+
+from config import Config
+from services import compression
+from services.compression import compress_response, negotiate_encoding
+
+
+@pytest.fixture
+def small_threshold(monkeypatch):
+    monkeypatch.setattr(Config, 'COMPRESSION_MIN_SIZE', 64)
+
+
+def test_negotiate_encoding(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert negotiate_encoding('gzip, deflate, br') == 'gzip'
+    assert negotiate_encoding('gzip;q=0, deflate') is None
+    assert negotiate_encoding('*') == 'gzip'
+    assert negotiate_encoding('') is None
+
+    monkeypatch.setattr(compression, 'brotli', object())
+    assert negotiate_encoding('gzip, br') == 'br'
+    assert negotiate_encoding('gzip, br;q=0') == 'gzip'
+
+
+def test_compress_response_only_above_threshold(app, small_threshold):
+    large = Response(json.dumps({'x': 'y' * 200}), mimetype='application/json')
+    small = Response(json.dumps({'x': 'y'}), mimetype='application/json')
+
+    compress_response(large, 'gzip')
+    compress_response(small, 'gzip')
+
+    assert large.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(large.get_data())) == {'x': 'y' * 200}
+    assert 'Content-Encoding' not in small.headers
+    assert 'Accept-Encoding' in large.vary and 'Accept-Encoding' in small.vary
+
+
+def test_compress_response_skips_encoded_and_non_text(app, small_threshold):
+    encoded = Response(b'z' * 200, mimetype='application/json', headers={'Content-Encoding': 'gzip'})
+    binary = Response(b'z' * 200, mimetype='image/png')
+
+    compress_response(encoded, 'gzip')
+    compress_response(binary, 'gzip')
+
+    assert encoded.get_data() == b'z' * 200
+    assert binary.get_data() == b'z' * 200 and 'Content-Encoding' not in binary.headers
+
+
+def test_card_resource_is_cacheable(client, make_cards, small_threshold):
+    card = make_cards(1)[0]
+
+    response = client.get(f'/api/cards/{card.id}', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert 'immutable' in response.headers['Cache-Control']
+    assert json.loads(gzip.decompress(response.get_data()))['id'] == str(card.id)
+
+    plain = client.get(f'/api/cards/{card.id}')
+    assert 'Content-Encoding' not in plain.headers
+    assert json.loads(plain.get_data())['id'] == str(card.id)
+    assert plain.headers['ETag'] != response.headers['ETag']
+
+
+def test_card_if_none_match_returns_304(client, make_cards, small_threshold):
+    card = make_cards(1)[0]
+    plain_etag = client.get(f'/api/cards/{card.id}').headers['ETag']
+
+    # 另一种编码的表示内容相同，同样命中
+    response = client.get(f'/api/cards/{card.id}',
+                          headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain_etag})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'].endswith('-gzip"')
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_card_errors(client):
+    assert client.get('/api/cards/not-a-uuid').status_code == 400
+    assert client.get(f'/api/cards/{uuid.uuid4()}').status_code == 404
@@ -0,0 +1,126 @@
+"""事件日志：段文件保留期与实例目录下的路径（user-024）"""
+import os
+import time
+
+from app import app as flask_app, resolve_instance_paths
+from config import Config
+from services.compaction_service import compaction_service
+from services.event_log import SOURCE_LOCAL, EventLog, event_log
+from services.interaction_buffer import interaction_buffer
+
+HOUR = 3600
+
+
+def make_log(directory, worker_id='live'):
+    log = EventLog()
+    log.enabled = True
+    log.directory = str(directory)
+    log.worker_id = worker_id
+    log._pid = os.getpid()  # 标识已确定，首次追加时不再重新解析
+    log.retention_hours = 24
+    return log
+
+
+def write_segment(log, worker_id, segment, age_hours):
+    path = log._segment_path(worker_id, segment)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{}\n')
+    mtime = time.time() - age_hours * HOUR
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_prune_removes_expired_segments_and_dead_workers(tmp_path):
+    log = make_log(tmp_path)
+    write_segment(log, 'dead', 0, 50)
+    write_segment(log, 'dead', 1, 30)
+    write_segment(log, 'old', 0, 40)
+    kept = write_segment(log, 'old', 1, 2)
+
+    assert log.prune() == 3
+    assert log._list_workers() == ['old']
+    assert os.path.exists(kept)
+
+
+def test_prune_keeps_current_segment(tmp_path):
+    log = make_log(tmp_path)
+    log.append([{'id': 1}])
+    current = log._segment_path('live', 0)
+    mtime = time.time() - 48 * HOUR
+    os.utime(current, (mtime, mtime))
+
+    assert log.prune() == 0
+    assert os.path.exists(current)
+
+
+def test_prune_waits_for_active_consumers(tmp_path):
+    log = make_log(tmp_path)
+    write_segment(log, 'dead', 0, 50)
+    write_segment(log, 'dead', 1, 40)
+    write_segment(log, 'other', 0, 40)
+    log.save_offset('trending', SOURCE_LOCAL, {'dead': [1, 0]})
+
+    # 消费者还在读 dead 的第 1 段，且还没开始读 other
+    assert log.prune() == 1
+    assert log._list_segments('dead') == [1]
+    assert log._list_segments('other') == [0]
+
+    # 超过保留期没有更新的偏移量不再阻止删除
+    stale = time.time() - 30 * HOUR
+    os.utime(log._offset_path('trending', SOURCE_LOCAL), (stale, stale))
+    assert log.prune() == 2
+    assert log._list_workers() == []
+
+
+def test_append_reopens_pruned_segment(tmp_path):
+    log = make_log(tmp_path)
+    log.append([{'id': 1}])
+    os.remove(log._segment_path('live', 0))
+
+    log.append([{'id': 2}])
+
+    events, _ = log.read(SOURCE_LOCAL, None)
+    assert events == [{'id': 2}]
+
+
+def test_retention_disabled_keeps_everything(tmp_path):
+    log = make_log(tmp_path)
+    log.retention_hours = 0
+    write_segment(log, 'dead', 0, 1000)
+
+    assert log.prune() == 0
+
+
+def test_worker_id_is_resolved_after_fork(tmp_path, monkeypatch):
+    log = EventLog()
+    log.enabled = True
+    log.directory = str(tmp_path)
+    assert log.worker_id is None
+
+    log.append([{'id': 1}])
+    parent = log.worker_id
+    assert parent.endswith(f'-{os.getpid()}')
+
+    # 模拟 gunicorn --preload fork 出的 worker：重新解析标识，不写父进程的段文件
+    monkeypatch.setattr(os, 'getpid', lambda: 4242)
+    log.append([{'id': 2}])
+
+    assert log.worker_id.endswith('-4242')
+    assert log._list_workers() == sorted([parent, log.worker_id])
+
+
+def test_relative_paths_resolve_against_instance_path(monkeypatch):
+    monkeypatch.setattr(event_log, 'directory', event_log.directory)
+    for name in ('spill_path', 'dead_letter_path'):
+        monkeypatch.setattr(interaction_buffer, name, getattr(interaction_buffer, name))
+    monkeypatch.setattr(compaction_service, 'archive_dir', compaction_service.archive_dir)
+    monkeypatch.setattr(Config, 'EVENT_LOG_DIR', 'events')
+    monkeypatch.setattr(Config, 'INTERACTION_SPILL_FILE', 'spill.ndjson')
+    monkeypatch.setattr(Config, 'INTERACTION_ARCHIVE_DIR', '/srv/archive')
+
+    resolve_instance_paths()
+
+    assert event_log.directory == os.path.join(flask_app.instance_path, 'events')
+    assert interaction_buffer.spill_path == os.path.join(flask_app.instance_path, 'spill.ndjson')
+    assert compaction_service.archive_dir == '/srv/archive'
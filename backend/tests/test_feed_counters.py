@@ -0,0 +1,32 @@
+"""/api/feed/next 的库存与未看数：计数器读取，不查询 COUNT（user-009）"""
+from models import db
+from services.interaction_service import InteractionService
+from test_session_context import count_statements
+
+
+def test_next_reports_stock_from_counters(client, make_cards, user_id):
+    cards = make_cards(12)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, card.id, 'SKIP', 5000) for card in cards[:4]
+    ])
+    client.get(f'/api/feed/next?user_id={user_id}')  # 首次请求：加载索引和已看集合
+
+    response, statements = count_statements(
+        db.engine, lambda: client.get(f'/api/feed/next?user_id={user_id}'))
+
+    body = response.get_json()
+    assert body['total_cards_in_pool'] == 12
+    assert body['unviewed_count'] == 8
+    assert not [s for s in statements if 'count(' in s.lower()]
+
+
+def test_unviewed_count_follows_new_interactions(client, make_cards, user_id):
+    cards = make_cards(6)
+    first = client.get(f'/api/feed/next?user_id={user_id}').get_json()
+    assert first['unviewed_count'] == 6
+
+    client.post('/api/interaction/record', json={
+        'user_id': str(user_id), 'card_id': first['id'], 'action': 'LIKE', 'duration': 3000
+    })
+
+    assert client.get(f'/api/feed/next?user_id={user_id}').get_json()['unviewed_count'] == 5
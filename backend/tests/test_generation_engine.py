@@ -0,0 +1,90 @@
+"""并行卡片生成：有界并发、失败隔离、保存失败回滚（user-025）"""
+import threading
+import time
+
+from models import db
+from models.card import Card
+from services.generation_engine import GenerationEngine
+
+
+def topics(n):
+    return [{'topic': f'topic-{i}', 'tags': ['AI']} for i in range(n)]
+
+
+def test_generation_is_bounded_and_parallel(app):
+    lock = threading.Lock()
+    current, peak = [0], [0]
+
+    def generate(topic_data):
+        with lock:
+            current[0] += 1
+            peak[0] = max(peak[0], current[0])
+        time.sleep(0.05)
+        with lock:
+            current[0] -= 1
+        return {'title': topic_data['topic']}
+
+    saved = []
+    started = time.monotonic()
+    stats = GenerationEngine(max_inflight=3).run(topics(9), generate, lambda t, p: saved.append(p))
+
+    assert peak[0] == 3
+    # 9 个选题、每个 50ms、3 路并发：约 150ms，远少于串行的 450ms
+    assert time.monotonic() - started < 0.4
+    assert stats['created'] == 9 and stats['max_inflight'] == 3
+    assert sorted(p['title'] for p in saved) == sorted(t['topic'] for t in topics(9))
+
+
+def test_saves_run_on_the_calling_thread(app):
+    threads = set()
+    GenerationEngine(max_inflight=4).run(
+        topics(6), lambda t: {'ok': True}, lambda t, p: threads.add(threading.get_ident()))
+
+    assert threads == {threading.get_ident()}
+
+
+def test_failures_are_isolated_per_topic(app):
+    def generate(topic_data):
+        if topic_data['topic'] == 'topic-1':
+            raise RuntimeError('LLM timeout')
+        if topic_data['topic'] == 'topic-2':
+            return None
+        return {'title': topic_data['topic']}
+
+    def save(topic_data, payload):
+        if topic_data['topic'] == 'topic-3':
+            raise ValueError('invalid payload')
+
+    stats = GenerationEngine(max_inflight=2).run(topics(5), generate, save)
+
+    assert (stats['total'], stats['created'], stats['failed']) == (5, 2, 3)
+    errors = {error['topic']: error['error'] for error in stats['errors']}
+    assert errors == {
+        'topic-1': 'Generation error: LLM timeout',
+        'topic-2': 'Empty payload',
+        'topic-3': 'invalid payload',
+    }
+
+
+def test_failed_save_is_rolled_back(app):
+    def save(topic_data, payload):
+        card = Card(topic=topic_data['topic'], tags=topic_data['tags'], complexity=1, payload=payload)
+        db.session.add(card)
+        db.session.flush()
+        if topic_data['topic'] == 'topic-0':
+            raise ValueError('rejected after flush')
+        db.session.commit()
+
+    stats = GenerationEngine(max_inflight=1).run(topics(2), lambda t: {'title': t['topic']}, save)
+
+    assert stats['created'] == 1
+    assert [card.topic for card in Card.query.all()] == ['topic-1']
+
+
+def test_empty_batch_records_stats(app):
+    engine = GenerationEngine(max_inflight=2)
+
+    stats = engine.run([], lambda t: {}, lambda t, p: None)
+
+    assert (stats['total'], stats['created'], stats['failed']) == (0, 0, 0)
+    assert engine.last_stats is stats
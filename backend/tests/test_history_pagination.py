@@ -0,0 +1,86 @@
+"""交互历史：复合索引与键集分页（user-022）"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+
+from models import db
+from services.interaction_service import InteractionService
+
+
+def record_history(user_id, cards, count):
+    """count 条交互，每三条共用一个时间戳（测试同一时刻的记录翻页）"""
+    start = datetime(2026, 1, 1)
+    rows = [
+        InteractionService.new_row(user_id, cards[i % len(cards)].id, 'SKIP', i,
+                                   created_at=start + timedelta(seconds=i // 3))
+        for i in range(count)
+    ]
+    InteractionService.write_batch(rows)
+    return rows
+
+
+def walk(client, user_id, limit):
+    pages, cursor = [], None
+    while True:
+        url = f'/api/interaction/history?user_id={user_id}&limit={limit}'
+        body = client.get(url + (f'&after={cursor}' if cursor else '')).get_json()
+        pages.append(body['history'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_history_once_in_order(client, make_cards, user_id):
+    rows = record_history(user_id, make_cards(3), 23)
+
+    pages = walk(client, user_id, 5)
+
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+    history = [item for page in pages for item in page]
+    assert sorted(item['id'] for item in history) == sorted(str(row['id']) for row in rows)
+    times = [item['created_at'] for item in history]
+    assert times == sorted(times, reverse=True)
+
+
+def test_exact_last_page_has_no_cursor(client, make_cards, user_id):
+    record_history(user_id, make_cards(2), 10)
+
+    assert [len(page) for page in walk(client, user_id, 5)] == [5, 5]
+
+
+def test_deep_pages_do_not_use_offset(client, make_cards, user_id):
+    record_history(user_id, make_cards(2), 12)
+    cursor = client.get(f'/api/interaction/history?user_id={user_id}&limit=10').get_json()['next_cursor']
+
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if 'FROM interactions' in statement:
+            executed.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(f'/api/interaction/history?user_id={user_id}&limit=10&after={cursor}')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    assert len(response.get_json()['history']) == 2
+    [(statement, parameters)] = executed
+    # 按游标定位：键集条件 + LIMIT，不跳过任何行（SQLite 方言总会带上 OFFSET 0）
+    assert 'interactions.created_at <= ?' in statement
+    assert 'OFFSET' not in statement.upper() or parameters[-1] == 0
+
+
+def test_history_rejects_bad_parameters(client, user_id):
+    url = f'/api/interaction/history?user_id={user_id}'
+    assert client.get('/api/interaction/history').status_code == 400
+    assert client.get(url + '&limit=abc').status_code == 400
+    assert client.get(url + '&after=not-a-cursor').status_code == 400
+    assert client.get(url + '&limit=100000').status_code == 200
+
+
+def test_interaction_indexes_exist(app):
+    indexes = {index['name']: index['column_names'] for index in inspect(db.engine).get_indexes('interactions')}
+
+    assert indexes['ix_interactions_user_created'] == ['user_id', 'created_at']
+    assert indexes['ix_interactions_user_card'] == ['user_id', 'card_id']
@@ -0,0 +1,66 @@
+"""批量上报交互：逐条校验、一次插入（user-019）"""
+import uuid
+
+from models import db
+from models.interaction import Interaction
+from routes.interaction import MAX_BATCH_EVENTS
+from test_session_context import count_statements
+
+
+def test_batch_reports_each_event(client, make_cards, user_id):
+    cards = make_cards(2)
+    events = [
+        {'card_id': str(cards[0].id), 'action': 'LIKE', 'duration': 3000},
+        {'card_id': str(cards[1].id), 'action': 'BOGUS'},
+        {'card_id': str(uuid.uuid4()), 'action': 'SKIP'},
+        {'card_id': 'not-a-uuid', 'action': 'SKIP'},
+        {'card_id': str(cards[1].id), 'action': 'SKIP', 'duration': '5'},
+        {'action': 'SKIP'},
+        'not-an-object',
+        {'card_id': str(cards[1].id), 'action': 'FINISH_READ', 'duration': 9000},
+    ]
+
+    response = client.post('/api/interaction/record/batch', json={'user_id': str(user_id), 'events': events})
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['accepted'], body['rejected']) == (2, 6)
+    assert [result['status'] for result in body['results']] == \
+        ['ok', 'error', 'error', 'error', 'error', 'error', 'error', 'ok']
+    assert body['results'][2]['error'] == 'Card not found'
+
+    rows = Interaction.query.filter_by(user_id=user_id).order_by(Interaction.created_at).all()
+    assert [(row.card_id, row.action) for row in rows] == [(cards[0].id, 'LIKE'), (cards[1].id, 'FINISH_READ')]
+    assert {str(row.id) for row in rows} == {body['results'][0]['id'], body['results'][7]['id']}
+
+
+def test_batch_is_one_insert(client, make_cards, user_id):
+    cards = make_cards(10)
+    events = [{'card_id': str(card.id), 'action': 'SKIP', 'duration': 100} for card in cards]
+
+    response, statements = count_statements(db.engine, lambda: client.post(
+        '/api/interaction/record/batch', json={'user_id': str(user_id), 'events': events}))
+
+    assert response.get_json()['accepted'] == 10
+    inserts = [s for s in statements if s.lstrip().upper().startswith('INSERT INTO INTERACTIONS')]
+    assert len(inserts) == 1
+
+
+def test_batch_accepts_a_bare_array_with_per_event_users(client, make_cards):
+    card = make_cards(1)[0]
+    users = [uuid.uuid4(), uuid.uuid4()]
+    events = [{'user_id': str(user), 'card_id': str(card.id), 'action': 'LIKE'} for user in users]
+    events.append({'card_id': str(card.id), 'action': 'LIKE'})
+
+    body = client.post('/api/interaction/record/batch', json=events).get_json()
+
+    assert [result['status'] for result in body['results']] == ['ok', 'ok', 'error']
+    assert {row.user_id for row in Interaction.query.all()} == set(users)
+
+
+def test_batch_rejects_malformed_requests(client, user_id):
+    url = '/api/interaction/record/batch'
+    assert client.post(url, json={'user_id': str(user_id)}).status_code == 400
+    assert client.post(url, data='nope', content_type='application/json').status_code == 400
+    too_many = [{'card_id': str(uuid.uuid4()), 'action': 'SKIP'}] * (MAX_BATCH_EVENTS + 1)
+    assert client.post(url, json={'user_id': str(user_id), 'events': too_many}).status_code == 400
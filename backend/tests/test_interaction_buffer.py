@@ -0,0 +1,164 @@
+"""写后缓冲：溢出文件重放、坏行隔离、提交后的副作用失败（user-020）"""
+import fcntl
+import json
+import os
+import time
+
+import pytest
+
+from models import db
+from models.interaction import Interaction
+from services import interaction_buffer as buffer_module
+from services import interaction_service as interaction_module
+from services.interaction_buffer import InteractionBuffer
+from services.interaction_service import InteractionService
+
+
+@pytest.fixture
+def buffer(app, tmp_path):
+    buffer = InteractionBuffer()
+    buffer.enabled = True
+    buffer.flush_interval = 0.02
+    buffer.spill_path = str(tmp_path / 'spill.ndjson')
+    buffer.dead_letter_path = str(tmp_path / 'dead_letter.ndjson')
+    yield buffer
+    buffer.stop()
+
+
+def wait_until_drained(buffer, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while buffer.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffer.stats()['pending'] == 0
+
+
+def stored_ids():
+    db.session.expire_all()
+    return {row[0] for row in db.session.query(Interaction.id)}
+
+
+def test_poison_row_is_dead_lettered(app, buffer, make_cards, user_id):
+    cards = make_cards(3)
+    good = [InteractionService.new_row(user_id, card.id, 'LIKE', 5000) for card in cards[:2]]
+    poison = InteractionService.new_row(user_id, cards[2].id, 'SKIP', 'abc')
+    buffer.start(app)
+
+    for row in (good[0], poison, good[1]):
+        buffer.submit(row)
+    wait_until_drained(buffer)
+
+    stats = buffer.stats()
+    assert stats['flushed'] == 2 and stats['dead_lettered'] == 1
+    assert stored_ids() == {row['id'] for row in good}
+    with open(buffer.dead_letter_file, encoding='utf-8') as f:
+        letters = [json.loads(line) for line in f]
+    assert [letter['row']['id'] for letter in letters] == [str(poison['id'])]
+    # 后面的交互不受影响
+    later = InteractionService.new_row(user_id, cards[0].id, 'EXPAND', 100)
+    buffer.submit(later)
+    wait_until_drained(buffer)
+    assert later['id'] in stored_ids()
+
+
+def test_recovery_replays_only_unstored_rows(app, buffer, make_cards, user_id):
+    cards = make_cards(2)
+    stored = InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)
+    pending = InteractionService.new_row(user_id, cards[1].id, 'LIKE', 5000)
+    InteractionService.write_batch([stored])
+    with open(buffer.spill_path, 'w', encoding='utf-8') as f:
+        f.write(InteractionService.encode_row(stored) + '\n')
+        f.write(InteractionService.encode_row(pending) + '\n')
+        f.write('{"id": "half-written')
+
+    buffer.start(app)
+    wait_until_drained(buffer)
+
+    assert stored_ids() == {stored['id'], pending['id']}
+    assert buffer.stats()['flushed'] == 1
+    # 旧版不带后缀的溢出文件被接管后删除
+    assert not os.path.exists(buffer.spill_path)
+    assert os.path.getsize(buffer.spill_file) == 0
+
+
+def test_post_commit_failure_does_not_retry_committed_rows(app, buffer, make_cards, user_id, monkeypatch):
+    cards = make_cards(1)
+
+    def broken_mark_seen(*args, **kwargs):
+        raise RuntimeError('seen set unavailable')
+
+    monkeypatch.setattr(interaction_module.seen_set_service, 'mark_seen', broken_mark_seen)
+    buffer.start(app)
+
+    row = InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)
+    buffer.submit(row)
+    wait_until_drained(buffer)
+
+    stats = buffer.stats()
+    assert stats['flushed'] == 1 and stats['failures'] == 0 and stats['dead_lettered'] == 0
+    assert stored_ids() == {row['id']}
+
+
+def spill_rows(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(InteractionService.encode_row(row) + '\n')
+
+
+def test_each_worker_writes_its_own_spill_file(app, buffer, tmp_path, monkeypatch):
+    monkeypatch.setattr(buffer_module, 'process_worker_id', lambda: 'host-1')
+    buffer.start(app)
+    other = InteractionBuffer()
+    other.enabled = True
+    other.spill_path, other.dead_letter_path = buffer.spill_path, buffer.dead_letter_path
+    monkeypatch.setattr(buffer_module, 'process_worker_id', lambda: 'host-2')
+    other.start(app)
+    try:
+        assert buffer.spill_file == str(tmp_path / 'spill.host-1.ndjson')
+        assert buffer.dead_letter_file == str(tmp_path / 'dead_letter.host-1.ndjson')
+        assert other.spill_file == str(tmp_path / 'spill.host-2.ndjson')
+        # 两个进程都在运行：互不接管对方的溢出文件
+        assert os.path.exists(buffer.spill_file) and os.path.exists(other.spill_file)
+    finally:
+        other.stop()
+
+
+def test_spill_files_of_exited_workers_are_recovered(app, buffer, tmp_path, make_cards, user_id, monkeypatch):
+    cards = make_cards(2)
+    dead = InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)
+    live = InteractionService.new_row(user_id, cards[1].id, 'LIKE', 5000)
+    spill_rows(tmp_path / 'spill.host-dead.ndjson', [dead])
+    spill_rows(tmp_path / 'spill.host-live.ndjson', [live])
+    # 仍在运行的 worker 持有自己溢出文件的锁
+    live_lock = open(tmp_path / 'spill.host-live.ndjson.lock', 'a')
+    fcntl.flock(live_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    monkeypatch.setattr(buffer_module, 'process_worker_id', lambda: 'host-new')
+    try:
+        buffer.start(app)
+        wait_until_drained(buffer)
+
+        assert stored_ids() == {dead['id']}
+        assert not os.path.exists(tmp_path / 'spill.host-dead.ndjson')
+        assert os.path.exists(tmp_path / 'spill.host-live.ndjson')
+    finally:
+        live_lock.close()
+
+
+def test_stop_removes_a_drained_spill_file(app, buffer, make_cards, user_id):
+    cards = make_cards(1)
+    buffer.start(app)
+    buffer.submit(InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000))
+    wait_until_drained(buffer)
+
+    buffer.stop()
+
+    assert not os.path.exists(buffer.spill_file)
+    assert not buffer.is_active()
+
+
+@pytest.mark.parametrize('duration', ['abc', 1.5, [1]])
+def test_record_rejects_non_integer_duration(client, make_cards, user_id, duration):
+    cards = make_cards(1)
+    response = client.post('/api/interaction/record', json={
+        'user_id': str(user_id), 'card_id': str(cards[0].id), 'action': 'SKIP', 'duration': duration
+    })
+    assert response.status_code == 400
@@ -0,0 +1,49 @@
+"""入队去重：成员集合让补货不会重复推送排队中或已出队的卡片（user-017）"""
+import uuid
+
+from routes.feed import replenish_queue
+from services.queue_service import QueueService, queue_service
+from services.recommendation_service import recommendation_service
+
+
+def test_memory_push_skips_queued_and_served_cards():
+    service = QueueService()
+    user = str(uuid.uuid4())
+    ids = [str(uuid.uuid4()) for _ in range(4)]
+    service.push_cards(user, ids[:2])
+    service.pop_cards(user, 1)
+
+    # ids[0] 已出队、ids[1] 仍在排队，都不再入队
+    assert service.push_cards(user, ids) == ids[2:]
+    assert service.peek_queue(user, 10) == ids[1:]
+    assert service.get_members(user) == set(ids)
+
+
+def test_recommendations_respect_exclude_ids(app, make_cards, user_id):
+    cards = make_cards(8)
+    excluded = {str(card.id) for card in cards[:5]}
+
+    recommended = recommendation_service.get_recommended_cards(str(user_id), 8, exclude_ids=excluded)
+
+    assert {str(card.id) for card in recommended} == {str(card.id) for card in cards[5:]}
+
+
+def test_replenish_does_not_requeue_members(app, make_cards, user_id):
+    cards = make_cards(6)
+    user = str(user_id)
+    queue_service.push_cards(user, [str(card.id) for card in cards[:3]])
+    queue_service.pop_cards(user, 1)
+
+    assert replenish_queue(user, 10) == 3
+
+    assert queue_service.get_queue_length(user) == 5
+    assert queue_service.get_members(user) == {str(card.id) for card in cards}
+    assert replenish_queue(user, 10) == 0
+
+
+def test_next_serves_distinct_cards_without_interactions(client, make_cards, user_id):
+    make_cards(30)
+
+    served = [client.get(f'/api/feed/next?user_id={user_id}').get_json()['id'] for _ in range(30)]
+
+    assert len(set(served)) == 30
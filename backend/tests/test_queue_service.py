@@ -0,0 +1,175 @@
+"""队列服务：内存后端与 Redis Lua 脚本"""
+import re
+import time
+import uuid
+
+import pytest
+from redis.crc import key_slot
+
+from conftest import attach_redis
+from services.queue_service import (
+    POP_AND_INSPECT_SCRIPT, PUSH_UNIQUE_SCRIPT, MemoryQueueStore, QueuePop, QueueService
+)
+
+
+def card_ids(n):
+    return [str(uuid.uuid4()) for _ in range(n)]
+
+
+def test_returned_cards_go_back_to_the_front(app, client):
+    service = QueueService()
+    user = str(uuid.uuid4())
+    ids = card_ids(5)
+    service.push_cards(user, ids)
+    popped = [card_id for card_id, _ in service.pop_and_inspect(user, 3).items]
+
+    service.return_cards(user, popped[1:])
+
+    assert service.peek_queue(user, 10) == popped[1:] + ids[3:]
+    # 仍在成员集合中：补货不会重复入队
+    assert service.push_cards(user, ids) == []
+
+
+def test_return_route_validates_input(client):
+    user = str(uuid.uuid4())
+    assert client.post('/api/feed/return', json={'user_id': user}).status_code == 400
+    assert client.post('/api/feed/return', json={'user_id': user, 'card_ids': ['x']}).status_code == 400
+    response = client.post('/api/feed/return', json={'user_id': user, 'card_ids': card_ids(2)})
+    assert response.status_code == 200
+    assert response.get_json()['returned'] == 2
+
+
+def test_lua_scripts_only_touch_declared_keys():
+    # Redis Cluster 要求脚本访问的键全部通过 KEYS 传入
+    for script in (POP_AND_INSPECT_SCRIPT, PUSH_UNIQUE_SCRIPT):
+        for first_arg in re.findall(r"redis\.call\('\w+',\s*([^,)]+)", script):
+            assert first_arg.startswith('KEYS['), first_arg
+
+
+def test_queue_keys_share_a_slot():
+    service = QueueService()
+    user = str(uuid.uuid4())
+    assert key_slot(service.get_queue_key(user).encode()) == key_slot(service.get_members_key(user).encode())
+
+
+@pytest.fixture
+def redis_queue(fake_redis):
+    service = attach_redis(QueueService(), fake_redis)
+    service.snapshots_enabled = True
+    return service
+
+
+def test_redis_push_skips_members(redis_queue):
+    user = str(uuid.uuid4())
+    ids = card_ids(4)
+
+    assert redis_queue.push_cards(user, ids[:3]) == ids[:3]
+    assert redis_queue.push_cards(user, ids) == ids[3:]
+    assert redis_queue.peek_queue(user, 10) == ids
+    assert redis_queue.get_members(user) == set(ids)
+
+
+def test_redis_pop_and_inspect_returns_snapshots(redis_queue):
+    user = str(uuid.uuid4())
+    ids = card_ids(6)
+    snapshots = {card_id: f'{{"id":"{card_id}"}}'.encode() for card_id in ids[:5]}
+    redis_queue.push_cards(user, ids, snapshots)
+
+    popped = redis_queue.pop_and_inspect(user, 3, min_length=5)
+
+    assert [card_id for card_id, _ in popped.items] == ids[:3]
+    assert [snapshot for _, snapshot in popped.items] == [snapshots[card_id] for card_id in ids[:3]]
+    assert popped.remaining == 3 and popped.below_min
+
+    rest = redis_queue.pop_and_inspect(user, 10)
+    assert [card_id for card_id, _ in rest.items] == ids[3:]
+    assert rest.items[-1][1] is None  # 没有快照的卡片
+    assert redis_queue.pop_and_inspect(user, 1) == QueuePop([], 0, False)
+
+
+def test_redis_return_cards(redis_queue):
+    user = str(uuid.uuid4())
+    ids = card_ids(3)
+    redis_queue.push_cards(user, ids)
+    popped = [card_id for card_id, _ in redis_queue.pop_and_inspect(user, 2).items]
+
+    redis_queue.return_cards(user, popped)
+
+    assert redis_queue.peek_queue(user, 10) == ids
+
+
+def test_memory_store_counts_members_against_the_cap():
+    evicted = []
+    store = MemoryQueueStore(max_users=10, max_entries=10, idle_ttl=0, on_evict=evicted.extend)
+    store.push('a', card_ids(6))
+    store.pop('a', 6)
+    # a 的队列已空，但成员集合仍占 6 个条目
+    assert store.stats()['entries'] == 6
+
+    store.push('b', card_ids(6))
+
+    assert store.stats()['users'] == 1
+    assert store.members('a') == set()
+    assert store.stats()['entries'] == 6
+
+
+def test_memory_store_trims_served_members_of_a_single_user():
+    store = MemoryQueueStore(max_users=10, max_entries=10, idle_ttl=0)
+    first = card_ids(8)
+    store.push('a', first)
+    store.pop('a', 6)
+
+    second = card_ids(6)
+    assert store.push('a', second) == second
+
+    assert store.stats()['entries'] == 10
+    # 最早出队的成员被丢弃，排队中的卡片都保留
+    assert store.members('a') == set(first[4:] + second)
+    assert store.peek('a', 10) == first[6:] + second
+
+
+def test_memory_store_expires_served_members_like_redis(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    store = MemoryQueueStore(max_users=10, max_entries=100, idle_ttl=0, members_ttl=60)
+    ids = card_ids(4)
+    store.push('a', ids)
+    store.pop('a', 3)
+
+    clock[0] += 59
+    assert store.members('a') == set(ids)
+
+    clock[0] += 2
+    # 已出队的成员过期，排队中的仍去重
+    assert store.members('a') == {ids[3]}
+    assert store.stats()['entries'] == 1
+    assert store.push('a', ids) == ids[:3]
+
+
+def test_legacy_keys_are_migrated_on_first_access(redis_queue, fake_redis):
+    user = str(uuid.uuid4())
+    ids = card_ids(4)
+    # 旧版键名：队列里还有两张，另外两张已出队（只在成员集合里）
+    fake_redis.rpush(f'queue:user:{user}', *ids[2:])
+    fake_redis.sadd(f'queue:members:{user}', *ids)
+
+    new = card_ids(1)
+    # 首次访问先迁移：已出队的 ids[0] 仍按旧成员集合去重
+    assert redis_queue.push_cards(user, new + ids[:1]) == new
+
+    assert redis_queue.peek_queue(user, 10) == ids[2:] + new
+    assert set(ids) <= redis_queue.get_members(user)
+    assert not fake_redis.exists(f'queue:user:{user}', f'queue:members:{user}')
+    assert fake_redis.ttl(redis_queue.get_members_key(user)) > 0
+
+
+def test_legacy_keys_are_checked_once_per_user(redis_queue, fake_redis):
+    user = str(uuid.uuid4())
+    redis_queue.get_queue_length(user)
+    # 检查过之后出现的旧键不再迁移
+    fake_redis.rpush(f'queue:user:{user}', *card_ids(2))
+
+    assert redis_queue.get_queue_length(user) == 0
+
+    redis_queue._legacy_checked.clear()
+    assert redis_queue.get_queue_length(user) == 2
@@ -0,0 +1,66 @@
+"""队列快照：卡片内容随 ID 入队，出队时无需查询数据库（user-012）"""
+import json
+import uuid
+
+import pytest
+
+from models import db
+from services.queue_service import QueueService, queue_service
+from test_session_context import count_statements
+
+
+def snapshot_of(card_id):
+    return json.dumps({'id': card_id}).encode()
+
+
+@pytest.fixture
+def memory_queue():
+    service = QueueService()
+    service.snapshots_enabled = True
+    return service
+
+
+def test_memory_pop_returns_and_releases_snapshots(memory_queue):
+    user = str(uuid.uuid4())
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    memory_queue.push_cards(user, ids, {card_id: snapshot_of(card_id) for card_id in ids[:2]})
+
+    popped = memory_queue.pop_and_inspect(user, 3).items
+
+    assert popped == [(ids[0], snapshot_of(ids[0])), (ids[1], snapshot_of(ids[1])), (ids[2], None)]
+    assert memory_queue.stats()['memory']['snapshots'] == 0
+
+
+def test_shared_snapshots_are_reference_counted(memory_queue):
+    card_id = str(uuid.uuid4())
+    users = [str(uuid.uuid4()) for _ in range(2)]
+    for user in users:
+        memory_queue.push_cards(user, [card_id], {card_id: snapshot_of(card_id)})
+    # 重复入队被成员集合拒绝，不多占引用
+    memory_queue.push_cards(users[0], [card_id], {card_id: snapshot_of(card_id)})
+
+    memory_queue.pop_and_inspect(users[0], 1)
+    assert memory_queue.stats()['memory']['snapshots'] == 1
+
+    memory_queue.clear_queue(users[1])
+    assert memory_queue.stats()['memory']['snapshots'] == 0
+
+
+def test_snapshots_are_ignored_when_disabled():
+    service = QueueService()
+    user, card_id = str(uuid.uuid4()), str(uuid.uuid4())
+    service.push_cards(user, [card_id], {card_id: snapshot_of(card_id)})
+
+    assert service.pop_and_inspect(user, 1).items == [(card_id, None)]
+
+
+def test_next_serves_the_snapshot_without_loading_the_card(client, make_cards, user_id, monkeypatch):
+    make_cards(12)
+    monkeypatch.setattr(queue_service, 'snapshots_enabled', True)
+    client.get(f'/api/feed/next?user_id={user_id}')  # 同步补货，快照随 ID 入队
+
+    response, statements = count_statements(
+        db.engine, lambda: client.get(f'/api/feed/next?user_id={user_id}'))
+
+    assert response.status_code == 200
+    assert not [s for s in statements if 'FROM cards' in s]
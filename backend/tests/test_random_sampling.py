@@ -0,0 +1,41 @@
+"""随机取卡：在卡片索引上采样，不再 ORDER BY random()（user-008）"""
+from collections import Counter
+
+from models import db
+from services.card_service import CardService
+from services.interaction_service import InteractionService
+from services.recommendation_service import recommendation_service
+from test_session_context import count_statements
+
+
+def test_unviewed_cards_skip_seen_without_sorting(app, make_cards, user_id):
+    cards = make_cards(10)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, card.id, 'SKIP', 5000) for card in cards[:6]
+    ])
+
+    result, statements = count_statements(
+        db.engine, lambda: CardService.get_unviewed_cards(str(user_id), limit=10))
+
+    assert {card.id for card in result} == {card.id for card in cards[6:]}
+    assert not [s for s in statements if 'random' in s.lower() or 'ORDER BY' in s.upper()]
+
+
+def test_random_cards_respect_limit_and_exclusions(app, make_cards, user_id):
+    cards = make_cards(10)
+    excluded = {cards[0].id, cards[1].id}
+
+    result = recommendation_service._get_random_cards(5, exclude_ids=excluded, user_id=str(user_id))
+
+    assert len(result) == 5 and len({card.id for card in result}) == 5
+    assert not {card.id for card in result} & excluded
+
+
+def test_samples_vary_across_calls(app, make_cards, user_id):
+    make_cards(20)
+    counts = Counter()
+    for _ in range(50):
+        counts.update(card.id for card in CardService.get_unviewed_cards(str(user_id), limit=3))
+
+    # 50 次抽 3 张：20 张卡片基本都会被抽到
+    assert len(counts) >= 15
@@ -0,0 +1,63 @@
+"""推荐分析的记忆化：同一版本只计算一次，新交互或超过 TTL 后重新计算（user-003）"""
+import uuid
+
+import pytest
+
+from services.interaction_service import InteractionService
+from services.recommendation_service import RecommendationService, recommendation_service
+
+
+@pytest.fixture
+def compute_calls(monkeypatch):
+    calls = []
+    original = RecommendationService._compute_user_interests
+
+    def compute(self, user_id):
+        calls.append(user_id)
+        return original(self, user_id)
+
+    monkeypatch.setattr(RecommendationService, '_compute_user_interests', compute)
+    return calls
+
+
+def test_request_computes_interests_once(app, make_cards, user_id, compute_calls):
+    cards = make_cards(1)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+
+    with app.test_request_context():
+        first = recommendation_service.get_preferred_tags(str(user_id))
+        recommendation_service.get_disliked_tags(str(user_id))
+        recommendation_service.analyze_user_interests(str(user_id))
+
+    assert set(first) == set(cards[0].tags)
+    assert len(compute_calls) == 1
+
+
+def test_new_interaction_invalidates_memo(app, make_cards, user_id, compute_calls):
+    cards = make_cards(2)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    recommendation_service.analyze_user_interests(str(user_id))
+
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[1].id, 'LIKE', 5000)])
+    interests = recommendation_service.analyze_user_interests(str(user_id))
+
+    assert len(compute_calls) == 2
+    assert set(interests) == set(cards[0].tags) | set(cards[1].tags)
+
+
+def test_memo_expires_after_ttl(app, user_id, compute_calls, monkeypatch):
+    recommendation_service.analyze_user_interests(str(user_id))
+    recommendation_service.analyze_user_interests(str(user_id))
+    assert len(compute_calls) == 1
+
+    monkeypatch.setattr(RecommendationService, 'MEMO_TTL_SECONDS', 0)
+    recommendation_service.analyze_user_interests(str(user_id))
+    assert len(compute_calls) == 2
+
+
+def test_memo_is_bounded(app, compute_calls, monkeypatch):
+    monkeypatch.setattr(RecommendationService, 'MEMO_MAX_ENTRIES', 3)
+    for _ in range(5):
+        recommendation_service.analyze_user_interests(str(uuid.uuid4()))
+
+    assert len(recommendation_service._memo) == 3
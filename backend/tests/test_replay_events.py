@@ -0,0 +1,80 @@
+"""事件日志重放：--reset 重建画像 / 统计的前提检查与归档部分的恢复（user-024）"""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from models.user_profile import UserProfile
+from models.user_stats import UserStats
+from scripts.replay_events import replay_events
+from services.compaction_service import compaction_service
+from services.event_log import event_log
+from services.interaction_service import InteractionService
+
+ACTIONS = ['LIKE', 'SKIP', 'FINISH_READ', 'EXPAND']
+
+
+@pytest.fixture
+def full_log(monkeypatch, tmp_path):
+    monkeypatch.setattr(event_log, 'retention_hours', 0)
+    monkeypatch.setattr(compaction_service, 'archive_dir', str(tmp_path / 'archive'))
+
+
+def write_history(cards, users, count, days):
+    now = datetime.utcnow()
+    rows = sorted((
+        InteractionService.new_row(users[i % len(users)], cards[i % len(cards)].id, ACTIONS[i % 4], 100 * i,
+                                   created_at=now - timedelta(days=(i * 7) % days, seconds=i))
+        for i in range(count)
+    ), key=lambda row: row['created_at'])
+    for start in range(0, len(rows), 20):
+        InteractionService.write_batch(rows[start:start + 20])
+
+
+def snapshot(users):
+    db.session.expire_all()
+    result = {}
+    for user in users:
+        profile, stats = db.session.get(UserProfile, user), db.session.get(UserStats, user)
+        result[user] = (
+            {tag: round(weight, 9) for tag, weight in profile.tag_weights.items()},
+            profile.interaction_count,
+            stats.to_dict()
+        )
+    return result
+
+
+def test_reset_restores_archived_history_from_rollups(app, make_cards, full_log):
+    users = [uuid.uuid4() for _ in range(3)]
+    write_history(make_cards(5), users, 60, 90)
+    before = snapshot(users)
+    assert compaction_service.compact(30)['archived'] > 0
+
+    assert replay_events('profiles', reset=True) > 0
+    assert replay_events('stats', reset=True) > 0
+
+    assert snapshot(users) == before
+
+
+def test_reset_refuses_while_segments_are_pruned(app, make_cards, user_id, full_log, monkeypatch):
+    write_history(make_cards(2), [user_id], 5, 2)
+    before = snapshot([user_id])
+    monkeypatch.setattr(event_log, 'retention_hours', 72)
+
+    assert replay_events('stats', reset=True) == 0
+
+    assert snapshot([user_id]) == before
+
+
+def test_reset_refuses_when_the_log_starts_late(app, make_cards, user_id, full_log, monkeypatch):
+    cards = make_cards(2)
+    monkeypatch.setattr(event_log, 'enabled', False)
+    write_history(cards, [user_id], 4, 2)
+    monkeypatch.setattr(event_log, 'enabled', True)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 100)])
+    before = snapshot([user_id])
+
+    assert replay_events('profiles', reset=True) == 0
+
+    assert snapshot([user_id]) == before
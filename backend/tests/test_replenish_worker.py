@@ -0,0 +1,92 @@
+"""后台补货：跨进程锁只能由持有者释放（user-015）"""
+import threading
+
+import pytest
+
+from conftest import attach_redis
+from services import replenish_worker as replenish_module
+from services.queue_service import QueueService
+from services.replenish_worker import ReplenishWorker
+
+
+@pytest.fixture
+def worker(fake_redis, monkeypatch):
+    monkeypatch.setattr(replenish_module, 'queue_service', attach_redis(QueueService(), fake_redis))
+    return ReplenishWorker(max_workers=2, enabled=True)
+
+
+def test_lock_is_released_after_refill(app, worker, fake_redis, user_id):
+    user = str(user_id)
+    assert worker.schedule(user, lambda uid: 1, app)
+    worker._executor.shutdown(wait=True)
+
+    assert fake_redis.get(worker.get_lock_key(user)) is None
+    assert worker.stats()['completed'] == 1
+
+
+def test_overrunning_refill_does_not_release_a_lock_it_lost(app, worker, fake_redis, user_id):
+    user = str(user_id)
+    key = worker.get_lock_key(user)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_refill(uid):
+        started.set()
+        release.wait(5)
+        return 0
+
+    assert worker.schedule(user, slow_refill, app)
+    started.wait(5)
+    # 锁超时过期后被另一个进程拿走
+    fake_redis.delete(key)
+    fake_redis.set(key, 'other-process')
+
+    release.set()
+    worker._executor.shutdown(wait=True)
+
+    assert fake_redis.get(key) == 'other-process'
+
+
+def test_lock_held_elsewhere_deduplicates(app, worker, fake_redis, user_id):
+    user = str(user_id)
+    fake_redis.set(worker.get_lock_key(user), 'other-process')
+
+    assert not worker.schedule(user, lambda uid: 1, app)
+    assert worker.stats()['deduplicated'] == 1
+
+
+def test_redis_lock_is_taken_outside_the_local_lock(app, worker, fake_redis, user_id, monkeypatch):
+    user = str(user_id)
+    held = []
+    acquire = worker._acquire_redis_lock
+
+    def checking_acquire(uid):
+        held.append(worker._lock.locked())
+        # 获取 Redis 锁期间同一用户的请求被去重
+        assert not worker.schedule(uid, lambda _: 1, app)
+        return acquire(uid)
+
+    monkeypatch.setattr(worker, '_acquire_redis_lock', checking_acquire)
+    assert worker.schedule(user, lambda uid: 1, app)
+    worker._executor.shutdown(wait=True)
+
+    assert held == [False]
+    assert worker.stats()['deduplicated'] == 1
+    assert worker.stats()['inflight'] == 0
+
+
+def test_redis_errors_reach_the_circuit_breaker(app, worker, fake_redis, user_id, monkeypatch):
+    service = replenish_module.queue_service
+    failures = []
+    monkeypatch.setattr(service._connection, 'record_failure', lambda *args: failures.append(args))
+
+    def broken_set(*args, **kwargs):
+        raise service._connection.errors[0]('connection lost')
+
+    monkeypatch.setattr(fake_redis, 'set', broken_set)
+
+    # Redis 不可用时不加锁，照常补货
+    assert worker.schedule(str(user_id), lambda uid: 1, app)
+    worker._executor.shutdown(wait=True)
+
+    assert len(failures) >= 1
+    assert worker.stats()['completed'] == 1
@@ -0,0 +1,74 @@
+"""向量化打分：标签权重求和、惩罚、各桶 top-k 与已看过滤（user-006）"""
+import pytest
+
+from services.interaction_service import InteractionService
+from services.recommendation_service import recommendation_service
+from services.scoring_engine import ScoringEngine, scoring_engine
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture(autouse=True)
+def no_noise(monkeypatch):
+    monkeypatch.setattr(ScoringEngine, 'NOISE_SCALE', 0.0)
+
+
+def test_scores_are_tag_weight_sums_with_penalties(app, make_cards, user_id):
+    make_cards(3)  # [Java, Python] [Python, History] [History, Science]
+
+    ranking = scoring_engine.rank(str(user_id), {'Python': 1.0, 'History': 0.5},
+                                  recent_tags=['History'], quick_skipped_tags=['Science'])
+
+    penalty = ScoringEngine.RECENT_TAG_PENALTY
+    expected = [1.0, 1.5 - penalty, 0.5 - penalty - ScoringEngine.QUICK_SKIP_PENALTY]
+    assert ranking.scores.tolist() == pytest.approx(expected)
+
+
+def test_top_k_filters_by_tags_and_never_repeats(app, make_cards, user_id):
+    cards = make_cards(4)  # [Java, Python] [Python, History] [History, Science] [Science, Memes]
+    ranking = scoring_engine.rank(str(user_id), {'Python': 1.0, 'Science': 0.2})
+
+    assert ranking.top_k(1) == [cards[0].id]
+    assert ranking.top_k(2, tags=['Python', 'Science']) == [cards[1].id, cards[2].id]
+    assert ranking.top_k(5, exclude_tags=['Memes']) == []
+    assert ranking.top_k(5) == [cards[3].id]
+
+
+def test_seen_and_excluded_cards_are_unavailable(app, make_cards, user_id):
+    cards = make_cards(4)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'SKIP', 5000)])
+
+    ranking = scoring_engine.rank(str(user_id), {})
+    ranking.exclude([cards[1].id])
+
+    assert sorted(ranking.top_k(10)) == sorted([cards[2].id, cards[3].id])
+
+
+def test_matrix_grows_with_new_cards(app, make_cards, user_id):
+    make_cards(2)
+    assert scoring_engine.refresh().n_cards == 2
+
+    cards = make_cards(3)
+
+    matrix = scoring_engine.refresh()
+    assert matrix.n_cards == 5
+    assert scoring_engine.rank(str(user_id), {'Science': 1.0}).top_k(1) == [cards[2].id]
+
+
+def test_recommendations_use_ranking_for_profiled_users(app, make_cards, user_id, monkeypatch):
+    cards = make_cards(16)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    ranked = []
+    original = ScoringEngine.rank
+
+    def rank(self, *args, **kwargs):
+        ranked.append(args[0])
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(ScoringEngine, 'rank', rank)
+
+    recommended = recommendation_service.get_recommended_cards(str(user_id), 10)
+
+    assert ranked == [str(user_id)]
+    assert len(recommended) == 10 and len({card.id for card in recommended}) == 10
+    assert cards[0].id not in {card.id for card in recommended}
@@ -0,0 +1,85 @@
+"""已看集合：内存位图、Redis 集合与故障恢复（user-005 / user-016）"""
+import pytest
+
+from conftest import attach_redis
+from models import db
+from models.card import Card
+from models.interaction import Interaction
+from services import seen_service as seen_module
+from services.card_index import card_index
+from services.interaction_service import InteractionService
+from services.queue_service import QueueService
+from services.seen_service import seen_set_service
+
+
+@pytest.fixture
+def redis_queue(fake_redis, monkeypatch):
+    service = attach_redis(QueueService(), fake_redis)
+    monkeypatch.setattr(seen_module, 'queue_service', service)
+    return service
+
+
+def test_marks_during_outage_survive_recovery(app, make_cards, user_id, redis_queue, fake_redis):
+    cards = make_cards(3)
+    user = str(user_id)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    assert fake_redis.sismember(seen_set_service.get_seen_key(user), str(cards[0].id))
+
+    # Redis 故障：标记只写入内存位图
+    redis_queue._connection.circuit = 'open'
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[1].id, 'SKIP', 500)])
+    assert seen_set_service.filter_unseen(user, [cards[1].id]) == []
+
+    # 恢复后 Redis 集合重新从数据库加载，包含故障期间的交互
+    redis_queue._connection.circuit = 'closed'
+    assert seen_set_service.filter_unseen(user, [card.id for card in cards]) == [cards[2].id]
+    assert seen_set_service.seen_count(user) == 2
+
+
+def test_memory_bitmap_tracks_seen_cards(app, make_cards, user_id):
+    cards = make_cards(4)
+    user = str(user_id)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+
+    seen_set_service.mark_seen(user, [cards[1].id])
+
+    assert seen_set_service.seen_count(user) == 2
+    assert seen_set_service.has_seen(user, cards[0].id)
+    assert seen_set_service.filter_unseen(user, [card.id for card in cards]) == [cards[2].id, cards[3].id]
+    assert seen_set_service.seen_mask(user, 4).tolist() == [True, True, False, False]
+
+
+def test_load_syncs_cards_the_index_has_not_seen(app, make_cards, user_id):
+    make_cards(1)
+    assert card_index.total_cards() == 1
+    # 另一个进程刚写入的卡片和交互，本进程索引还没同步到
+    other = Card(topic='other', tags=['AI'], complexity=1, payload={})
+    db.session.add(other)
+    db.session.flush()
+    db.session.add(Interaction(user_id=user_id, card_id=other.id, action='LIKE', duration=5000))
+    db.session.commit()
+
+    assert seen_set_service.has_seen(str(user_id), other.id)
+    assert seen_set_service.seen_count(str(user_id)) == 1
+
+
+def test_redis_set_tracks_seen_cards(app, make_cards, user_id, redis_queue, fake_redis):
+    cards = make_cards(3)
+    user = str(user_id)
+    seen_set_service.mark_seen(user, [cards[0].id])
+
+    assert seen_set_service.seen_count(user) == 1
+    assert seen_set_service.filter_unseen(user, [card.id for card in cards]) == [cards[1].id, cards[2].id]
+    assert fake_redis.ttl(seen_set_service.get_seen_key(user)) > 0
+
+
+def test_anonymous_requests_do_not_load_seen_sets(client, make_cards, redis_queue, fake_redis, monkeypatch):
+    make_cards(12)
+    loads = []
+    monkeypatch.setattr(seen_set_service, '_load_from_db', lambda user: loads.append(user) or [])
+
+    for _ in range(3):
+        assert client.get('/api/feed/next').status_code == 200
+
+    assert loads == []
+    assert fake_redis.keys('seen:user:*') == []
@@ -0,0 +1,56 @@
+"""会话上下文：一次 interactions ⋈ cards 查询（user-004）"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from models import db
+from services.interaction_service import InteractionService
+from services.recommendation_service import recommendation_service
+
+
+def count_statements(engine, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    return result, statements
+
+
+def test_session_context_is_one_statement(app, make_cards, user_id):
+    cards = make_cards(20)
+    started = datetime.utcnow() - timedelta(minutes=20)
+    rows = [
+        InteractionService.new_row(user_id, cards[i % len(cards)].id, 'SKIP' if i % 3 else 'LIKE',
+                                   500 if i % 2 else 5000, created_at=started + timedelta(seconds=i))
+        for i in range(200)
+    ]
+    InteractionService.write_batch(rows)
+
+    context, statements = count_statements(
+        db.engine, lambda: recommendation_service._compute_session_context(str(user_id))
+    )
+
+    assert len(statements) == 1
+    assert 'payload' not in statements[0]
+    assert len(context['recent_card_ids']) == 200
+    assert context['recent_card_ids'][0] == str(rows[-1]['card_id'])
+    assert context['quick_skipped_tags']
+
+
+def test_session_context_ignores_old_interactions(app, make_cards, user_id):
+    cards = make_cards(3)
+    old = datetime.utcnow() - timedelta(minutes=recommendation_service.SESSION_WINDOW_MINUTES + 5)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000, created_at=old),
+        InteractionService.new_row(user_id, cards[1].id, 'SKIP', 500),
+    ])
+
+    context = recommendation_service._compute_session_context(str(user_id))
+
+    assert context['recent_card_ids'] == [str(cards[1].id)]
@@ -0,0 +1,61 @@
+"""统计汇总：首次写入的并发建立与读取（user-021）"""
+from models import db, insert_if_absent
+from models.user_stats import UserStats
+from services.interaction_service import InteractionService
+from services.stats_service import COUNTER_COLUMNS, StatsService, stats_service
+from test_session_context import count_statements
+
+
+def test_first_write_builds_stats_from_history(app, make_cards, user_id):
+    cards = make_cards(2)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, cards[0].id, 'LIKE', 4000),
+        InteractionService.new_row(user_id, cards[1].id, 'SKIP', None),
+    ])
+
+    stats = db.session.get(UserStats, user_id)
+    assert (stats.total_count, stats.like_count, stats.skip_count) == (2, 1, 1)
+    assert (stats.duration_sum, stats.duration_count) == (4000, 1)
+
+
+def test_concurrent_first_write_is_applied_incrementally(app, user_id, monkeypatch):
+    # 另一个事务在本事务 UPDATE 之后、INSERT 之前建立了汇总行（含 1 条交互）
+    def create_row(uid):
+        values = {column: 0 for column in COUNTER_COLUMNS}
+        values.update(total_count=1, like_count=1)
+        insert_if_absent(UserStats, user_id=uid, **values)
+        return False
+
+    monkeypatch.setattr(StatsService, '_create_row', staticmethod(create_row))
+
+    stats_service.apply(user_id, [('LIKE', 3000)])
+    db.session.commit()
+
+    stats = db.session.get(UserStats, user_id)
+    assert (stats.total_count, stats.like_count) == (2, 2)
+    assert (stats.duration_sum, stats.duration_count) == (3000, 1)
+
+
+def test_get_stats_aggregates_history_without_writing(app, make_cards, user_id):
+    cards = make_cards(2)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    UserStats.query.delete()
+    db.session.commit()
+
+    result, statements = count_statements(db.engine, lambda: stats_service.get_stats(str(user_id)))
+
+    assert result['total_interactions'] == 1
+    assert all(s.lstrip().upper().startswith('SELECT') for s in statements)
+    assert db.session.get(UserStats, user_id) is None
+
+    # 下一次写入建立汇总行（含之前的历史）
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[1].id, 'SKIP', 100)])
+    assert db.session.get(UserStats, user_id).total_count == 2
+    assert stats_service.get_stats(str(user_id))['total_interactions'] == 2
+
+
+def test_get_stats_without_history_does_not_write(app, user_id):
+    result = stats_service.get_stats(str(user_id))
+
+    assert result['total_interactions'] == 0
+    assert db.session.get(UserStats, user_id) is None
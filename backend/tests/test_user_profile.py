@@ -0,0 +1,60 @@
+"""兴趣画像：首次写入的并发建立与只读的读路径（user-002）"""
+from models import db, insert_if_absent
+from models.user_profile import UserProfile
+from services.interaction_service import InteractionService
+from services.recommendation_service import RecommendationService, recommendation_service
+
+
+def test_insert_if_absent_skips_existing_row(app, user_id):
+    assert insert_if_absent(UserProfile, user_id=user_id, tag_weights={}, interaction_count=0)
+    assert not insert_if_absent(UserProfile, user_id=user_id, tag_weights={}, interaction_count=0)
+    db.session.commit()
+    assert UserProfile.query.filter_by(user_id=user_id).count() == 1
+
+
+def test_first_write_builds_profile_from_history(app, make_cards, user_id):
+    cards = make_cards(2)
+    InteractionService.write_batch([
+        InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000),
+        InteractionService.new_row(user_id, cards[1].id, 'LIKE', 5000),
+    ])
+
+    profile = db.session.get(UserProfile, user_id)
+    assert profile.interaction_count == 2
+    assert profile.tag_weights[cards[0].tags[0]] == RecommendationService.LIKE_WEIGHT
+
+
+def test_concurrent_first_write_is_applied_incrementally(app, make_cards, user_id, monkeypatch):
+    cards = make_cards(2)
+    # 另一个事务已经建立了画像（含 1 条交互），本事务加锁读取时它还不存在
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    original = RecommendationService._lock_profile
+    calls = []
+
+    def lock_profile(uid):
+        calls.append(uid)
+        return None if len(calls) == 1 else original(uid)
+
+    monkeypatch.setattr(RecommendationService, '_lock_profile', staticmethod(lock_profile))
+
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[1].id, 'LIKE', 5000)])
+
+    profile = db.session.get(UserProfile, user_id)
+    assert len(calls) == 2
+    assert profile.interaction_count == 2
+    # cards[0] 和 cards[1] 共有的标签
+    assert profile.tag_weights[cards[1].tags[0]] == 2 * RecommendationService.LIKE_WEIGHT
+
+
+def test_read_path_does_not_write_profile(app, make_cards, user_id):
+    cards = make_cards(1)
+    InteractionService.write_batch([InteractionService.new_row(user_id, cards[0].id, 'LIKE', 5000)])
+    UserProfile.query.delete()
+    db.session.commit()
+
+    interests = recommendation_service._compute_user_interests(str(user_id))
+
+    assert set(interests) == set(cards[0].tags)
+    assert not db.session.new and not db.session.dirty
+    db.session.rollback()
+    assert db.session.get(UserProfile, user_id) is None
@@ -18,12 +18,56 @@ class APIError extends Error {
   }
 }
 
+// 批量预取配置
+const PREFETCH_BATCH_SIZE = 5;
+
+// 交互批量上报配置
+const INTERACTION_FLUSH_INTERVAL_MS = 3000;
+const INTERACTION_FLUSH_SIZE = 20;
+const MAX_PENDING_INTERACTIONS = 200;  // 与后端 MAX_BATCH_EVENTS 一致，重试时只保留最近的事件
+
+// 正在生成中 (202)
+interface GeneratingResponse {
+  generating: boolean;
+  error?: string;
+}
+
+// 待上报的交互事件
+interface InteractionEvent {
+  card_id: string;
+  action: string;
+  duration?: number;
+}
+
+// /feed/batch 响应
+interface CardBatchResponse {
+  cards: Card[];
+  queue_length: number;
+  unviewed_count: number;
+  needs_replenish: boolean;
+  total_cards_in_pool: number;
+}
+
 export class APIService {
   private userId: string;
+  private prefetched: Card[] = [];
+  private pendingInteractions: InteractionEvent[] = [];
 
   constructor() {
     // MVP: 使用 localStorage 存储用户 ID
     this.userId = localStorage.getItem('mindslot_user_id') || this.generateUserId();
+
+    // 交互事件定时批量上报；页面隐藏/关闭时立即上报（keepalive 保证请求在卸载后发出）
+    setInterval(() => this.flushInteractions(), INTERACTION_FLUSH_INTERVAL_MS);
+    window.addEventListener('pagehide', () => {
+      this.flushInteractions(true);
+      this.returnPrefetched();
+    });
+    document.addEventListener('visibilitychange', () => {
+      if (document.visibilityState === 'hidden') {
+        this.flushInteractions(true);
+      }
+    });
   }
 
   private generateUserId(): string {
@@ -37,6 +81,60 @@ export class APIService {
   }
 
   async getNextCard(): Promise<CardResponse> {
+    // 优先使用预取的卡片，用完后一次请求取回一批
+    if (this.prefetched.length === 0) {
+      const batch = await this.getNextCards(PREFETCH_BATCH_SIZE);
+      if ('generating' in batch) {
+        return batch as CardResponse;
+      }
+      // 队列状态是整批的，逐张补上（排在后面的预取卡片也算在剩余数量里）
+      this.prefetched = batch.cards.map((card, index) => ({
+        ...card,
+        queue_length: batch.queue_length + batch.cards.length - index - 1,
+        needs_replenish: batch.needs_replenish
+      }));
+    }
+
+    const card = this.prefetched.shift();
+    if (!card) {
+      throw new APIError('Failed to fetch card', 404);
+    }
+    return card;
+  }
+
+  // 页面关闭时把预取但没展示的卡片还给服务端队列，否则它们被当作已发放，下次打开也不会再出现
+  private returnPrefetched() {
+    if (this.prefetched.length === 0) {
+      return;
+    }
+    const cardIds = this.prefetched.map(card => card.id);
+    this.prefetched = [];
+
+    fetch(`${API_BASE}/feed/return`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ user_id: this.userId, card_ids: cardIds }),
+      keepalive: true
+    }).catch(e => console.error('Failed to return prefetched cards:', e));
+  }
+
+  async getNextCards(n: number = PREFETCH_BATCH_SIZE): Promise<CardBatchResponse | GeneratingResponse> {
+    const response = await fetch(`${API_BASE}/feed/batch?user_id=${this.userId}&n=${n}`);
+    
+    // 202 表示正在生成中
+    if (response.status === 202) {
+      const data = await response.json();
+      return { ...data, generating: true };
+    }
+    
+    if (!response.ok) {
+      throw new APIError('Failed to fetch cards', response.status);
+    }
+    
+    return response.json();
+  }
+
+  async getSingleCard(): Promise<CardResponse> {
     const response = await fetch(`${API_BASE}/feed/next?user_id=${this.userId}`);
     
     // 202 表示正在生成中
@@ -54,22 +152,43 @@ export class APIService {
   }
 
   async recordInteraction(cardId: string, action: string, duration?: number) {
+    // 先放入缓冲区，定时或攒够一批后通过 /interaction/record/batch 上报
+    this.pendingInteractions.push({ card_id: cardId, action, duration });
+    if (this.pendingInteractions.length >= INTERACTION_FLUSH_SIZE) {
+      await this.flushInteractions();
+    }
+  }
+
+  async flushInteractions(keepalive: boolean = false) {
+    if (this.pendingInteractions.length === 0) {
+      return;
+    }
+    const events = this.pendingInteractions;
+    this.pendingInteractions = [];
+
     try {
-      await fetch(`${API_BASE}/interaction/record`, {
+      const response = await fetch(`${API_BASE}/interaction/record/batch`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          user_id: this.userId,
-          card_id: cardId,
-          action,
-          duration
-        })
+        body: JSON.stringify({ user_id: this.userId, events }),
+        keepalive
       });
+      if (response.status >= 500) {
+        // 服务端写入失败（整批回滚），放回缓冲区下次重试
+        this.requeueInteractions(events);
+      }
     } catch (e) {
-      console.error('Failed to record interaction:', e);
+      console.error('Failed to record interactions:', e);
+      this.requeueInteractions(events);
     }
   }
 
+  private requeueInteractions(events: InteractionEvent[]) {
+    this.pendingInteractions = events
+      .concat(this.pendingInteractions)
+      .slice(-MAX_PENDING_INTERACTIONS);
+  }
+
   async getQueueStatus(): Promise<{ 
     queue_length: number; 
     preview: string[];